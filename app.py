@@ -1,7 +1,16 @@
+import os
 import sys
+import tempfile
 import time
 import logging
 
+# prometheus_client picks its multiprocess directory up on import, so worker
+# processes need it set before lib.constants creates the metrics
+if os.getenv("SCRAPER_WORKER_PROCESSES", "0") != "0" and not os.getenv(
+    "PROMETHEUS_MULTIPROC_DIR"
+):
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="prometheus-")
+
 from lib.constants import Constants
 from service import ScraperService
 from logging.handlers import TimedRotatingFileHandler
@@ -33,9 +42,9 @@ if __name__ == "__main__":
             constants=constants,
             logger=logger,
         )
-        service.start()
-
         try:
+            service.start()
+
             while True:
                 time.sleep(1)
         except KeyboardInterrupt:
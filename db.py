@@ -1,30 +1,278 @@
 import json
 import os
+import threading
+import time
 
 import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_UNKNOWN
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool, PoolError
 from contextlib import contextmanager
 from typing import Optional, Dict, List, Any
 
+from lib.constants import Constants
 from lib.utils import serialize_value
 
+# NOTIFY channel signalled whenever a job is added to scrape_jobs
+SCRAPE_JOBS_CHANNEL = "scrape_jobs"
+
+# Secondary indexes, init_db creates the missing ones. IF NOT EXISTS only looks
+# at the name, so give an index a new name when changing its definition.
+INDEXES = {
+    # Foreign keys, leading channel_id also serves get_by_channel's ORDER BY
+    "youtube_videos_channel_id_idx": "youtube_videos (channel_id, uploaded_date DESC)",
+    "youtube_shorts_channel_id_idx": "youtube_shorts (channel_id, posted_date DESC)",
+    "youtube_community_posts_channel_id_idx": "youtube_community_posts (channel_id, posted_date DESC)",
+    "channel_changes_channel_id_idx": "channel_changes (channel_id)",
+    "related_profiles_channel_2_id_idx": "related_profiles (channel_2_id)",
+    "youtube_comments_content_idx": "youtube_comments (content_type, content_id, comment_date DESC)",
+    # Channels due for a scrape, in the order the scheduler takes them. Scraped
+    # channels are due again once stale, so not partial on channel_info_scraped.
+    "youtube_channel_due_update_time_idx": "youtube_channel (update_time NULLS FIRST)",
+    # Claims take the lowest rank first, worker pools only their own job types
+    "scrape_jobs_status_rank_idx": "scrape_jobs (status, rank)",
+    "scrape_jobs_job_type_status_rank_idx": "scrape_jobs (job_type, status, rank)",
+    # Videos the video details stage still has to visit
+    "youtube_videos_missing_details_idx": "youtube_videos (channel_id, id) WHERE fetched_timestamp IS NULL",
+    # Newest first for the dashboard's /dead_letters
+    "dead_letter_jobs_create_time_idx": "dead_letter_jobs (create_time DESC)",
+}
+
+# Indexes INDEXES replaced under a new name, init_db drops them
+DROPPED_INDEXES = ("youtube_channel_due_idx",)
+
+# Connections idle for longer than this are pinged before being handed out
+POOL_PING_AFTER = 30
+
+_pool: Optional[ThreadedConnectionPool] = None
+_pool_pid = None
+_pool_slots: Optional[threading.BoundedSemaphore] = None
+_pool_lock = threading.Lock()
+_last_used: Dict[int, float] = {}
+
 
 def get_connection_string() -> str:
     return f"dbname={os.getenv('DATABASE__DB')} user={os.getenv('DATABASE__USERNAME')} password={os.getenv('DATABASE__PASSWORD')} host={os.getenv('DATABASE__HOST')} port={os.getenv('DATABASE__PORT')}"
 
 
+def get_connection_options() -> str:
+    # Session defaults, RESET ALL or a rollback in a pooled connection keeps them
+    statement_timeout = int(os.getenv("DATABASE__STATEMENT_TIMEOUT_MS", "30000"))
+    return f"-c statement_timeout={statement_timeout}"
+
+
+def get_pool() -> tuple[ThreadedConnectionPool, threading.BoundedSemaphore]:
+    global _pool, _pool_pid, _pool_slots
+
+    with _pool_lock:
+        # A pool inherited from a parent process shares its sockets, start over
+        if _pool is None or _pool_pid != os.getpid():
+            min_size = int(os.getenv("DATABASE__POOL_MIN", "1"))
+            max_size = int(os.getenv("DATABASE__POOL_MAX", "10"))
+            _pool = ThreadedConnectionPool(
+                min_size,
+                max_size,
+                get_connection_string(),
+                options=get_connection_options(),
+            )
+            _pool_pid = os.getpid()
+            # ThreadedConnectionPool raises once exhausted, callers queue here instead
+            _pool_slots = threading.BoundedSemaphore(max_size)
+            _last_used.clear()
+
+        return _pool, _pool_slots
+
+
+def _is_healthy(conn) -> bool:
+    if conn.closed or conn.info.transaction_status == TRANSACTION_STATUS_UNKNOWN:
+        return False
+
+    # Never handed out before means just connected
+    last_used = _last_used.get(id(conn))
+    if last_used is None or time.monotonic() - last_used < POOL_PING_AFTER:
+        return True
+
+    # Idle long enough for the server or a proxy to have dropped it
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def _discard(pool: ThreadedConnectionPool, conn, reason: str) -> None:
+    Constants.DB_POOL_DISCARDED.labels(reason=reason).inc()
+    _last_used.pop(id(conn), None)
+    pool.putconn(conn, close=True)
+
+
 @contextmanager
 def get_db():
-    conn = psycopg2.connect(get_connection_string())
+    # Connections come from a process wide pool and go back to it afterwards,
+    # uncommitted work is rolled back on the way
+    pool, slots = get_pool()
+
+    started = time.monotonic()
+    timeout = float(os.getenv("DATABASE__POOL_TIMEOUT", "30"))
+    if not slots.acquire(timeout=timeout):
+        raise PoolError(f"Timed out after {timeout}s waiting for a connection")
+    Constants.DB_POOL_WAIT.observe(time.monotonic() - started)
+
+    conn = None
+    try:
+        while conn is None:
+            conn = pool.getconn()
+            if not _is_healthy(conn):
+                _discard(pool, conn, reason="unhealthy")
+                conn = None
+
+        Constants.DB_POOL_CHECKOUTS.inc()
+        Constants.DB_POOL_IN_USE.inc()
+        try:
+            yield conn
+        finally:
+            Constants.DB_POOL_IN_USE.dec()
+            if (
+                conn.closed
+                or conn.info.transaction_status == TRANSACTION_STATUS_UNKNOWN
+            ):
+                # Lost the server, don't hand this connection out again
+                _discard(pool, conn, reason="error")
+            else:
+                if conn.autocommit:
+                    conn.autocommit = False
+                _last_used[id(conn)] = time.monotonic()
+                pool.putconn(conn)
+
+    finally:
+        slots.release()
+
+
+@contextmanager
+def get_dedicated_db():
+    # A connection outside the pool, for session state that must not leak into
+    # pooled connections such as LISTEN
+    conn = psycopg2.connect(get_connection_string(), options=get_connection_options())
     try:
         yield conn
     finally:
         conn.close()
 
 
+def _copy_value(value: Any) -> str:
+    # COPY text format, \N is NULL and backslashes and separators are escaped
+    if value is None:
+        return "\\N"
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+class CopyRowStream:
+    # File-like view of rows in COPY text format, rendered as COPY reads them
+    def __init__(self, rows):
+        self.lines = ("\t".join(map(_copy_value, row)) + "\n" for row in rows)
+        self.buffer = ""
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self.buffer) < size:
+            line = next(self.lines, None)
+            if line is None:
+                break
+            self.buffer += line
+
+        if size < 0:
+            size = len(self.buffer)
+        chunk, self.buffer = self.buffer[:size], self.buffer[size:]
+        return chunk
+
+
+def copy_insert(
+    cur, table: str, columns: List[str], rows: List[tuple]
+) -> tuple[int, int]:
+    # Streams rows into a temp staging table with COPY and merges them in one
+    # INSERT ... ON CONFLICT DO NOTHING, instead of a round trip per row.
+    # Returns (inserted, skipped), the caller commits.
+    if not rows:
+        return 0, 0
+
+    staging = f"{table}_staging"
+    column_list = ", ".join(columns)
+    cur.execute(
+        f"""
+        DROP TABLE IF EXISTS pg_temp.{staging};
+        CREATE TEMP TABLE {staging} ON COMMIT DROP AS
+            SELECT {column_list} FROM {table} WITH NO DATA;
+        """
+    )
+    cur.copy_expert(f"COPY {staging} ({column_list}) FROM STDIN", CopyRowStream(rows))
+    cur.execute(
+        f"""
+        INSERT INTO {table} ({column_list})
+        SELECT {column_list} FROM {staging}
+        ON CONFLICT DO NOTHING
+        """
+    )
+    return cur.rowcount, len(rows) - cur.rowcount
+
+
+def ensure_codes(
+    cur, table: str, code_column: str, codes: List[str], values: Optional[Dict] = None
+) -> Dict[str, int]:
+    # Inserts the missing codes and returns code -> id for all of them in one
+    # statement. values are set on inserted rows only, existing rows are left
+    # alone, an ON CONFLICT DO UPDATE would fire the update_time triggers.
+    values = values or {}
+    columns = [code_column, *values]
+    params = {f"value_{column}": value for column, value in values.items()}
+    select_values = "".join(f", %(value_{column})s" for column in values)
+
+    ids = {}
+    missing = list(dict.fromkeys(codes))
+    while missing:
+        params["codes"] = missing
+        cur.execute(
+            f"""
+            WITH input AS (
+                SELECT DISTINCT unnest(%(codes)s::varchar[]) AS code
+            ),
+            inserted AS (
+                INSERT INTO {table} ({", ".join(columns)})
+                SELECT code{select_values} FROM input ORDER BY code
+                ON CONFLICT ({code_column}) DO NOTHING
+                RETURNING {code_column}, id
+            )
+            SELECT {code_column}, id FROM inserted
+            UNION ALL
+            SELECT existing.{code_column}, existing.id
+            FROM {table} AS existing
+            JOIN input ON existing.{code_column} = input.code
+            """,
+            params,
+        )
+        ids.update(cur.fetchall())
+        # A row committed by a concurrent insert after this statement's snapshot
+        # is neither inserted nor visible, the next round sees it
+        missing = [code for code in missing if code not in ids]
+
+    return ids
+
+
 def init_db():
     with get_db() as conn:
         with conn.cursor() as cur:
+            # Migrations such as the views rewrite below take as long as the
+            # table is big, the session's statement_timeout would cancel them
+            cur.execute("SET LOCAL statement_timeout = 0")
+
             # Channels table
             cur.execute(
                 """
@@ -58,6 +306,24 @@ def init_db():
                 """
             )
 
+            # Scheduler leases, set while a channel is queued for a scrape
+            cur.execute(
+                """
+                ALTER TABLE youtube_channel
+                    ADD COLUMN IF NOT EXISTS claimed_by VARCHAR,
+                    ADD COLUMN IF NOT EXISTS lease_until TIMESTAMP WITH TIME ZONE
+            """
+            )
+
+            # Set once a channel's jobs were dead-lettered, 'infinity' for
+            # channels that are gone. Not claimed before then.
+            cur.execute(
+                """
+                ALTER TABLE youtube_channel
+                    ADD COLUMN IF NOT EXISTS skip_until TIMESTAMP WITH TIME ZONE
+            """
+            )
+
             # Videos table
             cur.execute(
                 """
@@ -74,7 +340,7 @@ def init_db():
                     duration FLOAT,
                     embed_code TEXT,
                     uploaded_date TIMESTAMP WITH TIME ZONE,
-                    views INTEGER,
+                    views BIGINT,
                     likes INTEGER,
                     comments_count INTEGER,
                     comments_turned_off BOOLEAN DEFAULT FALSE,
@@ -86,6 +352,22 @@ def init_db():
                 """
             )
 
+            # Listing view counts can exceed the INTEGER range. Tables created
+            # before that still have INTEGER views, the rewrite locks the whole
+            # table so only run it while the column needs it.
+            cur.execute(
+                """
+                SELECT 1
+                FROM information_schema.columns
+                WHERE table_schema = current_schema()
+                AND table_name = 'youtube_videos'
+                AND column_name = 'views'
+                AND data_type = 'integer'
+            """
+            )
+            if cur.fetchone():
+                cur.execute("ALTER TABLE youtube_videos ALTER COLUMN views TYPE BIGINT")
+
             # Shorts table
             cur.execute(
                 """
@@ -183,6 +465,77 @@ def init_db():
             """
             )
 
+            # Durable job queue, rows are claimed with a lease and deleted once done
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS scrape_jobs (
+                    id BIGSERIAL PRIMARY KEY,
+                    create_time TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                    channel_name VARCHAR NOT NULL,
+                    job_type VARCHAR NOT NULL,
+                    payload JSONB NOT NULL DEFAULT '{}',
+                    status VARCHAR NOT NULL DEFAULT 'queued',  -- 'queued' or 'running'
+                    claimed_by VARCHAR,
+                    lease_until TIMESTAMP WITH TIME ZONE,
+                    attempts INTEGER DEFAULT 0
+                );
+                """
+            )
+
+            cur.execute(
+                """
+                CREATE INDEX IF NOT EXISTS scrape_jobs_status_id_idx
+                    ON scrape_jobs (status, id)
+            """
+            )
+
+            # Claim order, the enqueue time moved earlier by the job's priority
+            # (see PgJobQueue). Jobs queued before this column keep their order.
+            cur.execute(
+                """
+                ALTER TABLE scrape_jobs
+                    ADD COLUMN IF NOT EXISTS priority DOUBLE PRECISION NOT NULL DEFAULT 0,
+                    ADD COLUMN IF NOT EXISTS rank DOUBLE PRECISION NOT NULL
+                        DEFAULT EXTRACT(EPOCH FROM CURRENT_TIMESTAMP)
+            """
+            )
+
+            # Failed jobs queued again for a retry are not claimed before
+            # not_before (see ScrapeJobDB.retry)
+            cur.execute(
+                """
+                ALTER TABLE scrape_jobs
+                    ADD COLUMN IF NOT EXISTS not_before TIMESTAMP WITH TIME ZONE,
+                    ADD COLUMN IF NOT EXISTS last_error TEXT
+            """
+            )
+
+            # Jobs that failed permanently or ran out of retries, kept for inspection
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS dead_letter_jobs (
+                    id BIGSERIAL PRIMARY KEY,
+                    create_time TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                    channel_name VARCHAR NOT NULL,
+                    job_type VARCHAR NOT NULL,
+                    payload JSONB NOT NULL DEFAULT '{}',
+                    attempts INTEGER NOT NULL,
+                    permanent BOOLEAN NOT NULL,
+                    reason VARCHAR NOT NULL,
+                    error TEXT
+                );
+                """
+            )
+
+            # The same job is only queued once, re-adding it while pending is a no-op
+            cur.execute(
+                """
+                CREATE UNIQUE INDEX IF NOT EXISTS scrape_jobs_pending_unique_idx
+                    ON scrape_jobs (job_type, channel_name, payload)
+                    WHERE status = 'queued'
+            """
+            )
+
             cur.execute(
                 """
                 CREATE OR REPLACE FUNCTION update_timestamp()
@@ -200,6 +553,13 @@ def init_db():
                 CREATE OR REPLACE TRIGGER update_youtube_channel_timestamp
                     BEFORE UPDATE ON youtube_channel
                     FOR EACH ROW
+                    -- Taking or dropping a lease or skipping the channel is not
+                    -- an update of the channel
+                    WHEN (
+                        OLD.claimed_by IS NOT DISTINCT FROM NEW.claimed_by
+                        AND OLD.lease_until IS NOT DISTINCT FROM NEW.lease_until
+                        AND OLD.skip_until IS NOT DISTINCT FROM NEW.skip_until
+                    )
                     EXECUTE FUNCTION update_timestamp();
             """
             )
@@ -242,6 +602,41 @@ def init_db():
 
             conn.commit()
 
+    create_indexes()
+
+
+def create_indexes():
+    # CONCURRENTLY keeps tables that already hold data writable while their
+    # indexes build. It can't run in a transaction, and not under a statement
+    # timeout either, so it gets a connection of its own.
+    with get_dedicated_db() as conn:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("SET statement_timeout = 0")
+
+            for name, definition in INDEXES.items():
+                # A build that failed halfway leaves an invalid index behind,
+                # IF NOT EXISTS would keep it for good
+                cur.execute(
+                    """
+                    SELECT 1
+                    FROM pg_index
+                    JOIN pg_class ON pg_class.oid = pg_index.indexrelid
+                    WHERE pg_class.relname = %s
+                    AND pg_class.relnamespace = current_schema()::regnamespace
+                    AND NOT pg_index.indisvalid
+                    """,
+                    (name,),
+                )
+                if cur.fetchone():
+                    cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+                cur.execute(
+                    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}"
+                )
+
+            for name in DROPPED_INDEXES:
+                cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
 
 def delete_db():
     with get_db() as conn:
@@ -252,6 +647,10 @@ def delete_db():
             cur.execute("DROP TABLE IF EXISTS youtube_community_posts CASCADE")
             cur.execute("DROP TABLE IF EXISTS youtube_comments CASCADE")
             cur.execute("DROP TABLE IF EXISTS channel_changes CASCADE")
+            cur.execute("DROP TABLE IF EXISTS scrape_jobs CASCADE")
+            cur.execute("DROP TABLE IF EXISTS dead_letter_jobs CASCADE")
+            cur.execute("DROP TABLE IF EXISTS related_profiles CASCADE")
+            conn.commit()
 
     print("Deleted DB")
 
@@ -314,23 +713,17 @@ class ChannelChangeTracker:
 class YtChannelDB:
     @staticmethod
     def create(username: str) -> int:
+        return YtChannelDB.ensure_many([username])[username]
+
+    @staticmethod
+    def ensure_many(usernames: List[str]) -> Dict[str, int]:
         with get_db() as conn:
             with conn.cursor() as cur:
-                cur.execute(
-                    "SELECT id FROM youtube_channel WHERE channel_code = %s",
-                    (username,),
-                )
-                result = cur.fetchone()
-
-                if result:
-                    return result[0]
-                cur.execute(
-                    "INSERT INTO youtube_channel (channel_code) VALUES (%s) RETURNING id",
-                    [username],
+                channel_ids = ensure_codes(
+                    cur, "youtube_channel", "channel_code", usernames
                 )
-                channel_id = cur.fetchone()[0]
                 conn.commit()
-                return channel_id
+                return channel_ids
 
     @staticmethod
     def update(channel_code: str, update_data: Dict) -> tuple[bool, int]:
@@ -394,25 +787,191 @@ class YtChannelDB:
                 return True, channel_id
 
     @staticmethod
-    def get_unscraped_channels(limit: int = 100) -> List[str]:
+    def claim_due_channels(
+        worker: str,
+        limit: int = 100,
+        lease_seconds: int = 3600,
+        scoring: Optional[Dict] = None,
+    ) -> List[Dict]:
+        # Leases due channels to worker in one statement, other schedulers skip
+        # them until the lease is released or runs out. Without scoring the
+        # longest due go first. With lib.priority's scoring the candidates
+        # longest due are scored and the best ranked of them are claimed.
+        # Returns channel_code and priority rows, best ranked first.
+        if scoring is None:
+            query = """
+                UPDATE youtube_channel
+                SET claimed_by = %(worker)s,
+                    lease_until = NOW() + %(lease_seconds)s * INTERVAL '1 second'
+                WHERE id IN (
+                    SELECT id
+                    FROM youtube_channel
+                    -- Never scraped, or due for the daily refresh
+                    WHERE (
+                        NOT channel_info_scraped
+                        OR update_time IS NULL
+                        OR update_time < NOW() - INTERVAL '24 hours'
+                    )
+                    AND (lease_until IS NULL OR lease_until < NOW())
+                    AND (skip_until IS NULL OR skip_until < NOW())
+                    ORDER BY update_time NULLS FIRST
+                    LIMIT %(limit)s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING
+                    channel_code,
+                    0.0 AS priority,
+                    EXTRACT(EPOCH FROM update_time) AS rank
+            """
+            scoring = {}
+        else:
+            # Same candidates, then the score of lib.priority and the rank of
+            # PriorityJobQueue: the time the channel fell due, moved earlier by
+            # priority * head_start seconds
+            query = """
+                WITH candidates AS (
+                    SELECT
+                        id,
+                        subscribers,
+                        EXTRACT(EPOCH FROM NOW() - update_time)
+                            AS seconds_since_update,
+                        CASE
+                            WHEN NOT channel_info_scraped OR update_time IS NULL
+                            THEN COALESCE(update_time, create_time)
+                            ELSE update_time + INTERVAL '24 hours'
+                        END AS due_time
+                    FROM youtube_channel
+                    WHERE (
+                        NOT channel_info_scraped
+                        OR update_time IS NULL
+                        OR update_time < NOW() - INTERVAL '24 hours'
+                    )
+                    AND (lease_until IS NULL OR lease_until < NOW())
+                    AND (skip_until IS NULL OR skip_until < NOW())
+                    ORDER BY update_time NULLS FIRST
+                    LIMIT %(candidates)s
+                    FOR UPDATE SKIP LOCKED
+                ),
+                parts AS (
+                    SELECT
+                        candidates.id,
+                        candidates.due_time,
+                        LEAST(
+                            LOG(1 + COALESCE(candidates.subscribers, 0)::float)
+                                / LOG(%(max_subscribers)s::float),
+                            1
+                        ) AS reach,
+                        changes.per_day
+                            / (changes.per_day + %(changes_per_day_half)s)
+                            AS change_rate,
+                        -- Never scraped is as stale as it gets
+                        COALESCE(
+                            GREATEST(candidates.seconds_since_update, 0)
+                                / (
+                                    GREATEST(candidates.seconds_since_update, 0)
+                                    + %(staleness_half)s
+                                ),
+                            1
+                        ) AS staleness
+                    FROM candidates
+                    CROSS JOIN LATERAL (
+                        SELECT COUNT(*)::float / %(change_window_days)s AS per_day
+                        FROM channel_changes
+                        WHERE channel_changes.channel_id = candidates.id
+                        AND channel_changes.create_time
+                            > NOW() - %(change_window_days)s * INTERVAL '1 day'
+                    ) AS changes
+                ),
+                scored AS (
+                    SELECT
+                        id,
+                        due_time,
+                        %(subscribers_weight)s * reach
+                            + %(change_rate_weight)s * change_rate
+                            + %(staleness_weight)s * staleness AS priority
+                    FROM parts
+                ),
+                claimed AS (
+                    SELECT
+                        id,
+                        priority,
+                        EXTRACT(EPOCH FROM due_time)
+                            - priority * %(head_start)s AS rank
+                    FROM scored
+                    ORDER BY rank
+                    LIMIT %(limit)s
+                )
+                UPDATE youtube_channel
+                SET claimed_by = %(worker)s,
+                    lease_until = NOW() + %(lease_seconds)s * INTERVAL '1 second'
+                FROM claimed
+                WHERE youtube_channel.id = claimed.id
+                RETURNING youtube_channel.channel_code, claimed.priority, claimed.rank
+            """
+
         with get_db() as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(
+                    query,
+                    {
+                        **scoring,
+                        "worker": worker,
+                        "lease_seconds": lease_seconds,
+                        "limit": limit,
+                    },
+                )
+                channels = cur.fetchall()
+                conn.commit()
+
+                # Never scraped ones have no rank without scoring, they go first
+                channels.sort(
+                    key=lambda channel: (
+                        channel["rank"] is not None,
+                        channel["rank"],
+                    )
+                )
+                return [
+                    {
+                        "channel_code": channel["channel_code"],
+                        "priority": float(channel["priority"]),
+                    }
+                    for channel in channels
+                ]
+
+    @staticmethod
+    def release_channel(channel_code: str) -> bool:
+        # Whoever claimed it, the lease only guards the scrape that just ended
+        with get_db() as conn:
+            with conn.cursor() as cur:
                 cur.execute(
                     """
-                    SELECT id, channel_code 
-                    FROM youtube_channel 
-                    WHERE channel_info_scraped = %s
-                    AND update_time IS NULL 
-                        OR update_time < NOW() - INTERVAL '24 hours'
-                    ORDER BY update_time NULLS FIRST
-                    LIMIT %s
-                    FOR UPDATE SKIP LOCKED
+                    UPDATE youtube_channel
+                    SET claimed_by = NULL, lease_until = NULL
+                    WHERE channel_code = %s AND claimed_by IS NOT NULL
                     """,
-                    (False, limit),
+                    (channel_code,),
                 )
-                channels = cur.fetchall()
+                conn.commit()
+                return cur.rowcount == 1
 
-                return [channel["channel_code"] for channel in channels]
+    @staticmethod
+    def skip_channel(channel_code: str, seconds: Optional[float] = None) -> bool:
+        # Keeps claim_due_channels off the channel for seconds, None for good
+        with get_db() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    UPDATE youtube_channel
+                    SET skip_until = CASE
+                        WHEN %s::float IS NULL THEN 'infinity'::timestamptz
+                        ELSE NOW() + %s * INTERVAL '1 second'
+                    END
+                    WHERE channel_code = %s
+                    """,
+                    (seconds, seconds, channel_code),
+                )
+                conn.commit()
+                return cur.rowcount == 1
 
     @staticmethod
     def get_channels() -> list:
@@ -428,6 +987,16 @@ class YtChannelDB:
 
                 return channels
 
+    @staticmethod
+    def get_ids(channel_codes: List[str]) -> Dict[str, int]:
+        with get_db() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT channel_code, id FROM youtube_channel WHERE channel_code = ANY(%s)",
+                    (list(channel_codes),),
+                )
+                return dict(cur.fetchall())
+
     @staticmethod
     def get_channel_stats(channel_code: str) -> list:
         with get_db() as conn:
@@ -448,24 +1017,21 @@ class YtChannelDB:
 class YtShortDB:
     @staticmethod
     def create(short_code: str, channel_id: int) -> int:
+        return YtShortDB.ensure_many([short_code], channel_id)[short_code]
+
+    @staticmethod
+    def ensure_many(short_codes: List[str], channel_id: int) -> Dict[str, int]:
         with get_db() as conn:
             with conn.cursor() as cur:
-                cur.execute(
-                    "SELECT id FROM youtube_shorts WHERE short_code = %s",
-                    (short_code,),
-                )
-                result = cur.fetchone()
-
-                if result:
-                    return result[0]
-
-                cur.execute(
-                    "INSERT INTO youtube_shorts (short_code, channel_id) VALUES (%s, %s) RETURNING id",
-                    [short_code, channel_id],
+                short_ids = ensure_codes(
+                    cur,
+                    "youtube_shorts",
+                    "short_code",
+                    short_codes,
+                    {"channel_id": channel_id},
                 )
-                short_id = cur.fetchone()[0]
                 conn.commit()
-                return short_id
+                return short_ids
 
     @staticmethod
     def update(short_id: int, update_data: Dict) -> bool:
@@ -505,40 +1071,38 @@ class YtVideoDB:
     ) -> int:
         with get_db() as conn:
             with conn.cursor() as cur:
-                cur.execute(
-                    "SELECT id FROM youtube_videos WHERE video_code = %s",
-                    (video_code,),
-                )
-                result = cur.fetchone()
-
-                if result:
-                    return result[0]
-
-                cur.execute(
-                    "INSERT INTO youtube_videos (title, video_code, url, thumbnail_url, channel_id) VALUES (%s, %s, %s, %s, %s) RETURNING id",
-                    [
-                        title,
-                        video_code,
-                        url,
-                        thumbnail_url,
-                        channel_id,
-                    ],
+                video_ids = ensure_codes(
+                    cur,
+                    "youtube_videos",
+                    "video_code",
+                    [video_code],
+                    {
+                        "title": title,
+                        "url": url,
+                        "thumbnail_url": thumbnail_url,
+                        "channel_id": channel_id,
+                    },
                 )
-                video_id = cur.fetchone()[0]
                 conn.commit()
-                return video_id
+                return video_ids[video_code]
 
     @staticmethod
-    def create_many(values: list[tuple], channel_id: int) -> bool:
+    def create_many(values: list[tuple], channel_id: int) -> tuple[int, int]:
+        # Returns (inserted, skipped), skipped videos were already stored
         with get_db() as conn:
             with conn.cursor() as cur:
-                cur.executemany(
-                    """
-                    INSERT INTO youtube_videos 
-                    (title, video_code, url, thumbnail_url, channel_id)
-                    VALUES (%s, %s, %s, %s, %s)
-                    ON CONFLICT DO NOTHING
-                """,
+                counts = copy_insert(
+                    cur,
+                    "youtube_videos",
+                    [
+                        "title",
+                        "video_code",
+                        "url",
+                        "thumbnail_url",
+                        "duration",
+                        "views",
+                        "channel_id",
+                    ],
                     values,
                 )
                 cur.execute(
@@ -546,7 +1110,7 @@ class YtVideoDB:
                     [True, channel_id],
                 )
                 conn.commit()
-                return True
+                return counts
 
     @staticmethod
     def update(video_id: int, update_data: Dict) -> bool:
@@ -559,6 +1123,54 @@ class YtVideoDB:
                 conn.commit()
                 return True
 
+    @staticmethod
+    def create_many_for_channels(
+        values: list[tuple], channel_ids: List[int]
+    ) -> tuple[int, int]:
+        # create_many for the listings of several channels at once
+        with get_db() as conn:
+            with conn.cursor() as cur:
+                counts = copy_insert(
+                    cur,
+                    "youtube_videos",
+                    [
+                        "title",
+                        "video_code",
+                        "url",
+                        "thumbnail_url",
+                        "duration",
+                        "views",
+                        "channel_id",
+                    ],
+                    values,
+                )
+                cur.execute(
+                    "UPDATE youtube_channel SET videos_info_scraped = %s WHERE id = ANY(%s)",
+                    [True, list(channel_ids)],
+                )
+                conn.commit()
+                return counts
+
+    @staticmethod
+    def update_video_and_shorts_counts(num_videos: Dict[int, int]) -> int:
+        # update_video_and_shorts_count for several channels in one statement
+        with get_db() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    UPDATE youtube_channel
+                    SET num_videos = counts.num_videos,
+                        num_shorts = youtube_channel.content_count - counts.num_videos
+                    FROM (
+                        SELECT unnest(%s::int[]) AS id, unnest(%s::int[]) AS num_videos
+                    ) AS counts
+                    WHERE youtube_channel.id = counts.id
+                    """,
+                    (list(num_videos.keys()), list(num_videos.values())),
+                )
+                conn.commit()
+                return cur.rowcount
+
     @staticmethod
     def update_video_and_shorts_count(channel_id: int, num_videos: int) -> bool:
         with get_db() as conn:
@@ -593,6 +1205,78 @@ class YtVideoDB:
                 )
                 return cur.fetchall()
 
+    @staticmethod
+    def get_codes_by_channel(channel_id: int) -> set[str]:
+        with get_db() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT video_code FROM youtube_videos WHERE channel_id = %s",
+                    (channel_id,),
+                )
+                return {row[0] for row in cur.fetchall()}
+
+    @staticmethod
+    def get_codes_missing_details(channel_id: int, limit: int) -> List[str]:
+        # Listing rows never set fetched_timestamp, update_details does
+        with get_db() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    SELECT video_code FROM youtube_videos
+                    WHERE channel_id = %s AND fetched_timestamp IS NULL
+                    ORDER BY id
+                    LIMIT %s
+                    """,
+                    (channel_id, limit),
+                )
+                return [row[0] for row in cur.fetchall()]
+
+    @staticmethod
+    def update_details(video_code: str, details: Dict) -> bool:
+        with get_db() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    UPDATE youtube_videos
+                    SET description = %s,
+                        likes = %s,
+                        duration = COALESCE(NULLIF(%s, 0), duration),
+                        comments_count = %s,
+                        transcript = %s,
+                        related_videos = %s,
+                        fetched_timestamp = NOW()
+                    WHERE video_code = %s
+                    RETURNING id
+                    """,
+                    (
+                        details.get("description"),
+                        details.get("likes"),
+                        details.get("duration") or 0,
+                        details.get("comments_count"),
+                        json.dumps(details.get("transcript", [])),
+                        json.dumps(details.get("related", [])),
+                        video_code,
+                    ),
+                )
+                row = cur.fetchone()
+                if row is None:
+                    return False
+
+                # The scraped comments replace the stored ones, so writing the
+                # same details twice doesn't duplicate them
+                cur.execute(
+                    """
+                    DELETE FROM youtube_comments
+                    WHERE content_type = 'video' AND content_id = %s
+                    """,
+                    (row[0],),
+                )
+                YtCommentsDB.copy_many(
+                    cur, "video", row[0], details.get("comments") or []
+                )
+                conn.commit()
+                return True
+
     @staticmethod
     def get_by_code(video_code: str) -> Optional[Dict]:
         with get_db() as conn:
@@ -606,24 +1290,21 @@ class YtVideoDB:
 class YtCommunityPostDB:
     @staticmethod
     def create(post_code: str, channel_id: int) -> int:
+        return YtCommunityPostDB.ensure_many([post_code], channel_id)[post_code]
+
+    @staticmethod
+    def ensure_many(post_codes: List[str], channel_id: int) -> Dict[str, int]:
         with get_db() as conn:
             with conn.cursor() as cur:
-                cur.execute(
-                    "SELECT id FROM youtube_community_posts WHERE post_code = %s",
-                    (post_code,),
+                post_ids = ensure_codes(
+                    cur,
+                    "youtube_community_posts",
+                    "post_code",
+                    post_codes,
+                    {"channel_id": channel_id},
                 )
-                result = cur.fetchone()
-
-                if result:
-                    return result[0]
-
-                cur.execute(
-                    "INSERT INTO youtube_community_posts (post_code, channel_id) VALUES (%s, %s) RETURNING id",
-                    [post_code, channel_id],
-                )
-                post_id = cur.fetchone()[0]
                 conn.commit()
-                return post_id
+                return post_ids
 
     @staticmethod
     def update(post_id: int, update_data: Dict) -> bool:
@@ -658,39 +1339,51 @@ class YtCommunityPostDB:
 
 
 class YtCommentsDB:
+    COLUMNS = [
+        "content_type",
+        "content_id",
+        "comment",
+        "commenter_channel_name",
+        "commenter_display_picture_url",
+        "likes",
+        "comment_date",
+        "replies_count",
+        "liked_by_creator",
+        "is_pinned",
+    ]
+
     @staticmethod
-    def create_many(content_type: str, content_id: int, comments: List[Dict]) -> bool:
+    def create_many(
+        content_type: str, content_id: int, comments: List[Dict]
+    ) -> tuple[int, int]:
+        # Returns (inserted, skipped)
         with get_db() as conn:
             with conn.cursor() as cur:
-                values = [
-                    (
-                        content_type,
-                        content_id,
-                        comment.get("comment"),
-                        comment.get("commenter_channel_name"),
-                        comment.get("commenter_display_picture_url"),
-                        comment.get("likes", 0),
-                        comment.get("comment_date"),
-                        comment.get("replies_count", 0),
-                        comment.get("liked_by_creator", False),
-                        comment.get("is_pinned", False),
-                    )
-                    for comment in comments
-                ]
-
-                cur.executemany(
-                    """
-                    INSERT INTO youtube_comments 
-                    (content_type, content_id, comment, commenter_channel_name, 
-                     commenter_display_picture_url, likes, comment_date, 
-                     replies_count, liked_by_creator, is_pinned)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT DO NOTHING
-                """,
-                    values,
-                )
+                counts = YtCommentsDB.copy_many(cur, content_type, content_id, comments)
                 conn.commit()
-                return True
+                return counts
+
+    @staticmethod
+    def copy_many(
+        cur, content_type: str, content_id: int, comments: List[Dict]
+    ) -> tuple[int, int]:
+        # create_many within the caller's transaction
+        values = [
+            (
+                content_type,
+                content_id,
+                comment.get("comment"),
+                comment.get("commenter_channel_name"),
+                comment.get("commenter_display_picture_url"),
+                comment.get("likes", 0),
+                comment.get("comment_date"),
+                comment.get("replies_count", 0),
+                comment.get("liked_by_creator", False),
+                comment.get("is_pinned", False),
+            )
+            for comment in comments
+        ]
+        return copy_insert(cur, "youtube_comments", YtCommentsDB.COLUMNS, values)
 
     @staticmethod
     def get_by_content(content_type: str, content_id: int) -> List[Dict]:
@@ -705,5 +1398,259 @@ class YtCommentsDB:
                 return cur.fetchall()
 
 
+class ScrapeJobDB:
+    @staticmethod
+    def enqueue(
+        channel_name: str,
+        job_type: str,
+        payload: Dict,
+        priority: float = 0.0,
+        head_start: float = 0.0,
+    ) -> Optional[int]:
+        # Ranked as if queued priority * head_start seconds earlier
+        with get_db() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    INSERT INTO scrape_jobs (channel_name, job_type, payload, priority, rank)
+                    VALUES (%s, %s, %s, %s, EXTRACT(EPOCH FROM NOW()) - %s)
+                    ON CONFLICT (job_type, channel_name, payload)
+                        WHERE status = 'queued' DO NOTHING
+                    RETURNING id
+                    """,
+                    (
+                        channel_name,
+                        job_type,
+                        json.dumps(payload, sort_keys=True),
+                        priority,
+                        priority * head_start,
+                    ),
+                )
+                result = cur.fetchone()
+                if result:
+                    # Delivered on commit, wakes idle PgJobQueue workers on all hosts
+                    cur.execute("SELECT pg_notify(%s, '')", (SCRAPE_JOBS_CHANNEL,))
+                conn.commit()
+                return result[0] if result else None
+
+    @staticmethod
+    def claim(
+        worker: str,
+        limit: int,
+        lease_seconds: int,
+        job_types: Optional[List[str]] = None,
+        skip_types: Optional[List[str]] = None,
+    ) -> List[Dict]:
+        # Running jobs whose lease ran out belong to a dead worker, take them over.
+        # job_types limits the claim to those types, None claims any, and
+        # skip_types are left alone.
+        with get_db() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(
+                    """
+                    UPDATE scrape_jobs
+                    SET status = 'running',
+                        claimed_by = %s,
+                        lease_until = NOW() + %s * INTERVAL '1 second',
+                        attempts = attempts + 1
+                    WHERE id IN (
+                        SELECT id
+                        FROM scrape_jobs
+                        WHERE (
+                            (
+                                status = 'queued'
+                                AND (not_before IS NULL OR not_before <= NOW())
+                            )
+                            OR (status = 'running' AND lease_until < NOW())
+                        )
+                        AND (%s::varchar[] IS NULL OR job_type = ANY(%s))
+                        AND NOT job_type = ANY(%s::varchar[])
+                        ORDER BY rank, id
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING id, channel_name, job_type, payload, priority, rank, attempts
+                    """,
+                    (
+                        worker,
+                        lease_seconds,
+                        job_types,
+                        job_types,
+                        list(skip_types or []),
+                        limit,
+                    ),
+                )
+                jobs = cur.fetchall()
+                conn.commit()
+                return sorted(jobs, key=lambda job: (job["rank"], job["id"]))
+
+    @staticmethod
+    def heartbeat(job_ids: List[int], worker: str, lease_seconds: int) -> int:
+        with get_db() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    UPDATE scrape_jobs
+                    SET lease_until = NOW() + %s * INTERVAL '1 second'
+                    WHERE id = ANY(%s) AND claimed_by = %s
+                    """,
+                    (lease_seconds, job_ids, worker),
+                )
+                conn.commit()
+                return cur.rowcount
+
+    @staticmethod
+    def release(job_ids: List[int], worker: str) -> int:
+        # Hands back claimed jobs that never ran, their claim was no attempt and
+        # their rank stays
+        with get_db() as conn:
+            with conn.cursor() as cur:
+                # Drop jobs that were queued again meanwhile, requeueing them would
+                # violate scrape_jobs_pending_unique_idx
+                cur.execute(
+                    """
+                    DELETE FROM scrape_jobs AS job
+                    WHERE job.id = ANY(%s) AND job.claimed_by = %s
+                    AND EXISTS (
+                        SELECT 1
+                        FROM scrape_jobs AS pending
+                        WHERE pending.status = 'queued'
+                        AND pending.job_type = job.job_type
+                        AND pending.channel_name = job.channel_name
+                        AND pending.payload = job.payload
+                    )
+                    """,
+                    (job_ids, worker),
+                )
+                cur.execute(
+                    """
+                    UPDATE scrape_jobs
+                    SET status = 'queued',
+                        claimed_by = NULL,
+                        lease_until = NULL,
+                        attempts = attempts - 1
+                    WHERE id = ANY(%s) AND claimed_by = %s
+                    """,
+                    (job_ids, worker),
+                )
+                conn.commit()
+                return cur.rowcount
+
+    @staticmethod
+    def retry(job_id: int, worker: str, delay: float, error: str) -> bool:
+        # Queues a failed job again, claimable after delay seconds. Its attempts
+        # carry over. Returns False when the same job was queued meanwhile, the
+        # failed one is dropped for it as in release.
+        with get_db() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    DELETE FROM scrape_jobs AS job
+                    WHERE job.id = %s AND job.claimed_by = %s
+                    AND EXISTS (
+                        SELECT 1
+                        FROM scrape_jobs AS pending
+                        WHERE pending.status = 'queued'
+                        AND pending.job_type = job.job_type
+                        AND pending.channel_name = job.channel_name
+                        AND pending.payload = job.payload
+                    )
+                    """,
+                    (job_id, worker),
+                )
+                cur.execute(
+                    """
+                    UPDATE scrape_jobs
+                    SET status = 'queued',
+                        claimed_by = NULL,
+                        lease_until = NULL,
+                        not_before = NOW() + %s * INTERVAL '1 second',
+                        last_error = %s
+                    WHERE id = %s AND claimed_by = %s
+                    """,
+                    (delay, error, job_id, worker),
+                )
+                conn.commit()
+                return cur.rowcount == 1
+
+    @staticmethod
+    def complete(job_id: int, worker: str) -> bool:
+        # A job whose lease ran out may be running elsewhere by now, only its
+        # current owner removes it
+        with get_db() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "DELETE FROM scrape_jobs WHERE id = %s AND claimed_by = %s",
+                    (job_id, worker),
+                )
+                conn.commit()
+                return cur.rowcount == 1
+
+    @staticmethod
+    def count_queued(job_types: Optional[List[str]] = None) -> int:
+        with get_db() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    SELECT COUNT(*) FROM scrape_jobs
+                    WHERE status = 'queued'
+                    AND (%s::varchar[] IS NULL OR job_type = ANY(%s))
+                    """,
+                    (job_types, job_types),
+                )
+                return cur.fetchone()[0]
+
+
+class DeadLetterDB:
+    @staticmethod
+    def add(
+        channel_name: str,
+        job_type: str,
+        payload: Optional[Dict],
+        attempts: int,
+        permanent: bool,
+        reason: str,
+        error: Optional[str] = None,
+    ) -> int:
+        with get_db() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    INSERT INTO dead_letter_jobs
+                    (channel_name, job_type, payload, attempts, permanent, reason, error)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    RETURNING id
+                    """,
+                    (
+                        channel_name,
+                        job_type,
+                        json.dumps(payload or {}, sort_keys=True),
+                        attempts,
+                        permanent,
+                        reason,
+                        error,
+                    ),
+                )
+                dead_letter_id = cur.fetchone()[0]
+                conn.commit()
+                return dead_letter_id
+
+    @staticmethod
+    def get_recent(limit: int = 100, job_type: Optional[str] = None) -> List[Dict]:
+        with get_db() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(
+                    """
+                    SELECT *
+                    FROM dead_letter_jobs
+                    WHERE %s::varchar IS NULL OR job_type = %s
+                    ORDER BY create_time DESC
+                    LIMIT %s
+                    """,
+                    (job_type, job_type, limit),
+                )
+                return cur.fetchall()
+
+
 if __name__ == "__main__":
     init_db()
@@ -0,0 +1,82 @@
+import sys
+import time
+import uuid
+
+from db import init_db, get_db, YtChannelDB, YtVideoDB
+from lib.constants import Constants
+
+INSERT_VIDEO = """
+    INSERT INTO youtube_videos
+    (title, video_code, url, thumbnail_url, duration, views, channel_id)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+    ON CONFLICT DO NOTHING
+"""
+
+
+def make_videos(num_rows: int, channel_id: int) -> list[tuple]:
+    run = uuid.uuid4().hex[:8]
+    return [
+        (
+            f"Bench video {i}",
+            f"bench-{run}-{i}",
+            Constants.VIDEO_PAGE_LINK.format(f"bench-{run}-{i}"),
+            "",
+            123.0,
+            i,
+            channel_id,
+        )
+        for i in range(num_rows)
+    ]
+
+
+def insert_executemany(videos: list[tuple]) -> None:
+    with get_db() as conn:
+        with conn.cursor() as cur:
+            cur.executemany(INSERT_VIDEO, videos)
+            conn.commit()
+
+
+# Rows/sec of YtVideoDB.create_many (COPY into staging + one merge) against
+# per-row executemany, on the database configured through DATABASE__*,
+# e.g. `python dev_bench_db.py 1000 10000 100000`
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+
+    init_db()
+    channel_id = YtChannelDB.create("bench-db-channel")
+
+    try:
+        for num_rows in sizes:
+            videos = make_videos(num_rows, channel_id)
+            started = time.monotonic()
+            insert_executemany(videos)
+            elapsed = time.monotonic() - started
+            print(
+                f"executemany {num_rows:>7} rows in {elapsed:7.2f}s "
+                f"({num_rows / elapsed:>9.0f} rows/s)"
+            )
+
+            videos = make_videos(num_rows, channel_id)
+            started = time.monotonic()
+            inserted, skipped = YtVideoDB.create_many(videos, channel_id)
+            elapsed = time.monotonic() - started
+            print(
+                f"copy        {num_rows:>7} rows in {elapsed:7.2f}s "
+                f"({num_rows / elapsed:>9.0f} rows/s, {inserted} inserted)"
+            )
+
+            # Same rows again, all of them hit the unique video_code
+            started = time.monotonic()
+            inserted, skipped = YtVideoDB.create_many(videos, channel_id)
+            elapsed = time.monotonic() - started
+            print(
+                f"copy again  {num_rows:>7} rows in {elapsed:7.2f}s "
+                f"({num_rows / elapsed:>9.0f} rows/s, {skipped} skipped)"
+            )
+
+    finally:
+        with get_db() as conn:
+            with conn.cursor() as cur:
+                # Cascades to the bench videos
+                cur.execute("DELETE FROM youtube_channel WHERE id = %s", (channel_id,))
+                conn.commit()
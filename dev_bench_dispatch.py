@@ -0,0 +1,75 @@
+import statistics
+import sys
+import threading
+import time
+
+from lib.constants import Constants
+from lib.job_queue import create_job_queue
+from lib.structures import JobType
+from lib.utils import get_logger
+
+
+def measure(constants, logger, num_workers: int, num_jobs: int, poll: bool) -> list:
+    # poll=True mimics the old empty() check + sleep(1) loop of ScraperWorker
+    job_queue = create_job_queue(constants=constants, logger=logger)
+    enqueued = {}
+    latencies = []
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def work():
+        while not done.is_set():
+            job = job_queue.get_job(timeout=0) if poll else job_queue.get_job()
+            if not job:
+                if poll:
+                    time.sleep(1)
+                continue
+
+            with lock:
+                latencies.append(time.monotonic() - enqueued[job.channel_name])
+                if len(latencies) == num_jobs:
+                    done.set()
+            job_queue.complete_job(job.channel_name, job.job_id)
+
+    workers = [threading.Thread(target=work) for _ in range(num_workers)]
+    for worker in workers:
+        worker.start()
+
+    for i in range(num_jobs):
+        channel_name = f"bench-dispatch-{time.time_ns()}-{i}"
+        enqueued[channel_name] = time.monotonic()
+        job_queue.add_job(
+            channel_name=channel_name,
+            job_type=JobType.videos_basic_info,
+            data={"channel_id": i},
+        )
+        # Spread arrivals out so most jobs find an idle worker
+        time.sleep(0.01)
+
+    done.wait()
+    job_queue.close()
+    for worker in workers:
+        worker.join()
+
+    return latencies
+
+
+# Time from add_job to a worker picking the job up, blocking vs polling workers,
+# e.g. `python dev_bench_dispatch.py 64 500 memory` (or postgres)
+if __name__ == "__main__":
+    num_workers = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    num_jobs = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+
+    constants = Constants()
+    if len(sys.argv) > 3:
+        constants.JOB_QUEUE_BACKEND = sys.argv[3]
+    logger = get_logger("logs")
+
+    for mode, poll in (("blocking", False), ("polling", True)):
+        latencies = sorted(measure(constants, logger, num_workers, num_jobs, poll))
+        print(
+            f"{mode}: {num_jobs} jobs, {num_workers} workers, dispatch latency "
+            f"p50={statistics.median(latencies) * 1000:.1f}ms "
+            f"p99={latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f}ms "
+            f"max={latencies[-1] * 1000:.1f}ms"
+        )
@@ -0,0 +1,173 @@
+import sys
+import time
+
+from db import INDEXES, delete_db, init_db, get_db
+
+# delete_db() drops every table of the configured database, only databases
+# named like this are taken for a scratch database
+SCRATCH_DB_SUFFIX = "_bench"
+
+# The hot queries, as run by db.py
+QUERIES = {
+    "claim_due_channels": """
+        WITH candidates AS (
+            SELECT id, subscribers, update_time
+            FROM youtube_channel
+            WHERE (
+                NOT channel_info_scraped
+                OR update_time IS NULL
+                OR update_time < NOW() - INTERVAL '24 hours'
+            )
+            AND (lease_until IS NULL OR lease_until < NOW())
+            AND (skip_until IS NULL OR skip_until < NOW())
+            ORDER BY update_time NULLS FIRST
+            LIMIT 2000
+        )
+        SELECT candidates.id, candidates.subscribers, changes.recent_changes
+        FROM candidates
+        CROSS JOIN LATERAL (
+            SELECT COUNT(*) AS recent_changes
+            FROM channel_changes
+            WHERE channel_changes.channel_id = candidates.id
+            AND channel_changes.create_time > NOW() - 30 * INTERVAL '1 day'
+        ) AS changes
+    """,
+    "YtVideoDB.get_by_channel": """
+        SELECT * FROM youtube_videos WHERE channel_id = 4242 ORDER BY uploaded_date DESC
+    """,
+    "YtVideoDB.get_codes_by_channel": """
+        SELECT video_code FROM youtube_videos WHERE channel_id = 4242
+    """,
+    "YtShortDB.get_by_channel": """
+        SELECT * FROM youtube_shorts WHERE channel_id = 4242 ORDER BY posted_date DESC
+    """,
+    "YtCommunityPostDB.get_by_channel": """
+        SELECT * FROM youtube_community_posts WHERE channel_id = 4242 ORDER BY posted_date DESC
+    """,
+    "YtCommentsDB.get_by_content": """
+        SELECT * FROM youtube_comments
+        WHERE content_type = 'video' AND content_id = 4242
+        ORDER BY comment_date DESC
+    """,
+}
+
+
+def fill(cur, num_rows: int) -> None:
+    num_channels = num_rows
+    num_parents = max(num_rows // 100, 1)
+
+    # Mostly scraped channels, a few never scraped and a few stale
+    cur.execute(
+        """
+        INSERT INTO youtube_channel (channel_code, channel_info_scraped, update_time)
+        SELECT
+            'bench-' || i,
+            i % 100 <> 0,
+            CASE
+                WHEN i % 100 = 0 AND i % 200 = 0 THEN NULL
+                ELSE NOW() - (i % 48) * INTERVAL '1 hour'
+            END
+        FROM generate_series(1, %s) AS i
+        """,
+        (num_channels,),
+    )
+    for table, code_column, date_column in (
+        ("youtube_videos", "video_code", "uploaded_date"),
+        ("youtube_shorts", "short_code", "posted_date"),
+        ("youtube_community_posts", "post_code", "posted_date"),
+    ):
+        cur.execute(
+            f"""
+            INSERT INTO {table} ({code_column}, channel_id, {date_column})
+            SELECT 'bench-' || i, 1 + i % %s, NOW() - i * INTERVAL '1 minute'
+            FROM generate_series(1, %s) AS i
+            """,
+            (num_parents, num_rows),
+        )
+    cur.execute(
+        """
+        INSERT INTO youtube_comments (content_type, content_id, comment, comment_date)
+        SELECT 'video', 1 + i % %s, 'bench', NOW() - i * INTERVAL '1 minute'
+        FROM generate_series(1, %s) AS i
+        """,
+        (num_parents, num_rows),
+    )
+
+
+def explain(cur) -> dict[str, str]:
+    cur.execute("ANALYZE")
+    plans = {}
+    for name, query in QUERIES.items():
+        cur.execute(f"EXPLAIN (ANALYZE, BUFFERS) {query}")
+        plans[name] = "\n".join(row[0] for row in cur.fetchall())
+    return plans
+
+
+def check_scratch_db(args: list[str]) -> None:
+    # DATABASE__* is the same configuration the service uses, refuse anything
+    # not explicitly marked and named as a scratch database
+    if "--scratch" not in args:
+        sys.exit(
+            "Drops and recreates every table, pass --scratch to run it against "
+            f"a dedicated *{SCRATCH_DB_SUFFIX} database"
+        )
+
+    with get_db() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT current_database()")
+            name = cur.fetchone()[0]
+    if not name.endswith(SCRATCH_DB_SUFFIX):
+        sys.exit(
+            f"Refusing to run against {name}, the scratch database's name must "
+            f"end with {SCRATCH_DB_SUFFIX}"
+        )
+
+
+def summarize(name: str, plan: str) -> str:
+    scan = "SEQ SCAN" if "Seq Scan" in plan else "index"
+    runtime = plan.strip().splitlines()[-1].strip()
+    return f"  {name:<34} {scan:<9} {runtime}"
+
+
+# Plans of the hot queries with and without INDEXES. Recreates the schema like
+# dev_init_db.py, only against a scratch database configured through
+# DATABASE__*, e.g. DATABASE__DB=yt_bench
+# `python dev_bench_indexes.py --scratch 1000000 -v`
+if __name__ == "__main__":
+    check_scratch_db(sys.argv[1:])
+    args = [arg for arg in sys.argv[1:] if arg not in ("-v", "--scratch")]
+    num_rows = int(args[0]) if args else 1000000
+    verbose = "-v" in sys.argv
+
+    delete_db()
+    init_db()
+
+    with get_db() as conn:
+        with conn.cursor() as cur:
+            started = time.monotonic()
+            fill(cur, num_rows)
+            conn.commit()
+            print(
+                f"Inserted {num_rows} rows per table in {time.monotonic() - started:.1f}s"
+            )
+
+            for name in INDEXES:
+                cur.execute(f"DROP INDEX IF EXISTS {name}")
+            conn.commit()
+            without = explain(cur)
+
+    # Creates them again
+    init_db()
+
+    with get_db() as conn:
+        with conn.cursor() as cur:
+            with_indexes = explain(cur)
+
+    for label, plans in (("Without indexes", without), ("With indexes", with_indexes)):
+        print(label)
+        for name, plan in plans.items():
+            print(summarize(name, plan))
+            if verbose:
+                print(plan)
+
+    delete_db()
@@ -0,0 +1,58 @@
+import sys
+import threading
+import time
+
+from db import init_db, get_db
+from lib.constants import Constants
+from lib.job_queue import PgJobQueue
+from lib.structures import JobType
+from lib.utils import get_logger
+
+# Enqueue and claim throughput of the scrape_jobs queue against the database
+# configured through DATABASE__*, e.g. `python dev_bench_queue.py 5000 8`
+if __name__ == "__main__":
+    num_jobs = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    num_workers = int(sys.argv[2]) if len(sys.argv) > 2 else Constants.MAX_WORKERS
+
+    init_db()
+    job_queue = PgJobQueue(constants=Constants(), logger=get_logger("logs"))
+
+    started = time.monotonic()
+    for i in range(num_jobs):
+        job_queue.add_job(
+            channel_name=f"bench-channel-{i}",
+            job_type=JobType.videos_basic_info,
+            data={"channel_id": i},
+        )
+    elapsed = time.monotonic() - started
+    print(f"Enqueued {num_jobs} jobs in {elapsed:.2f}s ({num_jobs / elapsed:.0f}/s)")
+
+    processed = []
+
+    def drain():
+        while True:
+            job = job_queue.get_job(timeout=1)
+            if not job:
+                return
+            job_queue.complete_job(job.channel_name, job.job_id)
+            processed.append(job.job_id)
+
+    workers = [threading.Thread(target=drain) for _ in range(num_workers)]
+    started = time.monotonic()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.monotonic() - started
+    print(
+        f"Claimed and completed {len(processed)} jobs with {num_workers} workers "
+        f"in {elapsed:.2f}s ({len(processed) / elapsed:.0f}/s)"
+    )
+
+    job_queue.close()
+    with get_db() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "DELETE FROM scrape_jobs WHERE channel_name LIKE 'bench-channel-%'"
+            )
+            conn.commit()
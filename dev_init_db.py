@@ -8,6 +8,9 @@ if __name__ == "__main__":
 
     # with open("channel_names.txt", "r") as file:
     with open("example_channel_names.txt", "r") as file:
-        for channel_name in file.readlines():
-            channel_db.create(channel_name.strip())
-            print(channel_name.strip())
+        channel_names = [line.strip() for line in file.readlines() if line.strip()]
+
+    # One statement for the whole list
+    channel_db.ensure_many(channel_names)
+    for channel_name in channel_names:
+        print(channel_name)
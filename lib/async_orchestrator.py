@@ -0,0 +1,281 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import asynccontextmanager
+from logging import Logger
+from typing import Optional
+
+from lib.cdp import CdpBrowser, CdpPage
+from lib.constants import Constants
+from lib.errors import (
+    BotWallError,
+    ChannelNotFoundError,
+    PageLayoutError,
+    ScraperRuntimeError,
+)
+from lib.initial_data import find_first
+from lib.rate_limiter import get_rate_limiter
+from lib.structures import JobType, ScrapeInfoJob, YtScraperConfig
+from lib.utils import save_img_from_url
+from scrapers.channel_info import parse_channel_info, CHANNEL_UNAVAILABLE_SCRIPT
+from scrapers.videos import parse_grid_item, filter_known_videos
+from scrapers.videos_http import parse_listing_items, get_continuation_items
+
+# Posts a continuation to the browse endpoint from inside the page, so it goes
+# out with the page's own cookies and innertube context
+BROWSE_SCRIPT = """
+(async (continuation) => {
+    const response = await fetch(
+        `/youtubei/v1/browse?key=${ytcfg.get("INNERTUBE_API_KEY")}&prettyPrint=false`,
+        {
+            method: "POST",
+            headers: {
+                "Content-Type": "application/json",
+                "X-YouTube-Client-Name": String(ytcfg.get("INNERTUBE_CONTEXT_CLIENT_NAME")),
+                "X-YouTube-Client-Version": ytcfg.get("INNERTUBE_CONTEXT_CLIENT_VERSION"),
+            },
+            body: JSON.stringify({ context: ytcfg.get("INNERTUBE_CONTEXT"), continuation }),
+        },
+    );
+    return await response.json();
+})(CONTINUATION)
+"""
+
+
+# Runs scrape jobs as coroutines on an event loop in its own thread. Pages are
+# spread over ASYNC_BROWSERS Chrome processes driven over CDP, so hundreds of
+# page loads can be in flight without a thread or a browser each. Results are
+# the same as YtScraper's for the job type, through the same parsers and DB.
+class AsyncOrchestrator:
+    def __init__(
+        self,
+        constants: Constants,
+        logger: Logger,
+        config: YtScraperConfig,
+        proxy_server_url: Optional[str] = None,
+    ):
+        self.constants = constants
+        self.logger = logger
+        self.config = config
+        self.proxy_server_url = proxy_server_url
+
+        self.job_types = {JobType(value) for value in constants.ASYNC_ENGINE_JOB_TYPES}
+        self.handlers = {
+            JobType.channel_info: self._scrape_channel_info,
+            JobType.videos_basic_info: self._scrape_videos_basic_info,
+        }
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(
+            target=self.loop.run_forever, name="AsyncOrchestrator", daemon=True
+        )
+        # Bounds the jobs in flight, submit() blocks the caller once it is reached
+        self.slots = threading.BoundedSemaphore(constants.ASYNC_MAX_IN_FLIGHT)
+        self.browsers: list[CdpBrowser] = []
+        self.browsers_lock = None
+
+    def supports(self, job_type: JobType) -> bool:
+        return job_type in self.job_types and job_type in self.handlers
+
+    def start(self) -> None:
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self.loop).result()
+        self.logger.info(
+            f"Async orchestrator started with {len(self.browsers)} browsers for "
+            f"{', '.join(job_type.value for job_type in self.job_types)}."
+        )
+
+    def submit(self, job: ScrapeInfoJob, on_done=None) -> Future:
+        # on_done(get_result) runs off the event loop once the job is done,
+        # get_result() returns the job's result or raises its error
+        self.slots.acquire()
+        future = asyncio.run_coroutine_threadsafe(self._run(job, on_done), self.loop)
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+    def stop(self) -> None:
+        # Let in-flight jobs finish, taking every slot means none are left
+        for _ in range(self.constants.ASYNC_MAX_IN_FLIGHT):
+            self.slots.acquire()
+
+        asyncio.run_coroutine_threadsafe(self._stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    async def _start(self) -> None:
+        self.browsers_lock = asyncio.Lock()
+        for _ in range(self.constants.ASYNC_BROWSERS):
+            self.browsers.append(await self._launch_browser())
+
+    async def _stop(self) -> None:
+        for browser in self.browsers:
+            await browser.close()
+
+    async def _launch_browser(self) -> CdpBrowser:
+        browser = CdpBrowser(self.constants, proxy_server_url=self.proxy_server_url)
+        await browser.start()
+        return browser
+
+    async def _run(self, job: ScrapeInfoJob, on_done=None):
+        self.constants.ASYNC_JOBS_IN_FLIGHT.inc()
+        try:
+            result = await self.handlers[job.job_type](job)
+        except Exception as e:
+            if not on_done:
+                raise
+            error = e
+
+            def get_result():
+                raise error
+
+        else:
+
+            def get_result():
+                return result
+
+        finally:
+            self.constants.ASYNC_JOBS_IN_FLIGHT.dec()
+
+        if not on_done:
+            return result
+        # Follow-up work like queueing jobs blocks, keep it off the loop
+        return await asyncio.to_thread(on_done, get_result)
+
+    @asynccontextmanager
+    async def _page(self, blocking_profile: Optional[str] = None):
+        async with self.browsers_lock:
+            browser = min(self.browsers, key=lambda b: b.pages)
+            if browser.process.returncode is not None:
+                # Chrome died, replace it before handing out pages again
+                self.logger.warning("Async orchestrator browser exited, relaunching.")
+                self.browsers.remove(browser)
+                await browser.close()
+                browser = await self._launch_browser()
+                self.browsers.append(browser)
+
+        page = await browser.new_page(blocking_profile)
+        self.constants.ASYNC_PAGES_OPEN.inc()
+        try:
+            yield page
+        finally:
+            self.constants.ASYNC_PAGES_OPEN.dec()
+            try:
+                await page.close()
+            except ScraperRuntimeError as e:
+                self.logger.warning(f"Failed to close page: {e}")
+
+    async def _goto(self, page: CdpPage, url: str) -> None:
+        # Waits its turn without holding up the loop
+        limiter = get_rate_limiter()
+        await asyncio.sleep(limiter.reserve(url))
+
+        started = time.monotonic()
+        await page.goto(url, self.constants.ASYNC_PAGE_TIMEOUT)
+        self.constants.ASYNC_PAGE_LOAD_DURATION.observe(time.monotonic() - started)
+        landed_url = await page.evaluate("location.href")
+        if limiter.check(url, landed_url):
+            # A consent or sorry page has none of the data, leave it to a retry
+            raise BotWallError(message=f"{url} landed on {landed_url}", url=landed_url)
+
+    async def _scrape_channel_info(self, job: ScrapeInfoJob) -> tuple[bool, int]:
+        channel_name = job.channel_name
+
+        async with self._page("channel_info") as page:
+            await self._goto(
+                page, self.constants.CHANNEL_ABOUT_PAGE_LINK.format(channel_name)
+            )
+            unavailable = await page.evaluate(CHANNEL_UNAVAILABLE_SCRIPT)
+            if unavailable:
+                raise ChannelNotFoundError(
+                    message=f"{channel_name} is unavailable: {unavailable}",
+                    channel=channel_name,
+                )
+            data = await page.evaluate("window.ytInitialData || null")
+
+        info = parse_channel_info(channel_name, data)
+        if info is None:
+            self.logger.error(f"ytInitialData incomplete for {channel_name}.")
+            return False, -1
+
+        # The DB layer and image downloads block, keep them off the loop
+        stored, channel_id = await asyncio.to_thread(
+            self.config.channel_db.update, channel_name, info.dict()
+        )
+        for path, url in (
+            (self.constants.BANNER_PATH, info.banner_url),
+            (self.constants.DP_PATH, info.display_picture_url),
+        ):
+            try:
+                await asyncio.to_thread(
+                    save_img_from_url, path.format(channel_id), url, self.logger
+                )
+            except Exception as e:
+                self.logger.error(f"Failed to save image for {channel_name}: {e}")
+
+        return stored, channel_id
+
+    async def _scrape_videos_basic_info(self, job: ScrapeInfoJob) -> bool:
+        channel_name = job.channel_name
+        channel_id = job.data["channel_id"]
+        video_db = self.config.video_db
+
+        known_codes = set()
+        if self.constants.VIDEOS_INCREMENTAL:
+            known_codes = await asyncio.to_thread(
+                video_db.get_codes_by_channel, channel_id
+            )
+
+        async with self._page("videos_listing") as page:
+            url = self.constants.VIDEOS_PAGE_LINK.format(channel_name)
+            await self._goto(page, url)
+            data = await page.evaluate("window.ytInitialData || null")
+
+            grid = find_first(data, "richGridRenderer") or {}
+            items, continuation = parse_listing_items(
+                grid.get("contents", []), self.constants
+            )
+            if not items:
+                # As in the HTTP engine, no ytInitialData or a layout
+                # parse_listing_items does not read is not a channel without
+                # videos, its count stays as it is
+                raise PageLayoutError(
+                    message=f"No videos in the listing of {channel_name}", url=url
+                )
+            videos, known_streak = filter_known_videos(
+                [parse_grid_item(item, channel_id) for item in items], known_codes, 0
+            )
+            num_items = len(items)
+
+            while (
+                continuation
+                and num_items < self.constants.VIDEOS_COUNT_BASIC_INFO
+                and known_streak < self.constants.INCREMENTAL_STOP_AFTER_KNOWN
+            ):
+                response = await page.evaluate(
+                    BROWSE_SCRIPT.replace("CONTINUATION", json.dumps(continuation)),
+                    await_promise=True,
+                )
+                items, continuation = parse_listing_items(
+                    get_continuation_items(response), self.constants
+                )
+                if not items:
+                    break
+
+                new_videos, known_streak = filter_known_videos(
+                    [parse_grid_item(item, channel_id) for item in items],
+                    known_codes,
+                    known_streak,
+                )
+                videos.extend(new_videos)
+                num_items += len(items)
+
+        videos = videos[: self.constants.VIDEOS_COUNT_BASIC_INFO]
+        await asyncio.to_thread(video_db.create_many, videos, channel_id)
+        await asyncio.to_thread(
+            video_db.update_video_and_shorts_count,
+            channel_id,
+            len(known_codes) + len(videos),
+        )
+        return True
@@ -0,0 +1,274 @@
+import asyncio
+import itertools
+import json
+import os
+import re
+import shutil
+import tempfile
+from typing import Optional
+
+import websockets
+
+from lib.constants import Constants
+from lib.errors import ScraperRuntimeError
+from lib.resource_blocking import get_blocked_urls
+
+CHROME_ARGS = [
+    "--headless=new",
+    "--disable-gpu",
+    "--mute-audio",
+    "--no-sandbox",
+    "--no-first-run",
+    "--disable-extensions",
+    "--disable-dev-shm-usage",
+    "--disable-background-networking",
+    "--disable-blink-features=AutomationControlled",
+    "--remote-debugging-port=0",
+    "about:blank",
+]
+
+
+class CdpConnection:
+    # One websocket to the browser, page sessions are multiplexed over it with
+    # flattened sessionIds instead of a connection per page
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.ids = itertools.count(1)
+        self.pending: dict[int, asyncio.Future] = {}
+        self.listeners: dict[tuple, list[asyncio.Future]] = {}
+        self.reader = asyncio.create_task(self._read())
+
+    @classmethod
+    async def connect(cls, url: str) -> "CdpConnection":
+        return cls(await websockets.connect(url, max_size=None, ping_interval=None))
+
+    async def send(
+        self, method: str, params: Optional[dict] = None, session_id: str = None
+    ) -> dict:
+        message_id = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[message_id] = future
+
+        message = {"id": message_id, "method": method, "params": params or {}}
+        if session_id:
+            message["sessionId"] = session_id
+
+        try:
+            await self.websocket.send(json.dumps(message))
+            return await future
+        finally:
+            self.pending.pop(message_id, None)
+
+    def wait_for(self, event: str, session_id: str = None) -> asyncio.Future:
+        # Register before sending the command that triggers the event
+        key = (session_id, event)
+        future = asyncio.get_running_loop().create_future()
+        self.listeners.setdefault(key, []).append(future)
+        future.add_done_callback(lambda f: self._remove_listener(key, f))
+        return future
+
+    async def close(self) -> None:
+        await self.websocket.close()
+        await self.reader
+
+    def _remove_listener(self, key: tuple, future: asyncio.Future) -> None:
+        listeners = self.listeners.get(key, [])
+        if future in listeners:
+            listeners.remove(future)
+        if not listeners:
+            self.listeners.pop(key, None)
+
+    async def _read(self) -> None:
+        try:
+            async for raw in self.websocket:
+                message = json.loads(raw)
+
+                if "id" in message:
+                    future = self.pending.get(message["id"])
+                    if not future or future.done():
+                        continue
+                    if "error" in message:
+                        future.set_exception(
+                            ScraperRuntimeError(
+                                message=f"CDP error: {message['error'].get('message')}"
+                            )
+                        )
+                    else:
+                        future.set_result(message.get("result", {}))
+                    continue
+
+                key = (message.get("sessionId"), message.get("method"))
+                for future in list(self.listeners.get(key, [])):
+                    if not future.done():
+                        future.set_result(message.get("params", {}))
+
+        except websockets.ConnectionClosed:
+            pass
+
+        finally:
+            error = ScraperRuntimeError(message="CDP connection closed")
+            for future in list(self.pending.values()):
+                if not future.done():
+                    future.set_exception(error)
+            for listeners in list(self.listeners.values()):
+                for future in list(listeners):
+                    if not future.done():
+                        future.set_exception(error)
+
+
+class CdpPage:
+    def __init__(self, browser: "CdpBrowser", target_id: str, session_id: str):
+        self.browser = browser
+        self.target_id = target_id
+        self.session_id = session_id
+
+    async def send(self, method: str, params: Optional[dict] = None) -> dict:
+        return await self.browser.connection.send(method, params, self.session_id)
+
+    async def goto(self, url: str, timeout: float) -> None:
+        # Inline scripts like ytInitialData have run by DOMContentLoaded, no need
+        # to wait for the load event and every subresource
+        loaded = self.browser.connection.wait_for(
+            "Page.domContentEventFired", self.session_id
+        )
+        try:
+            result = await self.send("Page.navigate", {"url": url})
+            if result.get("errorText"):
+                raise ScraperRuntimeError(
+                    message=f"Failed to load {url}: {result['errorText']}"
+                )
+            await asyncio.wait_for(loaded, timeout)
+        finally:
+            loaded.cancel()
+
+    async def evaluate(self, expression: str, await_promise: bool = False):
+        result = await self.send(
+            "Runtime.evaluate",
+            {
+                "expression": expression,
+                "returnByValue": True,
+                "awaitPromise": await_promise,
+            },
+        )
+        if "exceptionDetails" in result:
+            details = result["exceptionDetails"]
+            raise ScraperRuntimeError(
+                message=f"Script failed: {details.get('exception', {}).get('description') or details.get('text')}"
+            )
+        return result.get("result", {}).get("value")
+
+    async def close(self) -> None:
+        self.browser.pages -= 1
+        await self.browser.connection.send(
+            "Target.closeTarget", {"targetId": self.target_id}
+        )
+
+
+# A headless Chrome process driven directly over the DevTools protocol, many
+# pages share the one process
+class CdpBrowser:
+    def __init__(self, constants: Constants, proxy_server_url: Optional[str] = None):
+        self.constants = constants
+        self.proxy_server_url = proxy_server_url
+        self.process = None
+        self.connection = None
+        self.user_data_dir = None
+        self.stderr_task = None
+        self.pages = 0
+
+    async def start(self) -> None:
+        self.user_data_dir = tempfile.mkdtemp(prefix="cdp-")
+        args = [*CHROME_ARGS, f"--user-data-dir={self.user_data_dir}"]
+        if self.proxy_server_url:
+            args.append(f"--proxy-server={self.proxy_server_url}")
+
+        self.process = await asyncio.create_subprocess_exec(
+            os.getenv("CHROME_BIN") or "google-chrome",
+            *args,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        websocket_url = await asyncio.wait_for(
+            self._read_websocket_url(), self.constants.ASYNC_PAGE_TIMEOUT
+        )
+        # Keep draining stderr, Chrome blocks once the pipe buffer is full
+        self.stderr_task = asyncio.create_task(self._drain_stderr())
+
+        self.connection = await CdpConnection.connect(websocket_url)
+        # Pre-accepted consent, same as YtHttpClient
+        await self.connection.send(
+            "Storage.setCookies",
+            {
+                "cookies": [
+                    {
+                        "name": "SOCS",
+                        "value": "CAI",
+                        "domain": ".youtube.com",
+                        "path": "/",
+                    }
+                ]
+            },
+        )
+
+    async def new_page(self, blocking_profile: Optional[str] = None) -> CdpPage:
+        target = await self.connection.send(
+            "Target.createTarget", {"url": "about:blank"}
+        )
+        attached = await self.connection.send(
+            "Target.attachToTarget", {"targetId": target["targetId"], "flatten": True}
+        )
+        page = CdpPage(self, target["targetId"], attached["sessionId"])
+        self.pages += 1
+
+        try:
+            await page.send("Page.enable")
+            await page.send(
+                "Network.setUserAgentOverride",
+                {
+                    "userAgent": self.constants.USER_AGENT,
+                    "acceptLanguage": "en-US,en;q=0.9",
+                },
+            )
+
+            blocked_urls = []
+            if self.constants.BLOCK_RESOURCES:
+                blocked_urls = get_blocked_urls(blocking_profile)
+            if blocked_urls:
+                await page.send("Network.enable")
+                await page.send("Network.setBlockedURLs", {"urls": blocked_urls})
+
+        except Exception:
+            await page.close()
+            raise
+
+        return page
+
+    async def close(self) -> None:
+        if self.connection:
+            await self.connection.close()
+
+        if self.process and self.process.returncode is None:
+            self.process.terminate()
+            await self.process.wait()
+
+        if self.stderr_task:
+            await self.stderr_task
+
+        if self.user_data_dir:
+            shutil.rmtree(self.user_data_dir, ignore_errors=True)
+
+    async def _read_websocket_url(self) -> str:
+        while True:
+            line = await self.process.stderr.readline()
+            if not line:
+                raise ScraperRuntimeError(
+                    message="Chrome exited before opening the DevTools endpoint"
+                )
+
+            match = re.search(r"DevTools listening on (ws://\S+)", line.decode())
+            if match:
+                return match.group(1)
+
+    async def _drain_stderr(self) -> None:
+        while await self.process.stderr.readline():
+            pass
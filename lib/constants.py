@@ -1,3 +1,5 @@
+import os
+
 from prometheus_client import Counter, Histogram, Gauge
 
 
@@ -6,6 +8,109 @@ class Constants:
 
     MAX_WORKERS = 2
 
+    # Threaded workers are split into pools, each serving its job types from
+    # its own queue, so a burst of slow detail jobs can't hold the workers that
+    # refresh channels. Job types not listed go to the first pool.
+    WORKER_POOLS = {
+        "fast": {
+            "job_types": ("channel info", "videos basic info"),
+            "workers": 1,
+        },
+        "slow": {
+            "job_types": (
+                "video details",
+                "shorts basic info",
+                "community posts basic info",
+            ),
+            "workers": MAX_WORKERS,
+        },
+    }
+    # Idle workers take queued jobs of other pools, checked every interval
+    WORKER_POOL_STEALING = False
+    WORKER_POOL_STEAL_INTERVAL = 5
+
+    # Run this many worker processes, one browser each, instead of MAX_WORKERS
+    # threads. 0 keeps the threaded workers, on big hosts set it to the core count.
+    WORKER_PROCESSES = int(os.getenv("SCRAPER_WORKER_PROCESSES", "0"))
+    WORKER_RESTART_DELAY = 5
+    WORKER_STOP_TIMEOUT = 60
+
+    # WebDriver pool
+    # A driver for every threaded worker, pools don't wait on each other's leases
+    DRIVER_POOL_SIZE = sum(pool["workers"] for pool in WORKER_POOLS.values())
+    DRIVER_MAX_USES = 50
+    DRIVER_LEASE_TIMEOUT = 300
+
+    # Block images, fonts, media and tracking requests via CDP (see lib.resource_blocking)
+    BLOCK_RESOURCES = True
+
+    # "postgres" keeps jobs in the scrape_jobs table, "memory" in a process-local queue
+    JOB_QUEUE_BACKEND = "postgres"
+    JOB_CLAIM_BATCH = MAX_WORKERS
+    JOB_LEASE_SECONDS = 300
+    JOB_HEARTBEAT_INTERVAL = 60
+    # Idle workers wake up on new jobs, this bounds how long expired leases wait
+    JOB_POLL_INTERVAL = 30
+    # Scraper DB writes go through lib.write_behind, flushed in batches by a
+    # writer thread. Queued records are journaled to the spill directory until
+    # flushed and replayed on the next start after a crash.
+    WRITE_BEHIND = True
+    WRITE_BEHIND_MAX_RECORDS = 10000
+    WRITE_BEHIND_BATCH_SIZE = 500
+    WRITE_BEHIND_FLUSH_INTERVAL = 2
+    WRITE_BEHIND_RETRY_DELAY = 5
+    # A batch failing this many times in a row is flushed record by record,
+    # records that fail on their own go to the rejects directory
+    WRITE_BEHIND_SPLIT_AFTER = 3
+    WRITE_BEHIND_SPILL_DIRECTORY = "data/write_behind"
+    WRITE_BEHIND_REJECTS_DIRECTORY = "data/write_behind/rejects"
+    # Job types lib.pipeline schedules, each queued as its upstream stage
+    # succeeds. Short and community post details are read by their listing
+    # stages in tabs and have no stage of their own.
+    PIPELINE_STAGES = (
+        "channel info",
+        "videos basic info",
+        "video details",
+        "shorts basic info",
+        "community posts basic info",
+    )
+    # Jobs of a stage running at once in this process, stages not listed are
+    # only bound by the workers. Caps below the size of the stage's worker pool
+    # leave workers for the pool's other stages.
+    PIPELINE_STAGE_CONCURRENCY = {
+        "video details": max(1, MAX_WORKERS - 1),
+        "shorts basic info": 1,
+        "community posts basic info": 1,
+    }
+    # A worker waits this long for a slot in a capped stage, then hands the job back
+    PIPELINE_STAGE_WAIT = 5
+    # Claim and queue due channels by lib.priority's score instead of first
+    # come first served, the memory backend then uses PriorityJobQueue
+    PRIORITY_SCHEDULING = True
+    # Weights of the score's parts, each in [0, 1]
+    PRIORITY_WEIGHTS = {"subscribers": 0.4, "change_rate": 0.4, "staleness": 0.2}
+    # Queue time a score of 1 is worth. Jobs age, one queued this much earlier
+    # than another goes first whatever their scores.
+    PRIORITY_HEAD_START = 6 * 3600
+    # Subscribers scoring 1 on a log scale
+    PRIORITY_MAX_SUBSCRIBERS = 100_000_000
+    # Changes per day are counted over channel_changes of this many days
+    PRIORITY_CHANGE_WINDOW_DAYS = 30
+    # Changes per day and seconds since the last scrape scoring 0.5
+    PRIORITY_CHANGES_PER_DAY_HALF = 1
+    PRIORITY_STALENESS_HALF = 7 * 24 * 3600
+    # Due channels scored per claim, the longest due first. The claimed batch
+    # is the best ranked of them.
+    PRIORITY_CLAIM_CANDIDATES = 2000
+    # Channels handed to the queue stay leased this long, unless released once
+    # their channel info job ends
+    CHANNEL_CLAIM_BATCH = 100
+    CHANNEL_LEASE_SECONDS = 3600
+    # Channel info jobs kept queued at most, the feeder only claims what fits.
+    # Keep it small enough for the queue to drain well within the lease, a
+    # channel still queued when it runs out is claimed again elsewhere.
+    CHANNEL_QUEUE_TARGET = 100
+
     DATA_DIRECTORY = "data"
     LOGS_DIRECTORY = "logs"
     BANNER_PATH = "content/banners/{}.jpg"
@@ -17,8 +122,13 @@ class Constants:
     LIVE_STREAMS_DIRECTORY = "live_streams"
     METADATA_FILE_NAME = "metadata.json"
 
+    # Videos per channel the video details stage is queued for
     VIDEOS_COUNT = 100
     VIDEOS_COUNT_BASIC_INFO = 1000
+    VIDEOS_BULK_EXTRACTION = True
+    # On re-scrapes, stop once this many consecutive videos are already stored
+    VIDEOS_INCREMENTAL = True
+    INCREMENTAL_STOP_AFTER_KNOWN = 10
     VIDEO_COMMENTS_COUNT = 100
     VIDEO_COMMENTS_PER_PAGE = 20
     SHORTS_COMMENTS_COUNT = 100
@@ -43,11 +153,62 @@ class Constants:
     # COMMUNITY_POSTS_COMMENTS_COUNT = 20
     # COMMUNITY_POSTS_COMMENTS_PER_PAGE = 20
 
+    # Retries of a failed job before it goes to dead_letter_jobs, see lib.retry.
+    # The n-th retry is queued after RETRY_BASE_DELAY * 2^(n-1) seconds, at
+    # most RETRY_MAX_DELAY, half of it jittered.
     MAX_RETRY_COUNT = 2
+    RETRY_BASE_DELAY = 30
+    RETRY_MAX_DELAY = 900
+    # A channel whose channel info job ran out of retries is not due again
+    # before this, a channel that is gone never again
+    DEAD_LETTER_CHANNEL_COOLDOWN = 24 * 3600
     PAUSE_TIME = 2
     SCROLL_WAIT_TIME = 3
+    # scroll_for_items returns as soon as new items render, these are upper bounds
+    SCROLL_IDLE_TIMEOUT = 3
+    SCROLL_MAX_DURATION = 300
+    # Remove listing items from the page once harvested so long scrolls stay flat in memory
+    HARVEST_PRUNE_DOM = True
+    # Detail pages (shorts, post comments) load in this many tabs of the listing's
+    # browser at once instead of a second browser
+    TABS_PER_BROWSER = 4
+
+    # Page loads and image fetches go through lib.rate_limiter, a token bucket
+    # per host class. Rates are requests per second for the whole instance,
+    # worker processes each take an even share of them. They are adapted
+    # between min_rate and max_rate: walls and dropped connections multiply
+    # them by RATE_LIMIT_DECREASE, each RATE_LIMIT_ADJUST_INTERVAL seconds
+    # without one adds RATE_LIMIT_INCREASE.
+    RATE_LIMITS = {
+        "www": {"rate": 2.0, "burst": 5, "min_rate": 0.1, "max_rate": 10.0},
+        "i.ytimg": {"rate": 10.0, "burst": 20, "min_rate": 1.0, "max_rate": 50.0},
+        "yt3.ggpht": {"rate": 5.0, "burst": 10, "min_rate": 0.5, "max_rate": 20.0},
+    }
+    RATE_LIMIT_INCREASE = 0.2
+    RATE_LIMIT_DECREASE = 0.5
+    RATE_LIMIT_ADJUST_INTERVAL = 10
+
+    # Page channel video listings over plain HTTP, Selenium only on consent/bot walls
+    VIDEOS_HTTP_ENGINE = True
+    HTTP_POOL_SIZE = 10
+    HTTP_TIMEOUT = 15
+    # Tries after the first on connection errors and 5xx, each one rate limited
+    HTTP_RETRIES = 2
+    USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/90.0.4430.93 Safari/537.36"
+
+    # Job types (JobType values) run as coroutines on the asyncio/CDP engine in
+    # lib.async_orchestrator instead of a worker's Selenium session
+    ASYNC_ENGINE_JOB_TYPES = ()
+    ASYNC_BROWSERS = 2
+    ASYNC_MAX_IN_FLIGHT = 200
+    ASYNC_PAGE_TIMEOUT = 30
+
+    # Read channel info from the embedded ytInitialData before trying the DOM
+    CHANNEL_INFO_FROM_INITIAL_DATA = True
 
     # Links
+    YOUTUBE_BASE_URL = "https://www.youtube.com"
+    CHANNEL_ABOUT_PAGE_LINK = "https://www.youtube.com/{}/about"
     VIDEOS_PAGE_LINK = "https://www.youtube.com/{}/videos"
     VIDEO_PAGE_LINK = "https://www.youtube.com/watch?v={}"
     SHORTS_PAGE_LINK = "https://www.youtube.com/{}/shorts"
@@ -77,15 +238,202 @@ class Constants:
         ["status", "type"],
     )
 
+    # Gauges are summed over live worker processes in process mode
     ACTIVE_SCRAPES = Gauge(
-        "active_scrapes", "Number of currently active scraping operations"
+        "active_scrapes",
+        "Number of currently active scraping operations",
+        multiprocess_mode="livesum",
     )
 
     JOBS_PROCESSED = Counter(
         "jobs_processed_total", "Total number of jobs processed", ["status"]
     )
 
-    QUEUE_SIZE = Gauge("job_queue_size", "Current number of jobs in queue")
+    QUEUE_SIZE = Gauge(
+        "job_queue_size",
+        "Current number of jobs in queue",
+        ["queue"],
+        multiprocess_mode="livemostrecent",
+    )
+
+    # Per job type, the _count series gives the throughput and the buckets the
+    # p95 via histogram_quantile
+    JOB_DURATION = Histogram(
+        "job_duration_seconds",
+        "Time from a worker taking a job until it finished",
+        ["job_type", "status"],
+        buckets=[1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0],
+    )
+
+    WORKER_POOL_BUSY = Gauge(
+        "worker_pool_busy",
+        "Number of workers of a pool processing a job",
+        ["pool"],
+        multiprocess_mode="livesum",
+    )
+
+    JOBS_STOLEN = Counter(
+        "jobs_stolen_total",
+        "Total number of jobs an idle worker pool took from another pool's queue",
+        ["pool"],
+    )
+
+    DRIVER_POOL_LEASE_WAIT = Histogram(
+        "driver_pool_lease_wait_seconds",
+        "Time spent waiting to lease a webdriver from the pool",
+        buckets=[0.01, 0.1, 0.5, 1.0, 5.0, 15.0, 30.0, 60.0, 300.0],
+    )
+
+    DRIVER_POOL_IN_USE = Gauge(
+        "driver_pool_in_use",
+        "Number of webdrivers currently leased from the pool",
+        multiprocess_mode="livesum",
+    )
+
+    DRIVER_POOL_LIVE = Gauge(
+        "driver_pool_size",
+        "Number of live webdrivers owned by the pool",
+        multiprocess_mode="livesum",
+    )
+
+    DRIVER_POOL_RECYCLED = Counter(
+        "driver_pool_recycled_total",
+        "Total number of pooled webdrivers that were quit and replaced",
+        ["reason"],
+    )
+
+    DB_POOL_WAIT = Histogram(
+        "db_pool_wait_seconds",
+        "Time spent waiting to check out a database connection from the pool",
+        buckets=[0.001, 0.01, 0.1, 0.5, 1.0, 5.0, 30.0],
+    )
+
+    DB_POOL_CHECKOUTS = Counter(
+        "db_pool_checkouts_total",
+        "Total number of database connections checked out from the pool",
+    )
+
+    DB_POOL_IN_USE = Gauge(
+        "db_pool_in_use",
+        "Number of database connections currently checked out",
+        multiprocess_mode="livesum",
+    )
+
+    DB_POOL_DISCARDED = Counter(
+        "db_pool_discarded_total",
+        "Total number of pooled database connections closed instead of reused",
+        ["reason"],
+    )
+
+    WRITE_BEHIND_PENDING = Gauge(
+        "write_behind_pending_records",
+        "Number of records waiting in the write-behind buffer",
+        multiprocess_mode="livesum",
+    )
+
+    WRITE_BEHIND_FLUSH_DURATION = Histogram(
+        "write_behind_flush_seconds",
+        "Time spent writing a batch of buffered records to the database",
+        buckets=[0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0],
+    )
+
+    WRITE_BEHIND_FLUSH_FAILURES = Counter(
+        "write_behind_flush_failures_total",
+        "Total number of failed write-behind flushes, retried until they succeed",
+    )
+
+    WRITE_BEHIND_REJECTED = Counter(
+        "write_behind_rejected_total",
+        "Total number of buffered records that failed on their own and were moved to the rejects directory",
+        ["record_type"],
+    )
+
+    WRITE_BEHIND_PUT_WAIT = Histogram(
+        "write_behind_put_wait_seconds",
+        "Time scrapers spent blocked on a full write-behind buffer",
+        buckets=[0.001, 0.01, 0.1, 1.0, 5.0, 30.0],
+    )
+
+    ASYNC_JOBS_IN_FLIGHT = Gauge(
+        "async_jobs_in_flight",
+        "Number of jobs running on the async orchestrator",
+        multiprocess_mode="livesum",
+    )
+
+    ASYNC_PAGES_OPEN = Gauge(
+        "async_pages_open",
+        "Number of pages open in the async orchestrator's browsers",
+        multiprocess_mode="livesum",
+    )
+
+    ASYNC_PAGE_LOAD_DURATION = Histogram(
+        "async_page_load_seconds",
+        "Time until DOMContentLoaded for pages loaded by the async orchestrator",
+        buckets=[0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0],
+    )
+
+    WORKER_PROCESSES_LIVE = Gauge(
+        "worker_processes_live",
+        "Number of running worker processes",
+        multiprocess_mode="livesum",
+    )
+
+    WORKER_PROCESS_RESTARTS = Counter(
+        "worker_process_restarts_total",
+        "Total number of worker processes restarted after exiting unexpectedly",
+    )
+
+    PIPELINE_STAGE_RUNNING = Gauge(
+        "pipeline_stage_running",
+        "Number of jobs running per pipeline stage",
+        ["job_type"],
+        multiprocess_mode="livesum",
+    )
+
+    PIPELINE_JOBS_SCHEDULED = Counter(
+        "pipeline_jobs_scheduled_total",
+        "Total number of jobs queued by the pipeline once their upstream stage succeeded",
+        ["job_type"],
+    )
+
+    RATE_LIMIT_RATE = Gauge(
+        "rate_limit_rate",
+        "Current request rate allowed per host class, in requests per second",
+        ["host_class"],
+        multiprocess_mode="livesum",
+    )
+
+    RATE_LIMIT_WAIT = Histogram(
+        "rate_limit_wait_seconds",
+        "Time a request waited for a rate limiter token",
+        ["host_class"],
+        buckets=[0.0, 0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0],
+    )
+
+    RATE_LIMIT_BACKOFFS = Counter(
+        "rate_limit_backoffs_total",
+        "Total number of backoff signals per host class",
+        ["host_class", "reason"],
+    )
+
+    JOB_RETRIES = Counter(
+        "job_retries_total",
+        "Total number of failed jobs queued again after a backoff delay",
+        ["job_type", "reason"],
+    )
+
+    JOBS_DELAYED = Gauge(
+        "jobs_delayed",
+        "Number of jobs waiting out their retry delay before going back on a queue",
+        ["queue"],
+        multiprocess_mode="livesum",
+    )
+
+    DEAD_LETTER_JOBS = Counter(
+        "dead_letter_jobs_total",
+        "Total number of jobs moved to dead_letter_jobs",
+        ["job_type", "reason"],
+    )
 
     # Trending Algo
     TRENDING_DAYS_THRESHOLD = 3
@@ -1,9 +1,9 @@
 import os
 import threading
-from flask import Flask, render_template_string, send_from_directory
+from flask import Flask, jsonify, render_template_string, request, send_from_directory
 from logging import Logger
 
-from db import YtChannelDB
+from db import DeadLetterDB, YtChannelDB
 
 
 class DashboardServer:
@@ -386,6 +386,13 @@ class DashboardServer:
             template = self.get_channel_template()
             return render_template_string(template, stats=stats)
 
+        # Jobs the workers gave up on, newest first. ?job_type= narrows them down.
+        @self.app.route("/dead_letters", methods=["GET"])
+        def dead_letters():
+            limit = request.args.get("limit", 100, type=int)
+            job_type = request.args.get("job_type")
+            return jsonify(DeadLetterDB.get_recent(limit, job_type))
+
         @self.app.route("/content/banners/<channel_id>.jpg")
         def get_banner_image(channel_id):
             return send_from_directory(self.banner_image_path, f"{channel_id}.jpg")
@@ -0,0 +1,159 @@
+import threading
+import time
+from contextlib import contextmanager
+from logging import Logger
+from queue import LifoQueue, Empty
+from typing import Optional
+
+from selenium.common.exceptions import WebDriverException
+
+from lib.constants import Constants
+from lib.errors import ScraperRuntimeError
+from lib.resource_blocking import apply_blocking_profile
+from lib.utils import get_webdriver
+
+
+class PooledDriver:
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+        self.blocking_profile = None
+
+
+class DriverPool:
+    def __init__(
+        self,
+        constants: Constants,
+        logger: Logger,
+        size: Optional[int] = None,
+        max_uses: Optional[int] = None,
+        headless: bool = True,
+        proxy_server_url: Optional[str] = None,
+    ):
+        self.constants = constants
+        self.logger = logger
+        self.size = size or self.constants.DRIVER_POOL_SIZE
+        self.max_uses = max_uses or self.constants.DRIVER_MAX_USES
+        self.headless = headless
+        self.proxy_server_url = proxy_server_url
+
+        # LIFO so the most recently used (warmest) driver is handed out first
+        self.idle = LifoQueue()
+        self.slots = threading.BoundedSemaphore(self.size)
+        self.lock = threading.Lock()
+        self.live = 0
+        self.closed = False
+
+    @contextmanager
+    def lease(self, blocking_profile: Optional[str] = None):
+        if self.closed:
+            raise ScraperRuntimeError(message="Driver pool is closed")
+
+        started = time.monotonic()
+        if not self.slots.acquire(timeout=self.constants.DRIVER_LEASE_TIMEOUT):
+            raise ScraperRuntimeError(
+                message=f"Timed out after {self.constants.DRIVER_LEASE_TIMEOUT}s waiting for a webdriver"
+            )
+        self.constants.DRIVER_POOL_LEASE_WAIT.observe(time.monotonic() - started)
+
+        pooled = None
+        broken = False
+        try:
+            pooled = self._checkout()
+            self.constants.DRIVER_POOL_IN_USE.inc()
+            self._set_blocking_profile(pooled, blocking_profile)
+            yield pooled.driver
+        except BaseException:
+            # Whatever went wrong may have left the session in a bad state
+            broken = True
+            raise
+        finally:
+            if pooled:
+                self.constants.DRIVER_POOL_IN_USE.dec()
+                self._checkin(pooled, broken)
+            self.slots.release()
+
+    def _checkout(self) -> PooledDriver:
+        while True:
+            try:
+                pooled = self.idle.get_nowait()
+            except Empty:
+                break
+
+            if self._is_healthy(pooled.driver):
+                pooled.uses += 1
+                return pooled
+
+            self._discard(pooled, reason="unhealthy")
+
+        pooled = PooledDriver(
+            get_webdriver(
+                headless=self.headless, proxy_server_url=self.proxy_server_url
+            )
+        )
+        pooled.uses = 1
+        with self.lock:
+            self.live += 1
+        self.constants.DRIVER_POOL_LIVE.inc()
+        return pooled
+
+    def _checkin(self, pooled: PooledDriver, broken: bool) -> None:
+        if self.closed:
+            self._discard(pooled, reason="closed")
+        elif broken:
+            self._discard(pooled, reason="error")
+        elif pooled.uses >= self.max_uses:
+            self._discard(pooled, reason="max_uses")
+        elif not self._reset(pooled.driver):
+            self._discard(pooled, reason="reset_failed")
+        else:
+            self.idle.put(pooled)
+
+    def _set_blocking_profile(
+        self, pooled: PooledDriver, blocking_profile: Optional[str]
+    ) -> None:
+        if not self.constants.BLOCK_RESOURCES:
+            blocking_profile = None
+
+        if pooled.blocking_profile == blocking_profile:
+            return
+
+        apply_blocking_profile(pooled.driver, blocking_profile)
+        pooled.blocking_profile = blocking_profile
+
+    def _reset(self, driver) -> bool:
+        try:
+            driver.delete_all_cookies()
+            driver.execute_script(
+                "try { window.localStorage.clear(); window.sessionStorage.clear(); } catch (e) {}"
+            )
+            driver.get("about:blank")
+            return True
+        except WebDriverException as e:
+            self.logger.warning(f"Failed to reset pooled webdriver: {e}")
+            return False
+
+    def _is_healthy(self, driver) -> bool:
+        try:
+            return driver.execute_script("return 1") == 1
+        except WebDriverException:
+            return False
+
+    def _discard(self, pooled: PooledDriver, reason: str) -> None:
+        self.constants.DRIVER_POOL_RECYCLED.labels(reason=reason).inc()
+        with self.lock:
+            self.live -= 1
+        self.constants.DRIVER_POOL_LIVE.dec()
+        try:
+            pooled.driver.quit()
+        except Exception as e:
+            self.logger.warning(f"Failed to quit pooled webdriver: {e}")
+
+    def close(self) -> None:
+        self.closed = True
+        while True:
+            try:
+                pooled = self.idle.get_nowait()
+            except Empty:
+                break
+            self._discard(pooled, reason="closed")
@@ -8,3 +8,24 @@ class EmptyStringException(Exception):
     def __init__(self, message, content):
         super().__init__(message)
         self.content = content
+
+
+class BotWallError(Exception):
+    def __init__(self, message, url=None):
+        super().__init__(message)
+        self.url = url
+
+
+# A page came back without the structure the parser reads, e.g. a layout the
+# HTTP engine does not know yet
+class PageLayoutError(Exception):
+    def __init__(self, message, url=None):
+        super().__init__(message)
+        self.url = url
+
+
+# The channel was deleted, terminated or never existed, retrying won't help
+class ChannelNotFoundError(Exception):
+    def __init__(self, message, channel=None):
+        super().__init__(message)
+        self.channel = channel
@@ -0,0 +1,105 @@
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from lib.constants import Constants
+from lib.errors import BotWallError
+from lib.initial_data import extract_json_assignment, extract_ytcfg
+from lib.rate_limiter import get_rate_limiter
+
+# Server errors worth another try
+HTTP_RETRY_STATUSES = (500, 502, 503, 504)
+
+
+class YtHttpClient:
+    def __init__(self, constants: Constants, base_url: Optional[str] = None):
+        self.constants = constants
+        # base_url can point at a local server replaying recorded pages
+        self.base_url = (base_url or self.constants.YOUTUBE_BASE_URL).rstrip("/")
+
+        self.session = requests.Session()
+        # No urllib3 retries, _request sends every try through the rate limiter
+        adapter = HTTPAdapter(
+            pool_connections=self.constants.HTTP_POOL_SIZE,
+            pool_maxsize=self.constants.HTTP_POOL_SIZE,
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(
+            {
+                "User-Agent": self.constants.USER_AGENT,
+                "Accept-Language": "en-US,en;q=0.9",
+            }
+        )
+        # Pre-accepted consent so EU egress does not get the consent interstitial
+        self.session.cookies.set("SOCS", "CAI", domain=".youtube.com")
+
+    def get_initial_data(self, path: str) -> tuple[dict, dict]:
+        url = f"{self.base_url}{path}"
+        response = self._request("GET", url)
+        self._check_wall(url, response)
+        response.raise_for_status()
+
+        data = extract_json_assignment(response.text, "ytInitialData")
+        if data is None:
+            raise BotWallError(message="Page has no ytInitialData", url=url)
+
+        return data, extract_ytcfg(response.text)
+
+    def browse(self, continuation: str, ytcfg: dict) -> dict:
+        url = f"{self.base_url}/youtubei/v1/browse"
+        response = self._request(
+            "POST",
+            url,
+            params={"key": ytcfg.get("INNERTUBE_API_KEY"), "prettyPrint": "false"},
+            json={
+                "context": ytcfg.get("INNERTUBE_CONTEXT", {}),
+                "continuation": continuation,
+            },
+            headers={
+                "X-YouTube-Client-Name": str(
+                    ytcfg.get("INNERTUBE_CONTEXT_CLIENT_NAME", 1)
+                ),
+                "X-YouTube-Client-Version": ytcfg.get(
+                    "INNERTUBE_CONTEXT_CLIENT_VERSION", ""
+                ),
+            },
+        )
+        self._check_wall(url, response)
+        response.raise_for_status()
+        return response.json()
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        # Retries connection errors and 5xx up to HTTP_RETRIES times, each try
+        # takes its own rate limiter token
+        limiter = get_rate_limiter()
+        for attempt in range(self.constants.HTTP_RETRIES + 1):
+            limiter.acquire(url)
+            try:
+                response = self.session.request(
+                    method, url, timeout=self.constants.HTTP_TIMEOUT, **kwargs
+                )
+            except requests.exceptions.ConnectionError:
+                limiter.backoff(url, "connection")
+                if attempt == self.constants.HTTP_RETRIES:
+                    raise
+                continue
+
+            if response.status_code not in HTTP_RETRY_STATUSES:
+                break
+        return response
+
+    def _check_wall(self, url: str, response: requests.Response) -> None:
+        limiter = get_rate_limiter()
+        if response.status_code == 429:
+            limiter.backoff(url, "429")
+        elif not limiter.check(url, response.url):
+            return
+
+        raise BotWallError(
+            message=f"Consent or bot wall at {response.url}", url=response.url
+        )
+
+    def close(self) -> None:
+        self.session.close()
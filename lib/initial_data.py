@@ -0,0 +1,81 @@
+import json
+import re
+from typing import Any, Iterator, Optional
+
+_DECODER = json.JSONDecoder()
+
+
+def extract_json_assignment(html: str, name: str) -> Optional[dict]:
+    # Matches `var ytInitialData = {...};` and `window["ytInitialData"] = {...};`
+    match = re.search(rf"""(?:var\s+{name}|window\[["']{name}["']\])\s*=\s*""", html)
+    if not match:
+        return None
+
+    try:
+        value, _ = _DECODER.raw_decode(html, match.end())
+    except json.JSONDecodeError:
+        return None
+
+    return value if isinstance(value, dict) else None
+
+
+def extract_ytcfg(html: str) -> dict:
+    # The page calls ytcfg.set({...}) several times, later calls add keys
+    ytcfg = {}
+    for match in re.finditer(r"ytcfg\.set\(\s*(?=\{)", html):
+        try:
+            value, _ = _DECODER.raw_decode(html, match.end())
+        except json.JSONDecodeError:
+            continue
+        if isinstance(value, dict):
+            ytcfg.update(value)
+    return ytcfg
+
+
+def read_initial_data(driver, name: str = "ytInitialData") -> Optional[dict]:
+    data = driver.execute_script(f"return window['{name}'] || null")
+    if data:
+        return data
+
+    return extract_json_assignment(driver.page_source, name)
+
+
+def find_key(obj: Any, key: str) -> Iterator[Any]:
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            if k == key:
+                yield v
+            yield from find_key(v, key)
+    elif isinstance(obj, list):
+        for item in obj:
+            yield from find_key(item, key)
+
+
+def find_first(obj: Any, key: str, default: Any = None) -> Any:
+    return next(find_key(obj, key), default)
+
+
+def get_text(obj: Any) -> str:
+    # YouTube renders text as simpleText, a list of runs or a view-model content
+    if obj is None:
+        return ""
+    if isinstance(obj, str):
+        return obj
+    if "simpleText" in obj:
+        return obj["simpleText"]
+    if "runs" in obj:
+        return "".join(run.get("text", "") for run in obj["runs"])
+    if "content" in obj:
+        return obj["content"]
+    return ""
+
+
+def get_largest_image_url(obj: Any) -> str:
+    # Thumbnail lists are "thumbnails" in renderers and "sources" in view models
+    images = (obj or {}).get("thumbnails") or (obj or {}).get("sources") or []
+    if not images:
+        return ""
+
+    largest = max(images, key=lambda image: image.get("width", 0))
+    url = largest.get("url", "")
+    return f"https:{url}" if url.startswith("//") else url
@@ -1,40 +1,458 @@
+import heapq
+import itertools
+import math
+import os
+import select
+import socket
 import threading
-from queue import Queue
-from typing import Optional
+import time
+from collections import deque
+from logging import Logger
+from queue import Queue, PriorityQueue, Empty, Full
+from typing import Callable, Optional
 
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+from db import ScrapeJobDB, SCRAPE_JOBS_CHANNEL, get_dedicated_db
 from lib.constants import Constants
-from lib.structures import ScrapeInfoJob, JobType
+from lib.structures import ScrapeInfoJob, JobType, validate_job_data
+
+
+# Put on the queue by close() to wake up blocked get_job() calls
+_STOP = object()
+
+
+# Holds jobs until their retry delay passed and hands them to put(), one timer
+# thread for all of them instead of a worker sleeping on each
+class DelayedJobs:
+    def __init__(self, constants: Constants, name: str, put):
+        self.constants = constants
+        self.name = name
+        self.put = put
+        self.heap = []
+        self.sequence = itertools.count()
+        self.changed = threading.Condition()
+        self.closed = False
+        self.thread = threading.Thread(
+            target=self._run, name=f"JobQueue-{name}-Delayed", daemon=True
+        )
+        self.thread.start()
+
+    def add(self, job: ScrapeInfoJob, delay: float) -> None:
+        with self.changed:
+            heapq.heappush(
+                self.heap, (time.monotonic() + delay, next(self.sequence), job)
+            )
+            self.changed.notify()
+        self.constants.JOBS_DELAYED.labels(queue=self.name).inc()
+
+    def close(self) -> None:
+        # Jobs still waiting are dropped along with the rest of the queue
+        with self.changed:
+            self.closed = True
+            dropped = len(self.heap)
+            self.heap.clear()
+            self.changed.notify()
+        self.constants.JOBS_DELAYED.labels(queue=self.name).dec(dropped)
+
+    def _run(self) -> None:
+        while True:
+            with self.changed:
+                while not self.closed:
+                    wait = None
+                    if self.heap:
+                        wait = self.heap[0][0] - time.monotonic()
+                        if wait <= 0:
+                            break
+                    self.changed.wait(wait)
+                if self.closed:
+                    return
+                _, _, job = heapq.heappop(self.heap)
+
+            self.constants.JOBS_DELAYED.labels(queue=self.name).dec()
+            self.put(job)
 
 
 class JobQueue:
-    def __init__(self, constants: Constants, max_size: int = 0):
+    def __init__(self, constants: Constants, max_size: int = 0, name: str = "main"):
         self.queue = Queue(maxsize=max_size)
         self.processing = set()
         self.constants = constants
+        self.name = name
         self.lock = threading.Lock()
+        self.closed = threading.Event()
+        self.delayed = DelayedJobs(constants, name, self._put)
 
     def add_job(
-        self, channel_name: str, job_type: JobType, data: Optional[dict]
+        self,
+        channel_name: str,
+        job_type: JobType,
+        data: Optional[dict],
+        priority: float = 0.0,
     ) -> None:
-        job = ScrapeInfoJob(channel_name=channel_name, job_type=job_type, data=data)
-        self.queue.put(job)
-        self.constants.QUEUE_SIZE.inc()
+        job = ScrapeInfoJob(
+            channel_name=channel_name,
+            job_type=job_type,
+            data=validate_job_data(job_type, data),
+            priority=priority,
+        )
+        self._put(job)
+
+    def get_job(
+        self,
+        timeout: Optional[float] = None,
+        skip_types: Optional[Callable[[], set[JobType]]] = None,
+    ) -> Optional[ScrapeInfoJob]:
+        # Blocks until a job is queued, the timeout passes or the queue is closed.
+        # Jobs come in queue order whatever skip_types says, a worker hands back
+        # with release_job what it cannot run.
+        if self.closed.is_set():
+            return None
+
+        try:
+            job = self._job(self.queue.get(timeout=timeout))
+        except Empty:
+            return None
 
-    def get_job(self) -> Optional[ScrapeInfoJob]:
-        if self.queue.empty():
+        if job is _STOP:
+            # Pass it on so every other blocked caller wakes up too
+            self._put_stop()
             return None
-        job = self.queue.get()
+
+        job.attempts += 1
         with self.lock:
             self.processing.add(job.channel_name)
-        self.constants.QUEUE_SIZE.dec()
+        self.constants.QUEUE_SIZE.labels(queue=self.name).set(self.queue.qsize())
         return job
 
-    def complete_job(self, channel_name: str) -> None:
+    def complete_job(self, channel_name: str, job_id: Optional[int] = None) -> None:
         with self.lock:
             self.processing.discard(channel_name)
 
+    def retry_job(self, job: ScrapeInfoJob, delay: float, error: str = "") -> None:
+        # Done for now, back on the queue with its attempts once delay passed
+        self.complete_job(job.channel_name, job.job_id)
+        self.delayed.add(job, delay)
+
+    def release_job(self, job: ScrapeInfoJob) -> None:
+        # Back on the queue as it was taken, never run so not an attempt
+        job.attempts -= 1
+        self.complete_job(job.channel_name, job.job_id)
+        self._put(job)
+
+    def count_queued(self, job_type: JobType) -> int:
+        # Jobs waiting out a retry delay included
+        with self.queue.mutex:
+            queued = [self._job(entry) for entry in self.queue.queue]
+        with self.delayed.changed:
+            queued.extend(job for _, _, job in self.delayed.heap)
+        return sum(1 for job in queued if job is not _STOP and job.job_type == job_type)
+
     def is_full(self) -> bool:
         return self.queue.full()
 
     def is_empty(self) -> bool:
         return self.queue.empty()
+
+    def close(self) -> None:
+        self.closed.set()
+        self.delayed.close()
+        self._put_stop()
+
+    def _put(self, job: ScrapeInfoJob) -> None:
+        self.queue.put(self._entry(job))
+        self.constants.QUEUE_SIZE.labels(queue=self.name).set(self.queue.qsize())
+
+    def _put_stop(self) -> None:
+        try:
+            self.queue.put_nowait(self._entry(_STOP))
+        except Full:
+            # Nobody is blocked on a full queue
+            pass
+
+    def _entry(self, job):
+        return job
+
+    def _job(self, entry):
+        return entry
+
+
+# JobQueue handing out the lowest rank first, the enqueue time moved earlier by
+# priority * PRIORITY_HEAD_START seconds. Waiting lowers no rank but every new
+# job ranks later, so low priority jobs age towards the front and still run.
+class PriorityJobQueue(JobQueue):
+    def __init__(self, constants: Constants, max_size: int = 0, name: str = "main"):
+        super().__init__(constants, max_size=max_size, name=name)
+        self.queue = PriorityQueue(maxsize=max_size)
+        # Ties go first come first served, jobs themselves don't compare
+        self.sequence = itertools.count()
+
+    def _entry(self, job):
+        if job is _STOP:
+            return -math.inf, next(self.sequence), job
+        if job.rank is None:
+            job.rank = time.time() - job.priority * self.constants.PRIORITY_HEAD_START
+        return job.rank, next(self.sequence), job
+
+    def _job(self, entry):
+        return entry[-1]
+
+
+# Same interface as JobQueue, backed by the scrape_jobs table so jobs survive
+# restarts and can be shared by workers on several hosts. Jobs are claimed in
+# batches with FOR UPDATE SKIP LOCKED under a lease the heartbeat keeps
+# extending, a dead worker's jobs are claimed by others once it expires.
+# Claims go by rank, the same aging order as PriorityJobQueue.
+#
+# Idle get_job() calls block on a condition that add_job() and NOTIFYs from
+# other hosts' enqueues (see _listen) signal, so new jobs are picked up at once.
+#
+# With job_types set only jobs of those types are claimed, queues for different
+# types share the table. Jobs handed back with retry_job are not claimed before
+# their not_before. get_job's skip_types, e.g. the pipeline stages at their cap,
+# are neither claimed nor taken from the claimed batch.
+class PgJobQueue:
+    def __init__(
+        self,
+        constants: Constants,
+        logger: Logger,
+        max_size: int = 0,
+        job_types: Optional[list[JobType]] = None,
+        name: str = "main",
+    ):
+        self.constants = constants
+        self.logger = logger
+        self.max_size = max_size
+        self.job_types = (
+            [job_type.value for job_type in job_types] if job_types else None
+        )
+        self.name = name
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+
+        self.claimed = deque()
+        self.processing = {}
+        self.lock = threading.Lock()
+        self.available = threading.Condition(self.lock)
+        # Set while one get_job() call claims for everyone, outside the lock
+        self.claiming = False
+
+        self.stopped = threading.Event()
+        self.heartbeat_thread = threading.Thread(
+            target=self._heartbeat, name=f"JobQueue-{name}-Heartbeat", daemon=True
+        )
+        self.listener_thread = threading.Thread(
+            target=self._listen, name=f"JobQueue-{name}-Listener", daemon=True
+        )
+        self.heartbeat_thread.start()
+        self.listener_thread.start()
+
+    def add_job(
+        self,
+        channel_name: str,
+        job_type: JobType,
+        data: Optional[dict],
+        priority: float = 0.0,
+    ) -> None:
+        job_id = ScrapeJobDB.enqueue(
+            channel_name,
+            job_type.value,
+            validate_job_data(job_type, data),
+            priority,
+            self.constants.PRIORITY_HEAD_START,
+        )
+        if job_id is not None:
+            with self.available:
+                self.available.notify()
+
+    def get_job(
+        self,
+        timeout: Optional[float] = None,
+        skip_types: Optional[Callable[[], set[JobType]]] = None,
+    ) -> Optional[ScrapeInfoJob]:
+        # Blocks until a job is claimed, the timeout passes or the queue is closed
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self.available:
+            while not self.stopped.is_set():
+                skipped = skip_types() if skip_types else set()
+                job = next(
+                    (job for job in self.claimed if job.job_type not in skipped),
+                    None,
+                )
+                if job:
+                    self.claimed.remove(job)
+                    self.processing[job.job_id] = job.channel_name
+                    return job
+
+                if not self.claiming:
+                    # The claim is a round trip, other workers completing or
+                    # taking jobs must not wait on it
+                    self.claiming = True
+                    self.available.release()
+                    try:
+                        jobs = self._claim(skipped)
+                    except psycopg2.Error as e:
+                        self.logger.error(f"Failed to claim jobs: {e}")
+                        jobs = []
+                    finally:
+                        self.available.acquire()
+                        self.claiming = False
+                        if self.stopped.is_set():
+                            # close() waits for the claim to end
+                            self.available.notify_all()
+
+                    if jobs:
+                        self.claimed.extend(jobs)
+                        # This call takes one, the rest go to workers waiting meanwhile
+                        self.available.notify(len(jobs) - 1)
+                        continue
+
+                # Expired leases are not notified, look for them now and then
+                wait = self.constants.JOB_POLL_INTERVAL
+                if skipped:
+                    # Nothing is notified when a stage frees up either
+                    wait = min(wait, self.constants.PIPELINE_STAGE_WAIT)
+                if deadline is not None:
+                    wait = min(wait, deadline - time.monotonic())
+                    if wait <= 0:
+                        return None
+                self.available.wait(wait)
+
+        return None
+
+    def complete_job(self, channel_name: str, job_id: Optional[int] = None) -> None:
+        with self.lock:
+            self.processing.pop(job_id, None)
+        ScrapeJobDB.complete(job_id, self.worker)
+
+    def retry_job(self, job: ScrapeInfoJob, delay: float, error: str = "") -> None:
+        # The row stays, queued again with a not_before, so the retry survives
+        # restarts and may run on any host
+        with self.lock:
+            self.processing.pop(job.job_id, None)
+        ScrapeJobDB.retry(job.job_id, self.worker, delay, error)
+
+    def release_job(self, job: ScrapeInfoJob) -> None:
+        # Queued again with its rank and attempts, nothing is notified so other
+        # hosts' idle workers don't come for it
+        with self.lock:
+            self.processing.pop(job.job_id, None)
+        ScrapeJobDB.release([job.job_id], self.worker)
+
+    def count_queued(self, job_type: JobType) -> int:
+        # Across hosts, jobs waiting out a retry delay included
+        return ScrapeJobDB.count_queued([job_type.value])
+
+    def is_full(self) -> bool:
+        return (
+            bool(self.max_size)
+            and ScrapeJobDB.count_queued(self.job_types) >= self.max_size
+        )
+
+    def is_empty(self) -> bool:
+        return not self.claimed and ScrapeJobDB.count_queued(self.job_types) == 0
+
+    def close(self) -> None:
+        self.stopped.set()
+        with self.available:
+            self.available.notify_all()
+        self.heartbeat_thread.join()
+        self.listener_thread.join()
+
+        # Hand back what was claimed but never started, a claim under way
+        # adds to it first
+        with self.available:
+            self.available.wait_for(lambda: not self.claiming)
+            job_ids = [job.job_id for job in self.claimed]
+            self.claimed.clear()
+        if job_ids:
+            ScrapeJobDB.release(job_ids, self.worker)
+
+    def _claim(self, skipped: set[JobType]) -> list[ScrapeInfoJob]:
+        rows = ScrapeJobDB.claim(
+            self.worker,
+            self.constants.JOB_CLAIM_BATCH,
+            self.constants.JOB_LEASE_SECONDS,
+            self.job_types,
+            [job_type.value for job_type in skipped],
+        )
+        return [
+            ScrapeInfoJob(
+                channel_name=row["channel_name"],
+                job_type=JobType(row["job_type"]),
+                data=row["payload"],
+                job_id=row["id"],
+                priority=row["priority"],
+                attempts=row["attempts"],
+                rank=row["rank"],
+            )
+            for row in rows
+        ]
+
+    def _heartbeat(self) -> None:
+        while not self.stopped.wait(self.constants.JOB_HEARTBEAT_INTERVAL):
+            with self.lock:
+                job_ids = [job.job_id for job in self.claimed]
+                job_ids.extend(self.processing.keys())
+
+            try:
+                if job_ids:
+                    ScrapeJobDB.heartbeat(
+                        job_ids, self.worker, self.constants.JOB_LEASE_SECONDS
+                    )
+                self.constants.QUEUE_SIZE.labels(queue=self.name).set(
+                    ScrapeJobDB.count_queued(self.job_types)
+                )
+            except psycopg2.Error as e:
+                # A missed beat is fine as long as the next one lands within the lease
+                self.logger.warning(f"Job queue heartbeat failed: {e}")
+
+    def _listen(self) -> None:
+        while not self.stopped.is_set():
+            try:
+                # LISTEN stays on the session, keep it off pooled connections
+                with get_dedicated_db() as conn:
+                    conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+                    with conn.cursor() as cur:
+                        cur.execute(f"LISTEN {SCRAPE_JOBS_CHANNEL}")
+
+                    # Jobs may have been queued while we were not listening
+                    with self.available:
+                        self.available.notify_all()
+
+                    while not self.stopped.is_set():
+                        # Short select timeout so close() is noticed quickly
+                        if not select.select([conn], [], [], 1)[0]:
+                            continue
+
+                        conn.poll()
+                        notified = len(conn.notifies)
+                        conn.notifies.clear()
+                        with self.available:
+                            self.available.notify(notified)
+
+            except psycopg2.Error as e:
+                self.logger.warning(f"Job queue listener disconnected: {e}")
+                self.stopped.wait(self.constants.JOB_POLL_INTERVAL)
+
+
+def create_job_queue(
+    constants: Constants,
+    logger: Logger,
+    max_size: int = 0,
+    job_types: Optional[list[JobType]] = None,
+    name: str = "main",
+):
+    if constants.JOB_QUEUE_BACKEND == "postgres":
+        return PgJobQueue(
+            constants=constants,
+            logger=logger,
+            max_size=max_size,
+            job_types=job_types,
+            name=name,
+        )
+    # Only handed jobs of its types anyway, routing happens in add_job's caller
+    if constants.PRIORITY_SCHEDULING:
+        return PriorityJobQueue(constants=constants, max_size=max_size, name=name)
+    return JobQueue(constants=constants, max_size=max_size, name=name)
@@ -1,9 +1,10 @@
+import os
 import threading
 import time
 from logging import Logger
 from typing import Optional
 
-from prometheus_client import start_http_server
+from prometheus_client import CollectorRegistry, multiprocess, start_http_server
 
 
 class MetricsServer:
@@ -15,7 +16,13 @@ class MetricsServer:
 
     def start(self):
         def run_metrics_server():
-            start_http_server(self.port)
+            if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+                # Worker processes write their metrics to files, serve the aggregate
+                registry = CollectorRegistry()
+                multiprocess.MultiProcessCollector(registry)
+                start_http_server(self.port, registry=registry)
+            else:
+                start_http_server(self.port)
             while self.running:
                 time.sleep(1)
 
@@ -0,0 +1,167 @@
+import threading
+from dataclasses import dataclass
+from logging import Logger
+from typing import Any, Callable, Optional
+
+from lib.constants import Constants
+from lib.structures import JobType, ScrapeInfoJob, YtScraperConfig
+
+
+def channel_content_jobs(pipeline: "Pipeline", job: ScrapeInfoJob, result) -> list:
+    _, channel_id = result
+    return [{"channel_id": channel_id}]
+
+
+def video_details_jobs(pipeline: "Pipeline", job: ScrapeInfoJob, result) -> list:
+    channel_id = job.data["channel_id"]
+    video_codes = pipeline.config.video_db.get_codes_missing_details(
+        channel_id, pipeline.constants.VIDEOS_COUNT
+    )
+    return [
+        {"channel_id": channel_id, "video_code": video_code}
+        for video_code in video_codes
+    ]
+
+
+@dataclass
+class Stage:
+    job_type: JobType
+    # The stage whose successful jobs queue this one, None for the entry stage
+    depends_on: Optional[JobType] = None
+    # fan_out(pipeline, upstream_job, upstream_result) returns the data of the
+    # jobs to queue, one per item
+    fan_out: Optional[Callable[["Pipeline", ScrapeInfoJob, Any], list]] = None
+    succeeded: Callable[[Any], bool] = bool
+
+
+STAGES = [
+    Stage(JobType.channel_info, succeeded=lambda result: result[0]),
+    Stage(
+        JobType.videos_basic_info,
+        depends_on=JobType.channel_info,
+        fan_out=channel_content_jobs,
+    ),
+    Stage(
+        JobType.video_details,
+        depends_on=JobType.videos_basic_info,
+        fan_out=video_details_jobs,
+    ),
+    Stage(
+        JobType.shorts_basic_info,
+        depends_on=JobType.channel_info,
+        fan_out=channel_content_jobs,
+    ),
+    Stage(
+        JobType.community_posts_basic_info,
+        depends_on=JobType.channel_info,
+        fan_out=channel_content_jobs,
+    ),
+]
+
+
+# Runs the JobType stages as a DAG. A job that succeeds queues its downstream
+# stages, so a channel's videos, shorts and community posts are scraped side by
+# side and overlap with other channels instead of one after the other. Stages
+# listed in PIPELINE_STAGE_CONCURRENCY hold a slot while they run.
+class Pipeline:
+    def __init__(
+        self,
+        constants: Constants,
+        logger: Logger,
+        job_queue,
+        config: YtScraperConfig,
+        stages: Optional[list[Stage]] = None,
+    ):
+        self.constants = constants
+        self.logger = logger
+        self.job_queue = job_queue
+        self.config = config
+
+        enabled = {JobType(value) for value in constants.PIPELINE_STAGES}
+        self.stages = {
+            stage.job_type: stage
+            for stage in (stages or STAGES)
+            if stage.job_type in enabled
+        }
+        self.limits = {
+            JobType(value): limit
+            for value, limit in constants.PIPELINE_STAGE_CONCURRENCY.items()
+            if limit and JobType(value) in self.stages
+        }
+        self.slots = {
+            job_type: threading.BoundedSemaphore(limit)
+            for job_type, limit in self.limits.items()
+        }
+        # Slots taken per capped stage
+        self.running = {job_type: 0 for job_type in self.limits}
+        self.lock = threading.Lock()
+
+    def downstream(self, job_type: JobType) -> list[Stage]:
+        return [stage for stage in self.stages.values() if stage.depends_on == job_type]
+
+    def acquire(self, job_type: JobType, timeout: Optional[float] = None) -> bool:
+        # False once the timeout passes with the stage still at its cap
+        slot = self.slots.get(job_type)
+        if slot:
+            if not slot.acquire(timeout=timeout):
+                return False
+            with self.lock:
+                self.running[job_type] += 1
+        self.constants.PIPELINE_STAGE_RUNNING.labels(job_type=job_type.value).inc()
+        return True
+
+    def saturated(self) -> set[JobType]:
+        # Stages at their cap, workers leave their jobs to others meanwhile
+        with self.lock:
+            return {
+                job_type
+                for job_type, running in self.running.items()
+                if running >= self.limits[job_type]
+            }
+
+    def release(self, job_type: JobType) -> None:
+        self.constants.PIPELINE_STAGE_RUNNING.labels(job_type=job_type.value).dec()
+        slot = self.slots.get(job_type)
+        if slot:
+            with self.lock:
+                self.running[job_type] -= 1
+            slot.release()
+
+    def succeeded(self, job: ScrapeInfoJob, result) -> bool:
+        stage = self.stages.get(job.job_type)
+        if stage is None:
+            return bool(result)
+        return bool(stage.succeeded(result))
+
+    def schedule_downstream(self, job: ScrapeInfoJob, result) -> int:
+        # Queues the stages that depend on a successful job, returns how many
+        # jobs were queued
+        scheduled = 0
+        for stage in self.downstream(job.job_type):
+            try:
+                items = stage.fan_out(self, job, result)
+            except Exception as e:
+                self.logger.error(
+                    f"Failed to schedule {stage.job_type.value} for {job.channel_name}: {e}"
+                )
+                continue
+
+            for data in items:
+                # A channel's downstream work ranks like the channel itself
+                self.job_queue.add_job(
+                    channel_name=job.channel_name,
+                    job_type=stage.job_type,
+                    data=data,
+                    priority=job.priority,
+                )
+            self.constants.PIPELINE_JOBS_SCHEDULED.labels(
+                job_type=stage.job_type.value
+            ).inc(len(items))
+            scheduled += len(items)
+
+            if items:
+                self.logger.info(
+                    f"Added {len(items)} {stage.job_type.value} jobs for {job.channel_name}."
+                )
+
+        return scheduled
@@ -0,0 +1,27 @@
+from typing import Optional
+
+from lib.constants import Constants
+
+
+def claim_scoring(constants: Constants) -> Optional[dict]:
+    # Parameters of the score YtChannelDB.claim_due_channels ranks due channels
+    # by, None to claim them first come first served. In [0, 1], big channels
+    # that change often and were scraped long ago first:
+    #   reach        log10(1 + subscribers) / log10(PRIORITY_MAX_SUBSCRIBERS)
+    #   change rate  changes per day / (that + PRIORITY_CHANGES_PER_DAY_HALF)
+    #   staleness    seconds since scraped / (that + PRIORITY_STALENESS_HALF)
+    if not constants.PRIORITY_SCHEDULING:
+        return None
+
+    weights = constants.PRIORITY_WEIGHTS
+    return {
+        "candidates": constants.PRIORITY_CLAIM_CANDIDATES,
+        "subscribers_weight": weights["subscribers"],
+        "change_rate_weight": weights["change_rate"],
+        "staleness_weight": weights["staleness"],
+        "max_subscribers": constants.PRIORITY_MAX_SUBSCRIBERS,
+        "change_window_days": constants.PRIORITY_CHANGE_WINDOW_DAYS,
+        "changes_per_day_half": constants.PRIORITY_CHANGES_PER_DAY_HALF,
+        "staleness_half": constants.PRIORITY_STALENESS_HALF,
+        "head_start": constants.PRIORITY_HEAD_START,
+    }
@@ -0,0 +1,251 @@
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import threading
+from logging import Logger
+from typing import Callable, Optional
+
+from prometheus_client import multiprocess
+
+from lib.constants import Constants
+from lib.job_queue import create_job_queue
+from lib.pipeline import Pipeline
+from lib.structures import ScrapeInfoJob, JobType, YtScraperConfig
+from lib.worker import ScraperWorker
+from lib.write_behind import WriteBehindBuffer
+from scraper import YtScraper
+
+
+# JobQueue interface for a worker process, served by the parent's JobQueue over
+# a pipe. Each process has its own pipe so a crashing process cannot leave a
+# lock held on a queue the others share.
+class PipeJobQueue:
+    def __init__(self, conn: multiprocessing.connection.Connection):
+        self.conn = conn
+        self.closed = False
+
+    def add_job(
+        self,
+        channel_name: str,
+        job_type: JobType,
+        data: Optional[dict],
+        priority: float = 0.0,
+    ) -> None:
+        self.conn.send(("add_job", channel_name, job_type, data, priority))
+
+    def get_job(
+        self, skip_types: Optional[Callable[[], set[JobType]]] = None
+    ) -> Optional[ScrapeInfoJob]:
+        # Blocks until the parent hands over a job, None once it is stopping.
+        # skip_types stays here, the process's single worker holds no stage
+        # slot while it asks.
+        if self.closed:
+            return None
+
+        self.conn.send(("get_job",))
+        job = self.conn.recv()
+        if job is None:
+            self.closed = True
+        return job
+
+    def complete_job(self, channel_name: str, job_id: Optional[int] = None) -> None:
+        self.conn.send(("complete_job", channel_name, job_id))
+
+    def retry_job(self, job: ScrapeInfoJob, delay: float, error: str = "") -> None:
+        self.conn.send(("retry_job", job, delay, error))
+
+    def release_job(self, job: ScrapeInfoJob) -> None:
+        self.conn.send(("release_job", job))
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def run_worker_process(worker_id: int, conn) -> None:
+    # The parent handles Ctrl+C and stops its children with SIGTERM. No shared
+    # Event, a process killed while waiting on one leaves it unusable.
+    stopping = threading.Event()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+
+    constants = Constants()
+    # One browser per process, parallelism comes from the number of processes
+    constants.DRIVER_POOL_SIZE = 1
+
+    scraper = YtScraper(constants, YtScraperConfig())
+    logger = scraper.logger
+
+    write_buffer = None
+    if constants.WRITE_BEHIND:
+        # Named after the worker id, a restarted process replays what the
+        # previous one left unflushed
+        write_buffer = WriteBehindBuffer(constants, logger, name=f"worker-{worker_id}")
+        scraper.config.channel_db = write_buffer.channel_db
+        scraper.config.video_db = write_buffer.video_db
+        write_buffer.start()
+
+    if conn is None:
+        job_queue = create_job_queue(constants=constants, logger=logger)
+    else:
+        job_queue = PipeJobQueue(conn)
+
+    pipeline = Pipeline(constants, logger, job_queue, scraper.config)
+    worker = ScraperWorker(constants, logger, worker_id, job_queue, scraper, pipeline)
+    worker.start()
+
+    while not stopping.wait(1):
+        pass
+    worker.running = False
+    job_queue.close()
+    worker.join()
+    if write_buffer:
+        write_buffer.close()
+    scraper.close()
+
+
+# Runs every worker in its own process with its own YtScraper, so one bad
+# driver or a memory blow up only takes its process down and gets restarted.
+# With the postgres backend each process claims from scrape_jobs itself,
+# otherwise the parent hands out jobs from its JobQueue, one thread per process.
+class WorkerProcessPool:
+    def __init__(self, constants: Constants, logger: Logger, num_processes: int):
+        self.constants = constants
+        self.logger = logger
+        self.num_processes = num_processes
+        self.shared_queue = self.constants.JOB_QUEUE_BACKEND == "postgres"
+        self.job_queue = create_job_queue(constants=constants, logger=logger)
+
+        # Not fork, the parent runs threads and a fork would copy their locks
+        self.context = multiprocessing.get_context("spawn")
+        self.stopping = threading.Event()
+
+        self.processes: dict[int, multiprocessing.Process] = {}
+        self.dead_pids = set()
+        self.supervisor_thread = None
+
+    def start(self) -> None:
+        for worker_id in range(self.num_processes):
+            self.processes[worker_id] = self._spawn(worker_id)
+
+        self.supervisor_thread = threading.Thread(
+            target=self._supervise, name="WorkerProcessPool-Supervisor", daemon=True
+        )
+        self.supervisor_thread.start()
+        self.logger.info(f"Started {self.num_processes} worker processes.")
+
+    def stop(self) -> None:
+        self.stopping.set()
+        # Wakes the threads serving processes blocked on a job
+        self.job_queue.close()
+        if self.supervisor_thread:
+            self.supervisor_thread.join()
+
+        # Busy processes finish their current job before exiting
+        for process in self.processes.values():
+            process.terminate()
+
+        for worker_id, process in self.processes.items():
+            process.join(self.constants.WORKER_STOP_TIMEOUT)
+            if process.is_alive():
+                self.logger.warning(
+                    f"Worker process {worker_id} did not stop in time, killing it."
+                )
+                process.kill()
+                process.join()
+            self._mark_dead(process)
+
+    def _spawn(self, worker_id: int) -> multiprocessing.Process:
+        conn = child_conn = None
+        if not self.shared_queue:
+            conn, child_conn = self.context.Pipe()
+
+        process = self.context.Process(
+            target=run_worker_process,
+            args=(worker_id, child_conn),
+            name=f"WorkerProcess-{worker_id}",
+        )
+        process.start()
+
+        if conn:
+            # Only the child keeps its end open, so its exit shows up as EOF
+            child_conn.close()
+            threading.Thread(
+                target=self._serve,
+                args=(worker_id, conn),
+                name=f"WorkerProcess-{worker_id}-Jobs",
+                daemon=True,
+            ).start()
+
+        self.constants.WORKER_PROCESSES_LIVE.inc()
+        self.logger.info(f"Worker process {worker_id} started with pid {process.pid}")
+        return process
+
+    def _serve(self, worker_id: int, conn: multiprocessing.connection.Connection):
+        job = None
+        try:
+            while True:
+                request = conn.recv()
+
+                if request[0] == "get_job":
+                    job = self.job_queue.get_job()
+                    conn.send(job)
+                elif request[0] == "add_job":
+                    _, channel_name, job_type, data, priority = request
+                    self.job_queue.add_job(channel_name, job_type, data, priority)
+                elif request[0] == "complete_job":
+                    _, channel_name, job_id = request
+                    self.job_queue.complete_job(channel_name, job_id)
+                    job = None
+                elif request[0] == "retry_job":
+                    _, retried, delay, error = request
+                    self.job_queue.retry_job(retried, delay, error)
+                    job = None
+                elif request[0] == "release_job":
+                    _, released = request
+                    self.job_queue.release_job(released)
+                    job = None
+
+        except (EOFError, OSError):
+            if job and not self.stopping.is_set():
+                self.logger.error(
+                    f"Worker process {worker_id} exited while processing "
+                    f"{job.channel_name}: Job - {job.job_type.value}"
+                )
+        finally:
+            conn.close()
+
+    def _supervise(self) -> None:
+        while not self.stopping.is_set():
+            sentinels = {
+                process.sentinel: worker_id
+                for worker_id, process in self.processes.items()
+            }
+            for sentinel in multiprocessing.connection.wait(list(sentinels), timeout=1):
+                if self.stopping.is_set():
+                    return
+
+                worker_id = sentinels[sentinel]
+                process = self.processes[worker_id]
+                process.join()
+                self._mark_dead(process)
+                self.constants.WORKER_PROCESS_RESTARTS.inc()
+                self.logger.error(
+                    f"Worker process {worker_id} exited with code {process.exitcode}, "
+                    f"restarting in {self.constants.WORKER_RESTART_DELAY}s."
+                )
+
+                # Back off so a process crashing on start does not spin
+                if self.stopping.wait(self.constants.WORKER_RESTART_DELAY):
+                    return
+                self.processes[worker_id] = self._spawn(worker_id)
+
+    def _mark_dead(self, process: multiprocessing.Process) -> None:
+        if process.pid in self.dead_pids:
+            return
+        self.dead_pids.add(process.pid)
+
+        self.constants.WORKER_PROCESSES_LIVE.dec()
+        if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+            # Drops the live gauges the process reported
+            multiprocess.mark_process_dead(process.pid)
@@ -0,0 +1,177 @@
+import os
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlparse
+
+from selenium.common.exceptions import WebDriverException
+
+from lib.constants import Constants
+
+WALL_HOSTS = ("consent.youtube.com", "consent.google.com", "accounts.google.com")
+# Chrome's network errors as they show up in a WebDriverException message
+CONNECTION_ERRORS = ("net::ERR_CONNECTION_", "ERR_TIMED_OUT")
+
+_limiter: Optional["RateLimiter"] = None
+_limiter_pid = None
+_limiter_lock = threading.Lock()
+
+
+def is_wall_url(url: str) -> bool:
+    # Consent interstitials, sign-in redirects and the /sorry bot check
+    parsed = urlparse(url or "")
+    return parsed.hostname in WALL_HOSTS or parsed.path.startswith("/sorry")
+
+
+def host_class(url: str) -> str:
+    host = urlparse(url).hostname or ""
+    if host.endswith("ytimg.com"):
+        return "i.ytimg"
+    if host.endswith("ggpht.com") or host.endswith("googleusercontent.com"):
+        return "yt3.ggpht"
+    return "www"
+
+
+# Refills rate tokens per second up to burst. With share > 1 the bucket is one
+# of that many processes splitting the host's limits, rates, burst and the
+# rate increase are divided among them. A request reserves a token and
+# waits until it would have been there, so waits queue up in order and also
+# work out for callers that sleep on their own, like coroutines.
+#
+# The rate adapts AIMD style: a backoff signal multiplies it by
+# RATE_LIMIT_DECREASE and drops the saved up burst, every
+# RATE_LIMIT_ADJUST_INTERVAL with successes and no signal adds
+# RATE_LIMIT_INCREASE. Signals within an interval of the last decrease come
+# from requests already under way, they only drop the burst again.
+class TokenBucket:
+    def __init__(
+        self,
+        constants: Constants,
+        name: str,
+        rate: float,
+        burst: float,
+        min_rate: float,
+        max_rate: float,
+        share: int = 1,
+    ):
+        self.constants = constants
+        self.name = name
+        self.rate = rate / share
+        # At least one request's worth, or none would ever go out
+        self.burst = max(burst / share, 1.0)
+        self.min_rate = min_rate / share
+        self.max_rate = max_rate / share
+        self.increase = constants.RATE_LIMIT_INCREASE / share
+
+        self.lock = threading.Lock()
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.adjusted = self.updated
+        self.decreased = self.updated - constants.RATE_LIMIT_ADJUST_INTERVAL
+        self.constants.RATE_LIMIT_RATE.labels(host_class=name).set(self.rate)
+
+    def reserve(self) -> float:
+        # Seconds to wait before sending the request
+        with self.lock:
+            self._refill()
+            self.tokens -= 1
+            wait = max(-self.tokens / self.rate, 0.0)
+
+        self.constants.RATE_LIMIT_WAIT.labels(host_class=self.name).observe(wait)
+        return wait
+
+    def success(self) -> None:
+        with self.lock:
+            now = time.monotonic()
+            if now - self.adjusted < self.constants.RATE_LIMIT_ADJUST_INTERVAL:
+                return
+            self._refill()
+            self.rate = min(self.rate + self.increase, self.max_rate)
+            self.adjusted = now
+            rate = self.rate
+        self.constants.RATE_LIMIT_RATE.labels(host_class=self.name).set(rate)
+
+    def backoff(self, reason: str) -> None:
+        self.constants.RATE_LIMIT_BACKOFFS.labels(
+            host_class=self.name, reason=reason
+        ).inc()
+        with self.lock:
+            now = time.monotonic()
+            self._refill()
+            self.tokens = min(self.tokens, 0.0)
+            if now - self.decreased < self.constants.RATE_LIMIT_ADJUST_INTERVAL:
+                return
+            self.rate = max(
+                self.rate * self.constants.RATE_LIMIT_DECREASE, self.min_rate
+            )
+            self.decreased = self.adjusted = now
+            rate = self.rate
+        self.constants.RATE_LIMIT_RATE.labels(host_class=self.name).set(rate)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.tokens + (now - self.updated) * self.rate, self.burst)
+        self.updated = now
+
+
+# Token buckets per host class, from RATE_LIMITS. Shared by every thread of the
+# process, see get_rate_limiter. The WORKER_PROCESSES worker processes each get
+# an even share of the limits, so together they keep to RATE_LIMITS.
+class RateLimiter:
+    def __init__(self, constants: Constants):
+        share = max(constants.WORKER_PROCESSES, 1)
+        self.buckets = {
+            name: TokenBucket(constants, name, share=share, **limits)
+            for name, limits in constants.RATE_LIMITS.items()
+        }
+
+    def bucket(self, url: str) -> TokenBucket:
+        return self.buckets[host_class(url)]
+
+    def reserve(self, url: str) -> float:
+        return self.bucket(url).reserve()
+
+    def acquire(self, url: str) -> None:
+        wait = self.reserve(url)
+        if wait:
+            time.sleep(wait)
+
+    def success(self, url: str) -> None:
+        self.bucket(url).success()
+
+    def backoff(self, url: str, reason: str) -> None:
+        self.bucket(url).backoff(reason)
+
+    def check(self, url: str, landed_url: str) -> bool:
+        # Backs off when a load of url ended up on a wall, returns whether it did
+        if is_wall_url(landed_url):
+            self.backoff(url, "wall")
+            return True
+        self.success(url)
+        return False
+
+
+def get_rate_limiter() -> RateLimiter:
+    global _limiter, _limiter_pid
+
+    with _limiter_lock:
+        # Worker processes each get their own, with their share of RATE_LIMITS
+        if _limiter is None or _limiter_pid != os.getpid():
+            _limiter = RateLimiter(Constants)
+            _limiter_pid = os.getpid()
+        return _limiter
+
+
+def load_page(driver, url: str) -> None:
+    # driver.get through the rate limiter
+    limiter = get_rate_limiter()
+    limiter.acquire(url)
+    try:
+        driver.get(url)
+    except WebDriverException as e:
+        # Anything else, a crashed tab or a dead session, says nothing about
+        # the host
+        if any(error in (e.msg or "") for error in CONNECTION_ERRORS):
+            limiter.backoff(url, "connection")
+        raise
+    limiter.check(url, driver.current_url)
@@ -0,0 +1,70 @@
+from typing import Optional
+
+RESOURCE_PATTERNS = {
+    "images": [
+        "*.jpg",
+        "*.jpeg",
+        "*.png",
+        "*.gif",
+        "*.webp",
+        "*.ico",
+        "*://i.ytimg.com/*",
+        "*://i9.ytimg.com/*",
+        "*://yt3.ggpht.com/*",
+        "*://yt3.googleusercontent.com/*",
+    ],
+    "fonts": ["*.woff", "*.woff2", "*.ttf", "*.otf", "*://fonts.gstatic.com/*"],
+    "media": [
+        "*://*.googlevideo.com/videoplayback*",
+        "*.mp4",
+        "*.webm",
+        "*.m3u8",
+        "*.m4a",
+    ],
+    "storyboards": ["*://i.ytimg.com/sb/*", "*://i9.ytimg.com/sb/*"],
+    "tracking": [
+        "*://*.doubleclick.net/*",
+        "*://*.googlesyndication.com/*",
+        "*://*.googleadservices.com/*",
+        "*://www.google-analytics.com/*",
+        "*://www.googletagmanager.com/*",
+        "*://www.youtube.com/pagead/*",
+        "*://www.youtube.com/ptracking*",
+        "*://www.youtube.com/api/stats/*",
+        "*://www.youtube.com/youtubei/v1/log_event*",
+        "*://www.youtube.com/generate_204*",
+        "*://play.google.com/log*",
+    ],
+}
+
+# Everything we scrape is read from the DOM as text and attribute values, so
+# no profile needs image or media bytes. The watch page keeps the player
+# script, which renders the duration, but never its video stream.
+BLOCKING_PROFILES = {
+    "channel_info": ("images", "fonts", "media", "tracking"),
+    "videos_listing": ("images", "fonts", "media", "storyboards", "tracking"),
+    "video_watch": ("images", "fonts", "media", "storyboards", "tracking"),
+    "shorts": ("images", "fonts", "media", "storyboards", "tracking"),
+    "community": ("images", "fonts", "media", "tracking"),
+}
+
+
+def get_blocked_urls(profile: Optional[str]) -> list[str]:
+    if profile is None:
+        return []
+
+    if profile not in BLOCKING_PROFILES:
+        raise ValueError(f"Unknown resource blocking profile: {profile}")
+
+    return [
+        pattern
+        for category in BLOCKING_PROFILES[profile]
+        for pattern in RESOURCE_PATTERNS[category]
+    ]
+
+
+def apply_blocking_profile(driver, profile: Optional[str]) -> None:
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd(
+        "Network.setBlockedURLs", {"urls": get_blocked_urls(profile)}
+    )
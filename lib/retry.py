@@ -0,0 +1,31 @@
+import random
+from typing import Optional
+
+from pydantic import ValidationError
+
+from lib.constants import Constants
+from lib.errors import ChannelNotFoundError
+
+# Failures that come out the same however often the job runs. Anything else,
+# timeouts, invalidated driver sessions, walls or a scraper returning nothing,
+# may go away and is retried.
+PERMANENT_ERRORS = (ChannelNotFoundError, ValidationError)
+
+
+def is_permanent(error: Optional[Exception]) -> bool:
+    return isinstance(error, PERMANENT_ERRORS)
+
+
+def failure_reason(error: Optional[Exception]) -> str:
+    # Scrapers log and swallow most errors, no error means an empty result
+    return type(error).__name__ if error else "no_result"
+
+
+def retry_delay(attempts: int, constants: Constants) -> float:
+    # Doubles with every attempt. Half of it is random so the retries of jobs
+    # that failed together, e.g. behind the same wall, don't come back together.
+    delay = min(
+        constants.RETRY_BASE_DELAY * 2 ** max(attempts - 1, 0),
+        constants.RETRY_MAX_DELAY,
+    )
+    return delay / 2 + random.uniform(0, delay / 2)
@@ -33,6 +33,49 @@ class ScrapeInfoJob:
     channel_name: str
     job_type: JobType
     data: Optional[dict[str, any]] = None
+    job_id: Optional[int] = None
+    # Score from lib.priority, passed on to the jobs it schedules
+    priority: float = 0.0
+    # Times the job was handed to a worker, this time included
+    attempts: int = 0
+    # Queue order, lowest first. Set when first queued, a job handed back or
+    # retried keeps it and with it the time it aged.
+    rank: Optional[float] = None
+
+
+class ChannelInfoJobData(BaseModel):
+    pass
+
+
+class ChannelContentJobData(BaseModel):
+    channel_id: int
+
+
+class VideoDetailsJobData(ChannelContentJobData):
+    video_code: str
+
+
+class ShortDetailsJobData(ChannelContentJobData):
+    short_code: str
+
+
+class CommunityPostDetailsJobData(ChannelContentJobData):
+    post_code: str
+
+
+JOB_DATA_MODELS: dict[JobType, type[BaseModel]] = {
+    JobType.channel_info: ChannelInfoJobData,
+    JobType.videos_basic_info: ChannelContentJobData,
+    JobType.video_details: VideoDetailsJobData,
+    JobType.shorts_basic_info: ChannelContentJobData,
+    JobType.short_details: ShortDetailsJobData,
+    JobType.community_posts_basic_info: ChannelContentJobData,
+    JobType.community_post_details: CommunityPostDetailsJobData,
+}
+
+
+def validate_job_data(job_type: JobType, data: Optional[dict]) -> dict:
+    return JOB_DATA_MODELS[job_type].model_validate(data or {}).model_dump()
 
 
 class BaseContent(BaseModel):
@@ -0,0 +1,127 @@
+from collections import deque
+from typing import Iterator, Optional
+
+from selenium.webdriver.support.ui import WebDriverWait
+
+from lib.constants import Constants
+from lib.rate_limiter import get_rate_limiter
+from lib.resource_blocking import apply_blocking_profile
+
+# The old document is flagged before navigating away, so a page counts as loaded
+# once a document without the flag is past parsing
+LOAD_SCRIPT = "window.__pageHandleLoading = true; window.location.href = arguments[0];"
+LOADED_SCRIPT = (
+    "return !window.__pageHandleLoading && document.readyState !== 'loading';"
+)
+
+
+# One tab of a TabManager's browser. Attributes not defined here are looked up on
+# the webdriver after switching to the tab, so a handle can be passed wherever a
+# driver is expected. Elements found through it belong to its tab, finish with
+# them before using another handle.
+class PageHandle:
+    def __init__(self, tabs: "TabManager", window_handle: str):
+        self.tabs = tabs
+        self.window_handle = window_handle
+        self.blocking_profile = None
+        self.url = None
+
+    @property
+    def driver(self):
+        self.tabs.switch_to(self)
+        return self.tabs.driver
+
+    def load(self, url: str) -> None:
+        # Starts the navigation without waiting for it, the tab keeps loading
+        # while other tabs are worked on
+        get_rate_limiter().acquire(url)
+        self.url = url
+        self.driver.execute_script(LOAD_SCRIPT, url)
+
+    def wait_loaded(self, timeout: float) -> None:
+        WebDriverWait(self, timeout).until(
+            lambda page: page.execute_script(LOADED_SCRIPT)
+        )
+        get_rate_limiter().check(self.url, self.current_url)
+
+    def __getattr__(self, name):
+        return getattr(self.driver, name)
+
+
+# Tabs of a single webdriver. Selenium talks to one tab at a time, handles switch
+# to theirs when used, while the others keep loading in the background.
+class TabManager:
+    def __init__(self, driver, constants: Constants):
+        self.driver = driver
+        self.constants = constants
+        self.root = PageHandle(self, driver.current_window_handle)
+        self.current = self.root.window_handle
+        self.pages: list[PageHandle] = []
+
+    def switch_to(self, page: PageHandle) -> None:
+        if self.current != page.window_handle:
+            self.driver.switch_to.window(page.window_handle)
+            self.current = page.window_handle
+
+    def new_page(self, blocking_profile: Optional[str] = None) -> PageHandle:
+        self.driver.switch_to.new_window("tab")
+        page = PageHandle(self, self.driver.current_window_handle)
+        self.current = page.window_handle
+        self.pages.append(page)
+        self._set_blocking_profile(page, blocking_profile)
+        return page
+
+    def iter_pages(
+        self, urls: list[str], blocking_profile: Optional[str] = None
+    ) -> Iterator[tuple[str, PageHandle]]:
+        # Yields (url, page) in order with the page loaded. Up to TABS_PER_BROWSER
+        # urls load at once, a tab moves on to the next url once the consumer
+        # is done with it.
+        urls = iter(urls)
+        loading = deque()
+
+        for i in range(self.constants.TABS_PER_BROWSER):
+            url = next(urls, None)
+            if url is None:
+                break
+
+            if i < len(self.pages):
+                page = self.pages[i]
+                self._set_blocking_profile(page, blocking_profile)
+            else:
+                page = self.new_page(blocking_profile)
+            page.load(url)
+            loading.append((url, page))
+
+        while loading:
+            url, page = loading.popleft()
+            page.wait_loaded(self.constants.MAX_DELAY)
+            yield url, page
+
+            url = next(urls, None)
+            if url is not None:
+                page.load(url)
+                loading.append((url, page))
+
+    def close(self) -> None:
+        # Leaves the driver on its original tab, the way it was handed over
+        for page in self.pages:
+            self.switch_to(page)
+            self.driver.close()
+        self.pages.clear()
+
+        self.driver.switch_to.window(self.root.window_handle)
+        self.current = self.root.window_handle
+
+    def _set_blocking_profile(
+        self, page: PageHandle, blocking_profile: Optional[str]
+    ) -> None:
+        if not self.constants.BLOCK_RESOURCES:
+            blocking_profile = None
+
+        if page.blocking_profile == blocking_profile:
+            return
+
+        # Network.setBlockedURLs applies to the tab the command is sent to
+        apply_blocking_profile(page.driver, blocking_profile)
+        page.blocking_profile = blocking_profile
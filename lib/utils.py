@@ -1,25 +1,73 @@
 import json
+import os
 import re
+import shutil
+import threading
 import time
 import logging
+from datetime import datetime, timedelta, timezone
 from logging.handlers import TimedRotatingFileHandler
-from typing import Any
+from typing import Any, Optional
 
 import requests
 from selenium import webdriver
-from selenium.webdriver import Keys
 from selenium.webdriver.chrome.service import Service
 from selenium_stealth import stealth
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
 
-from lib.errors import EmptyStringException
+from lib.errors import EmptyStringException, ScraperRuntimeError
+from lib.rate_limiter import get_rate_limiter
+from lib.resource_blocking import apply_blocking_profile
 
+RELATIVE_DATE_UNITS = {
+    "second": 1,
+    "minute": 60,
+    "hour": 3600,
+    "day": 24 * 3600,
+    "week": 7 * 24 * 3600,
+    "month": 30 * 24 * 3600,
+    "year": 365 * 24 * 3600,
+}
 
-def get_webdriver(headless: bool = True, proxy_server_url: str | None = None):
+_chromedriver_path: str | None = None
+_chromedriver_lock = threading.Lock()
+
+
+def is_offline_mode() -> bool:
+    return os.getenv("SCRAPER_OFFLINE", "").lower() in ("1", "true", "yes")
+
+
+def resolve_chromedriver_path() -> str:
+    global _chromedriver_path
+
+    with _chromedriver_lock:
+        if _chromedriver_path:
+            return _chromedriver_path
+
+        path = os.getenv("CHROMEDRIVER_PATH")
+        if not path and is_offline_mode():
+            path = shutil.which("chromedriver")
+
+        if path:
+            if not os.path.isfile(path):
+                raise ScraperRuntimeError(message=f"chromedriver not found at {path}")
+        elif is_offline_mode():
+            raise ScraperRuntimeError(
+                message="Offline mode requires CHROMEDRIVER_PATH or chromedriver on PATH"
+            )
+        else:
+            path = ChromeDriverManager().install()
+
+        _chromedriver_path = path
+        return path
+
+
+def get_webdriver(
+    headless: bool = True,
+    proxy_server_url: str | None = None,
+    blocking_profile: str | None = None,
+):
     options = Options()
 
     options.add_argument("--mute-audio")
@@ -40,8 +88,11 @@ def get_webdriver(headless: bool = True, proxy_server_url: str | None = None):
     if proxy_server_url:
         options.add_argument(f"--proxy-server={proxy_server_url}")
 
+    if os.getenv("CHROME_BIN"):
+        options.binary_location = os.getenv("CHROME_BIN")
+
     driver = webdriver.Chrome(
-        options=options, service=Service(ChromeDriverManager().install())
+        options=options, service=Service(resolve_chromedriver_path())
     )
     driver.execute_script(
         "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})"
@@ -59,6 +110,9 @@ def get_webdriver(headless: bool = True, proxy_server_url: str | None = None):
         run_on_insecure_origins=False,
     )
 
+    if blocking_profile:
+        apply_blocking_profile(driver, blocking_profile)
+
     return driver
 
 
@@ -82,36 +136,148 @@ def unzip_large_nums(num: str) -> int:
         return 0
 
 
-def scroll_to_bottom(driver, pause_time=2, max_attempts=100000):
-    last_height = driver.execute_script("return document.documentElement.scrollHeight")
-
-    for _ in range(max_attempts):
-        driver.execute_script(
-            "window.scrollTo(0, document.documentElement.scrollHeight);"
-        )
-        time.sleep(pause_time)
+# Scrolls to the bottom and resolves as soon as more than `previousCount`
+# items match `selector`, or once nothing new has rendered for `idleTimeout`.
+WAIT_FOR_NEW_ITEMS_SCRIPT = """
+const [selector, previousCount, idleTimeout, done] = arguments;
+const count = () => document.querySelectorAll(selector).length;
+
+window.scrollTo(0, document.documentElement.scrollHeight);
+if (count() > previousCount) {
+    done(count());
+    return;
+}
+
+let pending = null;
+let idleTimer = null;
+const observer = new MutationObserver(() => {
+    if (pending) return;
+    pending = setTimeout(() => {
+        pending = null;
+        if (count() > previousCount) finish();
+    }, 50);
+});
+const finish = () => {
+    observer.disconnect();
+    clearTimeout(idleTimer);
+    clearTimeout(pending);
+    done(count());
+};
+observer.observe(document.body, { childList: true, subtree: true });
+idleTimer = setTimeout(finish, idleTimeout * 1000);
+"""
+
+
+def scroll_for_items(
+    driver,
+    item_selector: str,
+    target_count: int,
+    idle_timeout: float = 3,
+    max_duration: float = 300,
+    scroll_to_top: bool = True,
+) -> int:
+    started = time.monotonic()
+    count = driver.execute_script(
+        "return document.querySelectorAll(arguments[0]).length", item_selector
+    )
 
-        new_height = driver.execute_script(
-            "return document.documentElement.scrollHeight"
+    driver.set_script_timeout(idle_timeout + 5)
+    while count < target_count and time.monotonic() - started < max_duration:
+        new_count = driver.execute_async_script(
+            WAIT_FOR_NEW_ITEMS_SCRIPT, item_selector, count, idle_timeout
         )
 
-        if new_height == last_height:
+        # Nothing rendered within the idle timeout, the listing is exhausted
+        if new_count <= count:
             break
 
-        last_height = new_height
+        count = new_count
+
+    if scroll_to_top:
+        driver.execute_script("window.scrollTo(0, 0);")
+
+    return count
+
+
+# Resolves with up to `limit` items matching `selector` that were not
+# harvested yet, scrolling the listing's continuation sentinel into view and
+# waiting for new items when none are pending. EXTRACT_ITEM is replaced by a
+# JavaScript function mapping an element to the value returned for it.
+HARVEST_ITEMS_SCRIPT = """
+const [selector, limit, idleTimeout, prune, done] = arguments;
+const extractItem = EXTRACT_ITEM;
+const pendingSelector = `${selector}:not([data-harvested])`;
+
+const harvest = () => {
+    const elements = Array.from(document.querySelectorAll(pendingSelector)).slice(0, limit);
+    const items = elements.map((element) => {
+        element.setAttribute("data-harvested", "");
+        return extractItem(element);
+    });
+    if (prune) elements.forEach((element) => element.remove());
+    return items;
+};
+
+if (document.querySelector(pendingSelector)) {
+    done(harvest());
+    return;
+}
+
+const sentinel = document.querySelector("ytd-continuation-item-renderer");
+if (sentinel) {
+    sentinel.scrollIntoView();
+} else {
+    window.scrollTo(0, document.documentElement.scrollHeight);
+}
+
+let idleTimer = null;
+const observer = new MutationObserver(() => {
+    if (document.querySelector(pendingSelector)) finish(harvest());
+});
+const finish = (items) => {
+    observer.disconnect();
+    clearTimeout(idleTimer);
+    done(items);
+};
+observer.observe(document.body, { childList: true, subtree: true });
+idleTimer = setTimeout(() => finish([]), idleTimeout * 1000);
+"""
+
+
+def harvest_items(
+    driver,
+    item_selector: str,
+    limit: int,
+    item_extractor: str | None = None,
+    idle_timeout: float = 3,
+    max_duration: float = 300,
+    prune: bool = True,
+):
+    # Without an extractor the elements themselves are yielded, they are
+    # pruned from the page once the caller is done with the batch.
+    script = HARVEST_ITEMS_SCRIPT.replace(
+        "EXTRACT_ITEM", item_extractor or "(element) => element"
+    )
+    prune_in_page = prune and item_extractor is not None
 
-    driver.execute_script("window.scrollTo(0, 0);")
+    started = time.monotonic()
+    harvested = 0
+    driver.set_script_timeout(idle_timeout + 5)
 
+    while harvested < limit and time.monotonic() - started < max_duration:
+        items = driver.execute_async_script(
+            script, item_selector, limit - harvested, idle_timeout, prune_in_page
+        )
+        if not items:
+            return
 
-def scroll(driver, pause_time, scroll_count, delay):
-    for _ in range(scroll_count):
-        for _ in range(4):
-            WebDriverWait(driver, delay).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            ).send_keys(Keys.PAGE_DOWN)
+        harvested += len(items)
+        yield items
 
-        time.sleep(pause_time)
-    driver.execute_script("window.scrollTo(0, 0);")
+        if prune and not prune_in_page:
+            driver.execute_script(
+                "arguments[0].forEach((element) => element.remove());", items
+            )
 
 
 def scroll_until_element_found():
@@ -160,7 +326,17 @@ def save_img_from_url(path, url, logger):
     try:
         logger.info("Saving Banner...")
 
-        response = requests.get(url, stream=True)
+        limiter = get_rate_limiter()
+        limiter.acquire(url)
+        try:
+            response = requests.get(url, stream=True)
+        except requests.exceptions.ConnectionError:
+            limiter.backoff(url, "connection")
+            raise
+        if response.status_code == 429:
+            limiter.backoff(url, "429")
+        else:
+            limiter.success(url)
         response.raise_for_status()
 
         with open(path, "wb") as file:
@@ -183,6 +359,21 @@ def video_duration_parser(str_duration: str) -> int:
     return duration
 
 
+def relative_date_parser(
+    text: str, now: Optional[datetime] = None
+) -> Optional[datetime]:
+    # "3 weeks ago" or "1 year ago (edited)" as shown under comments, None
+    # when there is no such label
+    match = re.search(rf"(\d+)\s+({'|'.join(RELATIVE_DATE_UNITS)})s?\s+ago", text or "")
+    if not match:
+        return None
+
+    now = now or datetime.now(timezone.utc)
+    return now - timedelta(
+        seconds=int(match.group(1)) * RELATIVE_DATE_UNITS[match.group(2)]
+    )
+
+
 def extract_hashtags(text: str) -> list[str]:
     # can extract these from titles, descriptions, secondary descriptions, about sections, etc
     if text:
@@ -1,10 +1,16 @@
 import threading
 import time
 from logging import Logger
+from typing import Optional
 
+from db import DeadLetterDB
+from lib.async_orchestrator import AsyncOrchestrator
 from lib.constants import Constants
-from lib.job_queue import JobQueue
-from lib.structures import JobType
+from lib.errors import ChannelNotFoundError
+from lib.job_queue import JobQueue, PgJobQueue
+from lib.pipeline import Pipeline
+from lib.retry import failure_reason, is_permanent, retry_delay
+from lib.structures import JobType, ScrapeInfoJob
 from scraper import YtScraper
 
 
@@ -14,70 +20,175 @@ class ScraperWorker(threading.Thread):
         constants: Constants,
         logger: Logger,
         worker_id: int,
-        job_queue: JobQueue,
+        job_queue: JobQueue | PgJobQueue,
         scraper: YtScraper,
+        pipeline: Pipeline,
+        orchestrator: Optional[AsyncOrchestrator] = None,
+        pool: str = "main",
     ):
-        super().__init__(name=f"Worker-{worker_id}")
+        super().__init__(name=f"Worker-{pool}-{worker_id}")
         self.constants = constants
         self.worker_id = worker_id
         self.job_queue = job_queue
         self.scraper = scraper
+        self.pipeline = pipeline
+        self.orchestrator = orchestrator
+        self.pool = pool
         self.running = True
         self.logger = logger
 
     def run(self):
         self.logger.info(f"Worker {self.worker_id} started execution...")
         while self.running:
-            job = self.job_queue.get_job()
+            # Blocks until a job arrives, returns None once the queue is closed.
+            # Jobs of stages at their cap are left to others where the queue can.
+            job = self.job_queue.get_job(skip_types=self.pipeline.saturated)
             if not job:
-                time.sleep(1)
                 continue
 
-            try:
-                self.constants.ACTIVE_SCRAPES.inc()
-                self.logger.info(
-                    f"Worker {self.worker_id} processing {job.channel_name}: Job - {job.job_type.value}"
+            if not self.pipeline.acquire(
+                job.job_type, self.constants.PIPELINE_STAGE_WAIT
+            ):
+                # The stage is at its cap, hand the job back as it was taken
+                # and take another
+                self.job_queue.release_job(job)
+                continue
+
+            started = time.monotonic()
+            self.constants.ACTIVE_SCRAPES.inc()
+            self.logger.info(
+                f"Worker {self.worker_id} processing {job.channel_name}: Job - {job.job_type.value}"
+            )
+
+            if self.orchestrator and self.orchestrator.supports(job.job_type):
+                # Runs on the orchestrator's event loop, this worker moves on
+                self.orchestrator.submit(
+                    job,
+                    on_done=lambda get_result, job=job, started=started: self.finish_job(
+                        job, get_result, started
+                    ),
                 )
+                continue
+
+            self.constants.WORKER_POOL_BUSY.labels(pool=self.pool).inc()
+            try:
+                self.finish_job(job, lambda: self.process_job(job), started)
+            finally:
+                self.constants.WORKER_POOL_BUSY.labels(pool=self.pool).dec()
+
+    def process_job(self, job: ScrapeInfoJob):
+        if job.job_type == JobType.channel_info:
+            return self.scraper.scrape_channel_info(job.channel_name)
+        elif job.job_type == JobType.videos_basic_info:
+            return self.scraper.scrape_channel_videos_basic_info(
+                job.channel_name, job.data["channel_id"]
+            )
+        elif job.job_type == JobType.video_details:
+            return self.scraper.scrape_video_details(
+                job.channel_name, job.data["video_code"]
+            )
+        elif job.job_type == JobType.shorts_basic_info:
+            return self.scraper.scrape_shorts(job.channel_name)
+        elif job.job_type == JobType.community_posts_basic_info:
+            return self.scraper.scrape_community_posts(job.channel_name)
+
+        self.logger.error(f"No handler for {job.job_type.value} jobs")
+        return False
 
+    def finish_job(self, job: ScrapeInfoJob, get_result, started: float) -> None:
+        status = "failure"
+        error = None
+        try:
+            result = get_result()
+
+            if self.pipeline.succeeded(job, result):
+                status = "success"
+                self.logger.info(f"{job.channel_name} {job.job_type.value} scraped")
+                # Downstream stages, e.g. the videos, shorts and community posts
+                # of a channel whose info was scraped
+                self.pipeline.schedule_downstream(job, result)
+
+        except Exception as e:
+            error = e
+            self.logger.error(f"Error processing {job.channel_name}: {str(e)}")
+
+        finally:
+            self.constants.JOBS_PROCESSED.labels(status=status).inc()
+            self.constants.JOB_DURATION.labels(
+                job_type=job.job_type.value, status=status
+            ).observe(time.monotonic() - started)
+            self.constants.ACTIVE_SCRAPES.dec()
+            self.pipeline.release(job.job_type)
+            # A channel stays leased while its channel info job waits for a retry
+            if status == "success" or not self.retry_job(job, error):
+                self.job_queue.complete_job(job.channel_name, job.job_id)
                 if job.job_type == JobType.channel_info:
-                    # scrape channel info
-                    success, channel_id = self.scraper.scrape_channel_info(
-                        job.channel_name
-                    )
-                    if success:
-                        self.logger.info(f"{job.channel_name} channel info scraped")
-                        self.constants.JOBS_PROCESSED.labels(status="success").inc()
-
-                        # adding job for fetching videos basic info
-                        self.job_queue.add_job(
-                            channel_name=job.channel_name,
-                            job_type=JobType.videos_basic_info,
-                            data={"channel_id": channel_id},
-                        )
-                        self.logger.info(
-                            f"Added video info scraping job for {job.channel_name}."
-                        )
-                    else:
-                        self.constants.JOBS_PROCESSED.labels(status="failure").inc()
-                elif job.job_type == JobType.videos_basic_info:
-                    # scrape videos basic info
-                    success = self.scraper.scrape_channel_videos_basic_info(
-                        job.channel_name, job.data["channel_id"]
-                    )
-                    if success:
-                        self.logger.info(
-                            f"{job.channel_name} channel videos basic info scraped"
-                        )
-                        self.constants.JOBS_PROCESSED.labels(status="success").inc()
-                        # add other jobs here
-
-                    else:
-                        self.constants.JOBS_PROCESSED.labels(status="failure").inc()
+                    self.release_channel(job.channel_name)
 
+    def retry_job(self, job: ScrapeInfoJob, error: Optional[Exception]) -> bool:
+        # Queues a failed job again after a backoff delay, returns False once it
+        # was dead-lettered instead
+        reason = failure_reason(error)
+        permanent = is_permanent(error)
+        if not permanent and job.attempts <= self.constants.MAX_RETRY_COUNT:
+            delay = retry_delay(job.attempts, self.constants)
+            try:
+                self.job_queue.retry_job(job, delay, str(error or reason))
             except Exception as e:
-                self.logger.error(f"Error processing {job.channel_name}: {str(e)}")
-                self.constants.JOBS_PROCESSED.labels(status="failure").inc()
+                self.logger.error(f"Failed to retry {job.channel_name}: {e}")
+                return False
 
-            finally:
-                self.constants.ACTIVE_SCRAPES.dec()
-                self.job_queue.complete_job(job.channel_name)
+            self.constants.JOB_RETRIES.labels(
+                job_type=job.job_type.value, reason=reason
+            ).inc()
+            self.logger.warning(
+                f"Retrying {job.channel_name}: Job - {job.job_type.value} in "
+                f"{delay:.0f}s after attempt {job.attempts} failed ({reason})"
+            )
+            return True
+
+        self.dead_letter(job, error, reason, permanent)
+        return False
+
+    def dead_letter(
+        self,
+        job: ScrapeInfoJob,
+        error: Optional[Exception],
+        reason: str,
+        permanent: bool,
+    ) -> None:
+        self.constants.DEAD_LETTER_JOBS.labels(
+            job_type=job.job_type.value, reason=reason
+        ).inc()
+        self.logger.error(
+            f"Giving up on {job.channel_name}: Job - {job.job_type.value} after "
+            f"{job.attempts} attempts ({reason})"
+        )
+        try:
+            DeadLetterDB.add(
+                job.channel_name,
+                job.job_type.value,
+                job.data,
+                job.attempts,
+                permanent,
+                reason,
+                str(error) if error else None,
+            )
+            # Keeps the channel from being queued again on every poll
+            if isinstance(error, ChannelNotFoundError):
+                self.scraper.config.channel_db.skip_channel(job.channel_name)
+            elif job.job_type == JobType.channel_info:
+                self.scraper.config.channel_db.skip_channel(
+                    job.channel_name, self.constants.DEAD_LETTER_CHANNEL_COOLDOWN
+                )
+        except Exception as e:
+            self.logger.error(f"Failed to dead-letter {job.channel_name}: {e}")
+
+    def release_channel(self, channel_name: str) -> None:
+        # Failed channels are due again on the next poll, scraped ones moved
+        # their update_time forward. With write-behind the writer releases it
+        # once the update is flushed.
+        try:
+            self.scraper.config.channel_db.release_channel(channel_name)
+        except Exception as e:
+            self.logger.error(f"Failed to release {channel_name}: {e}")
@@ -0,0 +1,159 @@
+import threading
+import time
+from logging import Logger
+from typing import Callable, Optional
+
+from lib.constants import Constants
+from lib.job_queue import create_job_queue
+from lib.structures import JobType, ScrapeInfoJob
+
+
+# JobQueue interface for the workers of one pool. Jobs come from the pool's own
+# queue, with WORKER_POOL_STEALING also from the other pools' queues while its
+# own stays empty. complete_job goes to the queue a job came from.
+class PoolJobQueue:
+    def __init__(self, pools: "WorkerPools", name: str):
+        self.pools = pools
+        self.name = name
+        self.queue = pools.queues[name]
+        self.lock = threading.Lock()
+        # (channel_name, job_id) -> queues the jobs in flight were taken from
+        self.sources: dict[tuple, list] = {}
+
+    def add_job(
+        self,
+        channel_name: str,
+        job_type: JobType,
+        data: Optional[dict],
+        priority: float = 0.0,
+    ) -> None:
+        self.pools.add_job(channel_name, job_type, data, priority)
+
+    def get_job(
+        self,
+        timeout: Optional[float] = None,
+        skip_types: Optional[Callable[[], set[JobType]]] = None,
+    ) -> Optional[ScrapeInfoJob]:
+        # Blocks until a job is taken, the timeout passes or the pools are closed
+        deadline = None if timeout is None else time.monotonic() + timeout
+        stealing = self.pools.constants.WORKER_POOL_STEALING
+
+        while not self.pools.closed.is_set():
+            wait = timeout
+            if stealing:
+                wait = self.pools.constants.WORKER_POOL_STEAL_INTERVAL
+            if deadline is not None:
+                wait = min(wait, max(deadline - time.monotonic(), 0))
+
+            job = self.queue.get_job(timeout=wait, skip_types=skip_types)
+            if job:
+                return self._taken(job, self.queue)
+
+            if stealing and not self.pools.closed.is_set():
+                for name, queue in self.pools.queues.items():
+                    if name == self.name:
+                        continue
+                    job = queue.get_job(timeout=0, skip_types=skip_types)
+                    if job:
+                        self.pools.constants.JOBS_STOLEN.labels(pool=self.name).inc()
+                        return self._taken(job, queue)
+
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            if not stealing and timeout is None:
+                # Only returns empty handed once its queue was closed
+                return None
+
+        return None
+
+    def complete_job(self, channel_name: str, job_id: Optional[int] = None) -> None:
+        self._source(channel_name, job_id).complete_job(channel_name, job_id)
+
+    def retry_job(self, job: ScrapeInfoJob, delay: float, error: str = "") -> None:
+        self._source(job.channel_name, job.job_id).retry_job(job, delay, error)
+
+    def release_job(self, job: ScrapeInfoJob) -> None:
+        self._source(job.channel_name, job.job_id).release_job(job)
+
+    def is_full(self) -> bool:
+        return self.queue.is_full()
+
+    def is_empty(self) -> bool:
+        return self.queue.is_empty()
+
+    def close(self) -> None:
+        self.pools.close()
+
+    def _source(self, channel_name: str, job_id: Optional[int]):
+        with self.lock:
+            queues = self.sources.get((channel_name, job_id))
+            queue = queues.pop() if queues else self.queue
+            if not queues:
+                self.sources.pop((channel_name, job_id), None)
+        return queue
+
+    def _taken(self, job: ScrapeInfoJob, queue) -> ScrapeInfoJob:
+        with self.lock:
+            self.sources.setdefault((job.channel_name, job.job_id), []).append(queue)
+        return job
+
+
+# Splits the threaded workers into WORKER_POOLS, each with its own queue and
+# workers, so job types only compete for workers within their pool. Producers
+# use this as their JobQueue, add_job routes each job to the queue of the pool
+# serving its type.
+class WorkerPools:
+    def __init__(self, constants: Constants, logger: Logger):
+        self.constants = constants
+        self.logger = logger
+        self.closed = threading.Event()
+
+        pools = {
+            name: [JobType(value) for value in pool["job_types"]]
+            for name, pool in constants.WORKER_POOLS.items()
+        }
+        # Unlisted job types go to the first pool
+        routed = {job_type for job_types in pools.values() for job_type in job_types}
+        first = next(iter(pools))
+        pools[first] += [job_type for job_type in JobType if job_type not in routed]
+
+        self.queues = {}
+        self.sizes = {}
+        self.routes: dict[JobType, str] = {}
+        for name, job_types in pools.items():
+            self.queues[name] = create_job_queue(
+                constants=constants, logger=logger, job_types=job_types, name=name
+            )
+            self.sizes[name] = constants.WORKER_POOLS[name]["workers"]
+            for job_type in job_types:
+                self.routes[job_type] = name
+
+    def queue_for(self, name: str) -> PoolJobQueue:
+        return PoolJobQueue(self, name)
+
+    def add_job(
+        self,
+        channel_name: str,
+        job_type: JobType,
+        data: Optional[dict],
+        priority: float = 0.0,
+    ) -> None:
+        self.queues[self.routes[job_type]].add_job(
+            channel_name, job_type, data, priority
+        )
+
+    def count_queued(self, job_type: JobType) -> int:
+        return self.queues[self.routes[job_type]].count_queued(job_type)
+
+    def is_full(self) -> bool:
+        return any(queue.is_full() for queue in self.queues.values())
+
+    def is_empty(self) -> bool:
+        return all(queue.is_empty() for queue in self.queues.values())
+
+    def close(self) -> None:
+        if self.closed.is_set():
+            return
+        self.closed.set()
+        for queue in self.queues.values():
+            queue.close()
@@ -0,0 +1,515 @@
+import fcntl
+import glob
+import json
+import os
+import socket
+import threading
+import time
+from dataclasses import dataclass, asdict
+from logging import Logger
+from typing import Optional
+
+import psycopg2
+from psycopg2.pool import PoolError
+
+from db import YtChannelDB, YtVideoDB
+from lib.constants import Constants
+from lib.errors import ScraperRuntimeError
+
+
+@dataclass
+class ChannelUpdateRecord:
+    channel_code: str
+    update_data: dict
+
+
+# Queued behind the channel's update, so the lease only goes once the update
+# is stored and the channel is no longer due
+@dataclass
+class ChannelReleaseRecord:
+    channel_code: str
+
+
+@dataclass
+class VideosRecord:
+    channel_id: int
+    values: list[tuple]
+
+
+@dataclass
+class VideoCountRecord:
+    channel_id: int
+    num_videos: int
+
+
+@dataclass
+class VideoDetailsRecord:
+    video_code: str
+    details: dict
+
+
+# The database being unreachable, not a record it can't take. Retried as a
+# whole, never rejected.
+CONNECTION_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError, PoolError)
+
+RECORD_TYPES = {
+    record_type.__name__: record_type
+    for record_type in (
+        ChannelUpdateRecord,
+        ChannelReleaseRecord,
+        VideosRecord,
+        VideoCountRecord,
+        VideoDetailsRecord,
+    )
+}
+
+
+# Stands in for YtChannelDB in YtScraperConfig, updates are queued instead of
+# written. Everything else still goes straight to the database.
+class BufferedChannelDB(YtChannelDB):
+    def __init__(self, buffer: "WriteBehindBuffer"):
+        self.buffer = buffer
+
+    def update(self, channel_code: str, update_data: dict) -> tuple[bool, int]:
+        # True only means queued. The job counts as a success either way, a
+        # flush failing later is logged by the writer with the channel codes
+        # and rejected records are counted in WRITE_BEHIND_REJECTED.
+        if not update_data:
+            return False, -1
+
+        channel_id = self.buffer.get_channel_id(channel_code)
+        if channel_id is None:
+            return False, -1
+
+        self.buffer.put(ChannelUpdateRecord(channel_code, update_data))
+        return True, channel_id
+
+    def release_channel(self, channel_code: str) -> bool:
+        # Released by the writer once what was queued before is flushed
+        self.buffer.put(ChannelReleaseRecord(channel_code))
+        return True
+
+
+# Stands in for YtVideoDB in YtScraperConfig. Insert counts are only known once
+# the writer flushes, so create_many returns None and the writer logs them.
+class BufferedVideoDB(YtVideoDB):
+    def __init__(self, buffer: "WriteBehindBuffer"):
+        self.buffer = buffer
+
+    def create_many(self, values: list[tuple], channel_id: int) -> None:
+        self.buffer.put(VideosRecord(channel_id, list(values)))
+
+    def update_video_and_shorts_count(self, channel_id: int, num_videos: int) -> bool:
+        self.buffer.put(VideoCountRecord(channel_id, num_videos))
+        return True
+
+    def update_details(self, video_code: str, details: dict) -> bool:
+        self.buffer.put(VideoDetailsRecord(video_code, details))
+        return True
+
+    def get_codes_missing_details(self, channel_id: int, limit: int) -> list[str]:
+        # A listing that is still queued is not in the table yet. Buffer first,
+        # a batch flushed in between then shows up in both.
+        pending, detailed = self.buffer.pending_video_codes(channel_id)
+        codes = YtVideoDB.get_codes_missing_details(channel_id, limit)
+        codes.extend(code for code in pending if code not in codes)
+        return [code for code in codes if code not in detailed][:limit]
+
+
+# Scrapers put records here and move on, a writer thread coalesces them by table
+# and flushes them in batches once WRITE_BEHIND_BATCH_SIZE records are queued or
+# every WRITE_BEHIND_FLUSH_INTERVAL seconds. put() blocks once
+# WRITE_BEHIND_MAX_RECORDS are waiting. Every record is appended to a spill
+# file first, a flushed batch deletes its file, so what a crash leaves behind is
+# replayed by the next start() with the same name. Spill files carry their
+# owner, hostname, pid and start time, who holds a lock file while running.
+# Only those of owners whose lock is free, i.e. that died, are replayed, so
+# instances sharing the directory leave each other's alone. Records the database keeps refusing
+# are moved to WRITE_BEHIND_REJECTS_DIRECTORY instead of holding up the rest.
+class WriteBehindBuffer:
+    def __init__(self, constants: Constants, logger: Logger, name: str = "main"):
+        self.constants = constants
+        self.logger = logger
+        self.name = name
+
+        self.lock = threading.Lock()
+        self.not_full = threading.Condition(self.lock)
+        self.ready = threading.Condition(self.lock)
+        self.stopping = threading.Event()
+        self.pending = []
+        # The batch the writer is flushing, out of pending but not stored yet
+        self.flushing = []
+        self.closed = False
+
+        # The start time tells apart a restarted container, same hostname and pid
+        hostname = socket.gethostname().replace(".", "-")
+        self.owner = f"{hostname}-{os.getpid()}-{time.time_ns()}"
+        self.lock_file = None
+        self.spill_path = None
+        self.spill_file = None
+        self.writer_thread = threading.Thread(
+            target=self._write_loop, name=f"WriteBehind-{name}", daemon=True
+        )
+
+        # Channel ids never change, looked up once per channel
+        self.channel_ids: dict[str, int] = {}
+
+        self.channel_db = BufferedChannelDB(self)
+        self.video_db = BufferedVideoDB(self)
+
+    def start(self) -> None:
+        os.makedirs(self.constants.WRITE_BEHIND_SPILL_DIRECTORY, exist_ok=True)
+        self.lock_file = self._lock(self.owner)
+
+        # Held until their segments are gone, another instance starting
+        # meanwhile leaves them alone
+        dead_owners = {}
+        for path in glob.glob(self._spill_pattern("*.jsonl")):
+            owner = self._segment_owner(path)
+            if owner != self.owner and owner not in dead_owners:
+                dead_owners[owner] = self._lock(owner)
+        dead_owners = {
+            owner: lock_file
+            for owner, lock_file in dead_owners.items()
+            if lock_file is not None
+        }
+
+        left_over = sorted(
+            (
+                path
+                for path in glob.glob(self._spill_pattern("*.jsonl"))
+                if self._segment_owner(path) in dead_owners
+            ),
+            key=self._segment_number,
+        )
+        records = [record for path in left_over for record in self._read(path)]
+
+        # Journaled again before the old files go
+        self._open_segment()
+        for record in records:
+            self._spill(record)
+        self.pending.extend(records)
+        self.constants.WRITE_BEHIND_PENDING.inc(len(records))
+        for path in left_over:
+            os.remove(path)
+        for owner, lock_file in dead_owners.items():
+            self._unlock(owner, lock_file)
+
+        if records:
+            self.logger.warning(
+                f"Replaying {len(records)} unflushed records from {len(left_over)} spill files."
+            )
+        self.writer_thread.start()
+
+    def put(self, record) -> None:
+        started = time.monotonic()
+        with self.lock:
+            while (
+                len(self.pending) >= self.constants.WRITE_BEHIND_MAX_RECORDS
+                and not self.closed
+            ):
+                self.not_full.wait()
+            if self.closed:
+                raise ScraperRuntimeError(message="Write-behind buffer is closed")
+
+            self._spill(record)
+            self.pending.append(record)
+            if len(self.pending) >= self.constants.WRITE_BEHIND_BATCH_SIZE:
+                self.ready.notify()
+
+        self.constants.WRITE_BEHIND_PUT_WAIT.observe(time.monotonic() - started)
+        self.constants.WRITE_BEHIND_PENDING.inc()
+
+    def get_channel_id(self, channel_code: str) -> Optional[int]:
+        if channel_code not in self.channel_ids:
+            channel_id = YtChannelDB.get_ids([channel_code]).get(channel_code)
+            if channel_id is None:
+                return None
+            self.channel_ids[channel_code] = channel_id
+        return self.channel_ids[channel_code]
+
+    def pending_video_codes(self, channel_id: int) -> tuple[list[str], set[str]]:
+        # Codes of the channel's queued listing rows and of every video with
+        # queued details
+        with self.lock:
+            batch = self.flushing + self.pending
+
+        codes, detailed = [], set()
+        for record in batch:
+            if isinstance(record, VideosRecord) and record.channel_id == channel_id:
+                # video_code is the second column of a listing row
+                codes.extend(values[1] for values in record.values)
+            elif isinstance(record, VideoDetailsRecord):
+                detailed.add(record.video_code)
+        return codes, detailed
+
+    def close(self) -> None:
+        # Flushes what is queued, records a dead database keeps from being
+        # written stay in the spill file for the next start
+        with self.lock:
+            self.closed = True
+            self.ready.notify_all()
+            self.not_full.notify_all()
+        self.stopping.set()
+        self.writer_thread.join()
+        self.spill_file.close()
+        if os.path.getsize(self.spill_path) == 0:
+            os.remove(self.spill_path)
+            # Nothing left to replay, the lock file can go too
+            self._unlock(self.owner, self.lock_file)
+        else:
+            self.lock_file.close()
+
+    def _write_loop(self) -> None:
+        while True:
+            try:
+                if not self._write_next():
+                    return
+            except Exception as e:
+                # Scrapers block on put() for good once the writer is gone. What
+                # the failed round took stays in its segment for the next start.
+                self.logger.error(f"Write-behind writer failed: {e}")
+                self.stopping.wait(self.constants.WRITE_BEHIND_RETRY_DELAY)
+
+    def _write_next(self) -> bool:
+        # Flushes what is pending, False once closed with nothing left
+        with self.lock:
+            self.ready.wait_for(
+                lambda: self.closed
+                or len(self.pending) >= self.constants.WRITE_BEHIND_BATCH_SIZE,
+                timeout=self.constants.WRITE_BEHIND_FLUSH_INTERVAL,
+            )
+            batch, self.pending = self.pending, []
+            self.flushing = batch
+            # The closed segment holds exactly this batch
+            segment = self._open_segment() if batch else None
+            self.not_full.notify_all()
+            closed = self.closed
+
+        if not batch:
+            return not closed
+
+        try:
+            if self._write(batch):
+                os.remove(segment)
+        finally:
+            with self.lock:
+                self.flushing = []
+            self.constants.WRITE_BEHIND_PENDING.dec(len(batch))
+        return True
+
+    def _write(self, batch: list) -> bool:
+        # Flushes are idempotent, a batch that failed halfway is simply written
+        # again. One that keeps failing for its data would block the writer for
+        # good, after WRITE_BEHIND_SPLIT_AFTER tries it goes record by record.
+        failures = 0
+        while True:
+            started = time.monotonic()
+            try:
+                if failures >= self.constants.WRITE_BEHIND_SPLIT_AFTER:
+                    self._write_each(batch)
+                else:
+                    self._flush(batch)
+                self.constants.WRITE_BEHIND_FLUSH_DURATION.observe(
+                    time.monotonic() - started
+                )
+                return True
+            except Exception as e:
+                failures += 1
+                self.constants.WRITE_BEHIND_FLUSH_FAILURES.inc()
+                self.logger.error(
+                    f"Failed to flush {len(batch)} buffered records{self._describe(batch)}, "
+                    f"retrying: {e}"
+                )
+
+            if self.stopping.wait(self.constants.WRITE_BEHIND_RETRY_DELAY):
+                self.logger.error(
+                    f"Leaving {len(batch)} unflushed records in the spill directory."
+                )
+                return False
+
+    def _write_each(self, batch: list) -> None:
+        # Raises on connection errors, the batch is then retried as a whole
+        rejects = []
+        for record in batch:
+            try:
+                self._flush([record])
+            except CONNECTION_ERRORS:
+                raise
+            except Exception as e:
+                rejects.append((record, e))
+                if isinstance(record, ChannelUpdateRecord):
+                    # Its release follows, keep the channel from being claimed
+                    # and rejected again on every poll
+                    YtChannelDB.skip_channel(
+                        record.channel_code,
+                        self.constants.DEAD_LETTER_CHANNEL_COOLDOWN,
+                    )
+
+        for record, error in rejects:
+            self._reject(record, error)
+
+    def _reject(self, record, error: Exception) -> None:
+        record_type = type(record).__name__
+        self.constants.WRITE_BEHIND_REJECTED.labels(record_type=record_type).inc()
+        self.logger.error(
+            f"Rejected buffered {record_type}{self._describe([record])}: {error}"
+        )
+
+        os.makedirs(self.constants.WRITE_BEHIND_REJECTS_DIRECTORY, exist_ok=True)
+        path = os.path.join(
+            self.constants.WRITE_BEHIND_REJECTS_DIRECTORY, f"{self.name}.jsonl"
+        )
+        with open(path, "a", encoding="utf-8") as rejects_file:
+            rejects_file.write(
+                json.dumps(
+                    {"type": record_type, "error": str(error), **asdict(record)},
+                    default=str,
+                )
+                + "\n"
+            )
+
+    @staticmethod
+    def _describe(batch: list) -> str:
+        # The channels whose scrapes were reported stored but are not yet
+        channel_codes = sorted(
+            {
+                record.channel_code
+                for record in batch
+                if isinstance(record, ChannelUpdateRecord)
+            }
+        )
+        channel_ids = sorted(
+            {
+                record.channel_id
+                for record in batch
+                if isinstance(record, (VideosRecord, VideoCountRecord))
+            }
+        )
+        video_codes = [
+            record.video_code
+            for record in batch
+            if isinstance(record, VideoDetailsRecord)
+        ]
+
+        parts = []
+        if channel_codes:
+            parts.append(f"channels {', '.join(channel_codes)}")
+        if channel_ids:
+            parts.append(f"videos of channel ids {', '.join(map(str, channel_ids))}")
+        if video_codes:
+            parts.append(f"details of {len(video_codes)} videos")
+        return f" ({'; '.join(parts)})" if parts else ""
+
+    def _flush(self, batch: list) -> None:
+        channel_updates: dict[str, dict] = {}
+        # Ordered, a dict without values
+        channel_releases: dict[str, None] = {}
+        videos, video_channel_ids, video_counts = [], set(), {}
+        video_details: dict[str, dict] = {}
+
+        for record in batch:
+            if isinstance(record, ChannelUpdateRecord):
+                channel_updates.setdefault(record.channel_code, {}).update(
+                    record.update_data
+                )
+            elif isinstance(record, ChannelReleaseRecord):
+                channel_releases[record.channel_code] = None
+            elif isinstance(record, VideosRecord):
+                videos.extend(record.values)
+                video_channel_ids.add(record.channel_id)
+            elif isinstance(record, VideoCountRecord):
+                video_counts[record.channel_id] = record.num_videos
+            elif isinstance(record, VideoDetailsRecord):
+                video_details[record.video_code] = record.details
+
+        for channel_code, update_data in channel_updates.items():
+            YtChannelDB.update(channel_code, update_data)
+
+        if video_channel_ids:
+            inserted, skipped = YtVideoDB.create_many_for_channels(
+                videos, list(video_channel_ids)
+            )
+            self.logger.info(
+                f"Stored {inserted} new videos for {len(video_channel_ids)} channels, "
+                f"{skipped} already stored"
+            )
+
+        if video_counts:
+            YtVideoDB.update_video_and_shorts_counts(video_counts)
+
+        # After the listings, a video's details may be queued along with its row
+        for video_code, details in video_details.items():
+            YtVideoDB.update_details(video_code, details)
+
+        # Last, the batch's channel updates are stored by now
+        for channel_code in channel_releases:
+            YtChannelDB.release_channel(channel_code)
+
+    def _open_segment(self) -> Optional[str]:
+        # Returns the path of the segment it replaces
+        previous = self.spill_path
+        if self.spill_file:
+            self.spill_file.close()
+
+        self.spill_path = self._spill_pattern(f"{self.owner}.{time.time_ns()}.jsonl")
+        self.spill_file = open(self.spill_path, "a", encoding="utf-8")
+        return previous
+
+    def _spill(self, record) -> None:
+        self.spill_file.write(
+            json.dumps({"type": type(record).__name__, **asdict(record)}, default=str)
+            + "\n"
+        )
+        # Reaches the OS right away, enough to outlive a crash of this process
+        self.spill_file.flush()
+
+    def _read(self, path: str) -> list:
+        records = []
+        with open(path, encoding="utf-8") as spill_file:
+            for line in spill_file:
+                try:
+                    data = json.loads(line)
+                    record_type = RECORD_TYPES[data.pop("type")]
+                except (ValueError, KeyError):
+                    # The last line of a file cut short by a crash
+                    self.logger.warning(f"Skipping unreadable line in {path}")
+                    continue
+
+                record = record_type(**data)
+                if isinstance(record, VideosRecord):
+                    record.values = [tuple(values) for values in record.values]
+                records.append(record)
+        return records
+
+    def _spill_pattern(self, suffix: str) -> str:
+        return os.path.join(
+            self.constants.WRITE_BEHIND_SPILL_DIRECTORY, f"{self.name}.{suffix}"
+        )
+
+    def _lock(self, owner: str):
+        # The owner's lock file, locked, or None while the owner still runs. The
+        # lock goes with the process, however it ends.
+        lock_file = open(self._spill_pattern(f"{owner}.lock"), "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    def _unlock(self, owner: str, lock_file) -> None:
+        try:
+            os.remove(self._spill_pattern(f"{owner}.lock"))
+        except FileNotFoundError:
+            pass
+        lock_file.close()
+
+    def _segment_owner(self, path: str) -> str:
+        # name.owner.number.jsonl, files from before owners were named have none
+        parts = os.path.basename(path)[len(self.name) + 1 :].split(".")
+        return parts[0] if len(parts) == 3 else ""
+
+    @staticmethod
+    def _segment_number(path: str) -> int:
+        return int(os.path.basename(path).split(".")[-2])
@@ -1,9 +1,19 @@
 from lib.constants import Constants
-from lib.errors import ScraperRuntimeError
+from lib.driver_pool import DriverPool
+from lib.errors import (
+    ScraperRuntimeError,
+    BotWallError,
+    ChannelNotFoundError,
+    PageLayoutError,
+)
+from lib.http_client import YtHttpClient
 from lib.structures import YtScraperConfig
-from lib.utils import get_webdriver, get_logger
+from lib.utils import get_logger, relative_date_parser
 from scrapers.channel_info import get_channel_info
-from scrapers.videos import get_video_info
+from scrapers.community_posts import get_community_posts
+from scrapers.shorts import get_shorts
+from scrapers.videos import get_video_info, get_video_details
+from scrapers.videos_http import get_video_info_http
 
 
 class YtScraper:
@@ -14,25 +24,34 @@ class YtScraper:
             self.constants.LOGS_DIRECTORY,
             print_to_console=self.config.print_logs_to_console,
         )
+        self.driver_pool = DriverPool(
+            self.constants, self.logger, proxy_server_url=self.config.proxy
+        )
+        self.http_client = YtHttpClient(self.constants)
 
     def scrape_channel_info(self, channel_name) -> tuple[bool, int]:
-        channel_info_driver = get_webdriver()
         channel_id = -1
 
         try:
-            channel_info_scraped, channel_id = get_channel_info(
-                channel_info_driver,
-                channel_name,
-                Constants,
-                self.logger,
-                self.config.channel_db,
-            )
+            with self.driver_pool.lease(
+                blocking_profile="channel_info"
+            ) as channel_info_driver:
+                channel_info_scraped, channel_id = get_channel_info(
+                    channel_info_driver,
+                    channel_name,
+                    Constants,
+                    self.logger,
+                    self.config.channel_db,
+                )
 
             if channel_info_scraped:
                 return True, channel_id
 
             return False, channel_id
 
+        except ChannelNotFoundError:
+            raise
+
         except ScraperRuntimeError:
             return False, channel_id
 
@@ -42,21 +61,45 @@ class YtScraper:
             )
             return False, channel_id
 
-        finally:
-            channel_info_driver.quit()
-
     def scrape_channel_videos_basic_info(self, channel_name, channel_id) -> bool:
-        channel_videos_driver = get_webdriver()
+        if self.constants.VIDEOS_HTTP_ENGINE:
+            try:
+                return bool(
+                    get_video_info_http(
+                        self.http_client,
+                        channel_name,
+                        channel_id,
+                        Constants,
+                        self.logger,
+                        self.config.video_db,
+                    )
+                )
+            except BotWallError as e:
+                self.logger.warning(
+                    f"HTTP engine hit a wall for {channel_name}, falling back to Selenium: {e}"
+                )
+            except PageLayoutError as e:
+                self.logger.warning(
+                    f"HTTP engine could not read the listing of {channel_name}, falling back to Selenium: {e}"
+                )
+            except Exception as e:
+                self.logger.error(
+                    f"Error while fetching videos over HTTP for {channel_name}: {e}"
+                )
+                return False
 
         try:
-            scrape_channel_videos_basic_info_scraped = get_video_info(
-                channel_videos_driver,
-                channel_name,
-                channel_id,
-                Constants,
-                self.logger,
-                self.config.video_db,
-            )
+            with self.driver_pool.lease(
+                blocking_profile="videos_listing"
+            ) as channel_videos_driver:
+                scrape_channel_videos_basic_info_scraped = get_video_info(
+                    channel_videos_driver,
+                    channel_name,
+                    channel_id,
+                    Constants,
+                    self.logger,
+                    self.config.video_db,
+                )
 
             if scrape_channel_videos_basic_info_scraped:
                 return True
@@ -72,5 +115,76 @@ class YtScraper:
             )
             return False
 
-        finally:
-            channel_videos_driver.quit()
+    def scrape_video_details(self, channel_name, video_code) -> bool:
+        try:
+            with self.driver_pool.lease(
+                blocking_profile="video_watch"
+            ) as video_details_driver:
+                details = get_video_details(
+                    video_details_driver, video_code, Constants, self.logger
+                )
+
+        except ScraperRuntimeError:
+            return False
+
+        except Exception as e:
+            self.logger.error(
+                f"Error while scraping video details of {video_code} for {channel_name}: {e}"
+            )
+            return False
+
+        # get_video_details swallows most errors, a page that never rendered
+        # leaves every field at its default
+        if not any(
+            (
+                details["description"],
+                details["likes"],
+                details["comments_count"],
+                details["transcript"],
+            )
+        ):
+            self.logger.error(f"No video details found for {video_code}")
+            return False
+
+        # Plain values so the details can be journaled by the write-behind buffer
+        details = {
+            key: (
+                [item.model_dump() for item in value]
+                if isinstance(value, list)
+                else value
+            )
+            for key, value in details.items()
+        }
+        # Stored along with the details, dated from their "3 days ago" labels
+        for comment in details["comments"]:
+            comment_date = relative_date_parser(comment["date"])
+            comment["comment_date"] = comment_date.isoformat() if comment_date else None
+        return self.config.video_db.update_details(video_code, details)
+
+    def scrape_shorts(self, channel_name) -> bool:
+        try:
+            with self.driver_pool.lease(blocking_profile="shorts") as shorts_driver:
+                return get_shorts(channel_name, shorts_driver, Constants, self.logger)
+
+        except Exception as e:
+            self.logger.error(f"Error while scraping shorts for {channel_name}: {e}")
+            return False
+
+    def scrape_community_posts(self, channel_name) -> bool:
+        try:
+            with self.driver_pool.lease(
+                blocking_profile="community"
+            ) as community_posts_driver:
+                return get_community_posts(
+                    channel_name, community_posts_driver, Constants, self.logger
+                )
+
+        except Exception as e:
+            self.logger.error(
+                f"Error while scraping community posts for {channel_name}: {e}"
+            )
+            return False
+
+    def close(self):
+        self.driver_pool.close()
+        self.http_client.close()
@@ -1,3 +1,6 @@
+import json
+from typing import Optional
+
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
@@ -7,287 +10,86 @@ from selenium.common.exceptions import (
     WebDriverException,
 )
 
+from lib.errors import ChannelNotFoundError
+from lib.initial_data import (
+    read_initial_data,
+    find_first,
+    get_text,
+    get_largest_image_url,
+)
+from lib.rate_limiter import load_page
 from lib.structures import ChannelInfo, Link, AffiliatedChannel
 from lib.utils import unzip_large_nums, save_img_from_url
 
+# Why a channel page shows no channel, null when it does. Handles that never
+# existed get YouTube's 404 page, terminated or removed channels an error alert.
+CHANNEL_UNAVAILABLE_SCRIPT = """
+(() => {
+    if (document.querySelector("#error-page")) {
+        return document.title || "404 Not Found";
+    }
+    const alerts = (window.ytInitialData && window.ytInitialData.alerts) || [];
+    for (const alert of alerts) {
+        const renderer = alert.alertRenderer;
+        if (renderer && renderer.type === "ERROR") {
+            const text = renderer.text || {};
+            return text.simpleText
+                || (text.runs || []).map((run) => run.text).join("")
+                || "Channel unavailable";
+        }
+    }
+    return null;
+})()
+"""
+
+
+def check_channel_available(driver, channel_name) -> None:
+    reason = driver.execute_script(f"return {CHANNEL_UNAVAILABLE_SCRIPT.strip()}")
+    if reason:
+        raise ChannelNotFoundError(
+            message=f"{channel_name} is unavailable: {reason}", channel=channel_name
+        )
+
 
 def get_channel_info(driver, channel_name, constants, logger, channel_db):
     stored = False
     channel_id = -1
 
     try:
-        driver.get(constants.VIDEOS_PAGE_LINK.format(channel_name))
-
-        name = ""
-        is_verified = False
-        about = ""
-        subscribers = 0
-        videos_count = 0
-        views_count = 0
-        joined_date = ""
-        location = ""
-        links = []
-        banner_url = ""
-        dp_url = ""
-        affiliated_channels = []
-
-        # Banner and DP URL
-        try:
-            logger.info("Fetching banner url")
-            banner_url = (
-                WebDriverWait(driver, constants.MAX_DELAY)
-                .until(
-                    EC.presence_of_element_located((By.ID, "page-header-banner-sizer"))
-                )
-                .find_element(By.TAG_NAME, "yt-image-banner-view-model")
-                .find_element(By.TAG_NAME, "img")
-                .get_attribute("src")
-            )
-        except Exception as e:
-            logger.error(f"Failed to fetch banner url: {e}")
-
-        try:
-            logger.info("Fetching dp url")
-            dp_url = (
-                WebDriverWait(driver, constants.MAX_DELAY)
-                .until(EC.presence_of_element_located((By.ID, "page-header")))
-                .find_element(By.TAG_NAME, "yt-page-header-renderer")
-                .find_element(By.TAG_NAME, "yt-page-header-view-model")
-                .find_element(By.TAG_NAME, "yt-avatar-shape")
-                .find_element(By.TAG_NAME, "img")
-                .get_attribute("src")
-            )
-        except Exception as e:
-            logger.error(f"Failed to fetch dp url: {e}")
-
-        # Name and Verification Status
-        try:
-            logger.info("Fetching channel name and verification status.")
-            name_container = (
-                WebDriverWait(driver, constants.MAX_DELAY)
-                .until(
-                    EC.presence_of_element_located(
-                        (By.CLASS_NAME, "dynamic-text-view-model-wiz__h1")
-                    )
-                )
-                .find_element(By.TAG_NAME, "span")
-            )
-            name = name_container.text
-
+        info = None
+        if constants.CHANNEL_INFO_FROM_INITIAL_DATA:
             try:
-                if name_container.find_element(By.TAG_NAME, "span"):
-                    is_verified = True
-            except NoSuchElementException:
-                logger.info("Verification status: Not verified.")
-        except TimeoutException:
-            logger.error("Failed to fetch channel name and verification status.")
-
-        # More button to get about information
-        try:
-            logger.info("Clicking 'More' button to fetch about info.")
-            more_btn = WebDriverWait(driver, constants.MAX_DELAY).until(
-                EC.presence_of_element_located(
-                    (By.CLASS_NAME, "truncated-text-wiz__absolute-button")
+                logger.info("Reading channel info from embedded ytInitialData.")
+                load_page(
+                    driver, constants.CHANNEL_ABOUT_PAGE_LINK.format(channel_name)
                 )
-            )
-            more_btn.click()
+                check_channel_available(driver, channel_name)
+                info = parse_channel_info(channel_name, read_initial_data(driver))
+            except ChannelNotFoundError:
+                raise
+            except Exception as e:
+                logger.error(f"Failed to read ytInitialData for {channel_name}: {e}")
 
-            about = WebDriverWait(driver, constants.MAX_DELAY).until(
-                EC.presence_of_element_located(
-                    (
-                        By.XPATH,
-                        "/html/body/ytd-app/ytd-popup-container/tp-yt-paper-dialog/ytd-engagement-panel-section-list"
-                        "-renderer/div[2]/ytd-section-list-renderer/div[2]/ytd-item-section-renderer/div["
-                        "3]/ytd-about-channel-renderer/div/yt-attributed-string/span",
-                    )
+            if info is None:
+                logger.warning(
+                    f"ytInitialData incomplete for {channel_name}, falling back to DOM."
                 )
-            )
-            about = about.text
-        except TimeoutException:
-            logger.error("Failed to fetch about info.")
 
-        # Channels Links
-        try:
-            logger.info("Fetching channel links.")
-            links_section = WebDriverWait(driver, constants.MAX_DELAY).until(
-                EC.presence_of_element_located((By.ID, "link-list-container"))
-            )
-            link_containers = links_section.find_elements(
-                By.TAG_NAME, "yt-channel-external-link-view-model"
-            )
-            for link_container in link_containers:
-                try:
-                    container = link_container.find_elements(By.TAG_NAME, "span")
-                    links.append(
-                        Link(title=container[0].text, url=container[1].text),
-                    )
-                except Exception as e:
-                    logger.error(
-                        f"Problem with fetching one particular link for channel: {channel_name}: {str(e)}"
-                    )
-        except TimeoutException:
-            logger.error("Failed to fetch channel links.")
-
-        # Channel Details Section
-        try:
-            logger.info(
-                "Fetching channel details (subscribers, videos, views, joined date)."
-            )
-            channel_details_section = WebDriverWait(driver, constants.MAX_DELAY).until(
-                EC.presence_of_element_located(
-                    (
-                        By.XPATH,
-                        "/html/body/ytd-app/ytd-popup-container/tp-yt-paper-dialog/ytd-engagement-panel-section-list"
-                        "-renderer/div[2]/ytd-section-list-renderer/div[2]/ytd-item-section-renderer/div["
-                        "3]/ytd-about-channel-renderer/div/div[5]/table",
-                    )
-                )
-            )
-            rows = channel_details_section.find_elements(By.TAG_NAME, "tr")
-
-            for row in rows:
-                try:
-                    row.find_element(By.ID, "view-email-button-container")
-                    continue
-                except:
-                    text = row.find_elements(By.TAG_NAME, "td")[1].text
-                    if "subscribers" in text:
-                        try:
-                            subscribers = unzip_large_nums(text.split(" ")[0])
-                        except Exception as e:
-                            logger.error(f"Failed to fetch subscribers: {e}")
-                    elif "videos" in text:
-                        try:
-                            videos_count = int(text.split(" ")[0].replace(",", ""))
-                        except Exception as e:
-                            logger.error(f"Failed to fetch videos count: {e}")
-                    elif "views" in text:
-                        try:
-                            views_count = int(text.split(" ")[0].replace(",", ""))
-                        except Exception as e:
-                            logger.error(f"Failed to fetch views count: {e}")
-                    elif "Joined" in text:
-                        try:
-                            joined_date = text.replace("Joined", "")
-                        except Exception as e:
-                            logger.error(f"Failed to fetch joined date: {e}")
-                    elif "Phone verified" in text:
-                        continue
-                    else:
-                        try:
-                            location = text
-                        except Exception as e:
-                            logger.error(f"Failed to fetch location: {e}")
-
-        except Exception as e:
-            logger.error(f"Failed to fetch channel details: {e}")
-
-        # Close details button
-        try:
-            logger.info("Closing channel details popup.")
-            close_details_btn = WebDriverWait(driver, constants.MAX_DELAY).until(
-                EC.presence_of_element_located(
-                    (
-                        By.XPATH,
-                        "/html/body/ytd-app/ytd-popup-container/tp-yt-paper-dialog/ytd-engagement-panel-section-list"
-                        "-renderer/div[1]/ytd-engagement-panel-title-header-renderer/div[3]/div["
-                        "6]/ytd-button-renderer/yt-button-shape/button",
-                    )
-                )
-            )
-            close_details_btn.click()
-        except Exception as e:
-            logger.error(f"Failed to close channel details popup: {e}")
-
-        # # Affiliated Channels
-        # try:
-        #     try:
-        #         items_container = (
-        #             WebDriverWait(driver, constants.MAX_DELAY)
-        #             .until(
-        #                 EC.presence_of_element_located(
-        #                     (
-        #                         By.TAG_NAME,
-        #                         "ytd-apps",
-        #                     )
-        #                 )
-        #             )
-        #             .find_element(By.ID, "content")
-        #             .find_element(By.TAG_NAME, "page-manager")
-        #             .find_element(By.TAG_NAME, "ytd-browse")
-        #             .find_element(By.TAG_NAME, "ytd-two-column-browse-results-renderer")
-        #             .find_element(By.ID, "primary")
-        #             .find_element(By.TAG_NAME, "ytd-section-list-renderer")
-        #             .find_element(By.ID, "contents")
-        #             .find_elements(By.TAG_NAME, "ytd-item-section-renderer")[-1]
-        #             .find_element(By.ID, "contents")
-        #             .find_element(By.ID, "dismissible")
-        #             .find_element(By.ID, "contents")
-        #             .find_element(By.TAG_NAME, "yt-horizontal-list-renderer")
-        #             .find_element(By.ID, "scroll-outer-container")
-        #             .find_element(By.ID, "scroll-container")
-        #             .find_element(By.ID, "items")
-        #         )
-        #     except Exception as e:
-        #         logger.error(f"Failed to find the items_container: {e}")
-        #
-        #     affiliated_channels_containers = items_container.find_elements(
-        #         By.TAG_NAME, "ytd-grid-channel-renderer"
-        #     )
-        #
-        #     affiliated_channels = []
-        #     for container in affiliated_channels_containers:
-        #         try:
-        #             channel = container.find_element(By.ID, "channel").find_element(
-        #                 By.ID, "channel_info"
-        #             )
-        #             channel_url = channel.get_attribute("href")
-        #             channel_code = channel_url.split("/")[-1]
-        #
-        #             title = channel.find_element(By.XPATH, '//*[@id="title"]')
-        #             channel_subscribers = unzip_large_nums(
-        #                 channel.find_element(
-        #                     By.XPATH, '//*[@id="thumbnail-attribution"]'
-        #                 ).text.split(" ")[0]
-        #             )
-        #             affiliated_channels.append(
-        #                 AffiliatedChannel(
-        #                     name=title,
-        #                     url=channel_url,
-        #                     code=channel_code,
-        #                     subscribers=channel_subscribers,
-        #                 )
-        #             )
-        #         except Exception as e:
-        #             logger.error(
-        #                 f"Failed to find the affiliated channels container: {e}"
-        #             )
-        #
-        # except Exception as e:
-        #     logger.error(f"Failed to fetch affiliated channels: {e}")
-
-        info = ChannelInfo(
-            channel_code=channel_name,
-            name=name,
-            is_verified=is_verified,
-            about=about,
-            links=links,
-            display_picture_url=dp_url,
-            banner_url=banner_url,
-            affiliated_channels=affiliated_channels,
-            subscribers=subscribers,
-            content_count=videos_count,
-            num_videos=0,
-            num_shorts=0,
-            views_count=views_count,
-            joined_date=joined_date,
-            location=location,
-        )
+        if info is None:
+            info = get_channel_info_from_dom(driver, channel_name, constants, logger)
 
         stored, channel_id = channel_db.update(channel_name, info.dict())
 
-        save_img_from_url(constants.BANNER_PATH.format(channel_id), banner_url, logger)
-        save_img_from_url(constants.DP_PATH.format(channel_id), dp_url, logger)
+        save_img_from_url(
+            constants.BANNER_PATH.format(channel_id), info.banner_url, logger
+        )
+        save_img_from_url(
+            constants.DP_PATH.format(channel_id), info.display_picture_url, logger
+        )
+
+    except ChannelNotFoundError:
+        # Left to the worker, it stops retrying the channel
+        raise
 
     except TimeoutError as e:
         logger.error(f"Timeout error: {e}")
@@ -304,5 +106,327 @@ def get_channel_info(driver, channel_name, constants, logger, channel_db):
     except Exception as e:
         logger.error(f"Unexpected error occurred: {e}")
 
-    finally:
-        return stored, channel_id
+    return stored, channel_id
+
+
+def _parse_count(text: str) -> int:
+    if not text:
+        return 0
+    return unzip_large_nums(text.split(" ")[0].replace(",", ""))
+
+
+def parse_channel_info(channel_name, data: Optional[dict]) -> Optional[ChannelInfo]:
+    if not data:
+        return None
+
+    # The about panel is only embedded when the /about page is loaded directly
+    about = find_first(data, "aboutChannelViewModel")
+    header = find_first(data, "pageHeaderViewModel")
+    if not about or not header:
+        return None
+
+    metadata = find_first(data, "channelMetadataRenderer") or {}
+
+    title = header.get("title", {})
+    serialized_title = json.dumps(title)
+
+    links = []
+    for link in about.get("links", []):
+        link_view_model = link.get("channelExternalLinkViewModel", {})
+        links.append(
+            Link(
+                title=get_text(link_view_model.get("title")),
+                url=get_text(link_view_model.get("link")),
+            )
+        )
+
+    return ChannelInfo(
+        channel_code=channel_name,
+        name=get_text(find_first(title, "text")) or metadata.get("title", ""),
+        is_verified="CHECK_CIRCLE_FILLED" in serialized_title
+        or "BADGE_STYLE_TYPE_VERIFIED" in serialized_title,
+        about=about.get("description", metadata.get("description", "")),
+        links=links,
+        display_picture_url=get_largest_image_url(
+            find_first(header.get("image", {}), "image")
+        )
+        or get_largest_image_url(metadata.get("avatar")),
+        banner_url=get_largest_image_url(find_first(header.get("banner", {}), "image")),
+        affiliated_channels=[],
+        subscribers=_parse_count(get_text(about.get("subscriberCountText"))),
+        content_count=_parse_count(get_text(about.get("videoCountText"))),
+        num_videos=0,
+        num_shorts=0,
+        views_count=_parse_count(get_text(about.get("viewCountText"))),
+        joined_date=get_text(about.get("joinedDateText")).replace("Joined", "").strip(),
+        location=get_text(about.get("country")),
+    )
+
+
+def get_channel_info_from_dom(driver, channel_name, constants, logger) -> ChannelInfo:
+    load_page(driver, constants.VIDEOS_PAGE_LINK.format(channel_name))
+    check_channel_available(driver, channel_name)
+
+    name = ""
+    is_verified = False
+    about = ""
+    subscribers = 0
+    videos_count = 0
+    views_count = 0
+    joined_date = ""
+    location = ""
+    links = []
+    banner_url = ""
+    dp_url = ""
+    affiliated_channels = []
+
+    # Banner and DP URL
+    try:
+        logger.info("Fetching banner url")
+        banner_url = (
+            WebDriverWait(driver, constants.MAX_DELAY)
+            .until(EC.presence_of_element_located((By.ID, "page-header-banner-sizer")))
+            .find_element(By.TAG_NAME, "yt-image-banner-view-model")
+            .find_element(By.TAG_NAME, "img")
+            .get_attribute("src")
+        )
+    except Exception as e:
+        logger.error(f"Failed to fetch banner url: {e}")
+
+    try:
+        logger.info("Fetching dp url")
+        dp_url = (
+            WebDriverWait(driver, constants.MAX_DELAY)
+            .until(EC.presence_of_element_located((By.ID, "page-header")))
+            .find_element(By.TAG_NAME, "yt-page-header-renderer")
+            .find_element(By.TAG_NAME, "yt-page-header-view-model")
+            .find_element(By.TAG_NAME, "yt-avatar-shape")
+            .find_element(By.TAG_NAME, "img")
+            .get_attribute("src")
+        )
+    except Exception as e:
+        logger.error(f"Failed to fetch dp url: {e}")
+
+    # Name and Verification Status
+    try:
+        logger.info("Fetching channel name and verification status.")
+        name_container = (
+            WebDriverWait(driver, constants.MAX_DELAY)
+            .until(
+                EC.presence_of_element_located(
+                    (By.CLASS_NAME, "dynamic-text-view-model-wiz__h1")
+                )
+            )
+            .find_element(By.TAG_NAME, "span")
+        )
+        name = name_container.text
+
+        try:
+            if name_container.find_element(By.TAG_NAME, "span"):
+                is_verified = True
+        except NoSuchElementException:
+            logger.info("Verification status: Not verified.")
+    except TimeoutException:
+        logger.error("Failed to fetch channel name and verification status.")
+
+    # More button to get about information
+    try:
+        logger.info("Clicking 'More' button to fetch about info.")
+        more_btn = WebDriverWait(driver, constants.MAX_DELAY).until(
+            EC.presence_of_element_located(
+                (By.CLASS_NAME, "truncated-text-wiz__absolute-button")
+            )
+        )
+        more_btn.click()
+
+        about = WebDriverWait(driver, constants.MAX_DELAY).until(
+            EC.presence_of_element_located(
+                (
+                    By.XPATH,
+                    "/html/body/ytd-app/ytd-popup-container/tp-yt-paper-dialog/ytd-engagement-panel-section-list"
+                    "-renderer/div[2]/ytd-section-list-renderer/div[2]/ytd-item-section-renderer/div["
+                    "3]/ytd-about-channel-renderer/div/yt-attributed-string/span",
+                )
+            )
+        )
+        about = about.text
+    except TimeoutException:
+        logger.error("Failed to fetch about info.")
+
+    # Channels Links
+    try:
+        logger.info("Fetching channel links.")
+        links_section = WebDriverWait(driver, constants.MAX_DELAY).until(
+            EC.presence_of_element_located((By.ID, "link-list-container"))
+        )
+        link_containers = links_section.find_elements(
+            By.TAG_NAME, "yt-channel-external-link-view-model"
+        )
+        for link_container in link_containers:
+            try:
+                container = link_container.find_elements(By.TAG_NAME, "span")
+                links.append(
+                    Link(title=container[0].text, url=container[1].text),
+                )
+            except Exception as e:
+                logger.error(
+                    f"Problem with fetching one particular link for channel: {channel_name}: {str(e)}"
+                )
+    except TimeoutException:
+        logger.error("Failed to fetch channel links.")
+
+    # Channel Details Section
+    try:
+        logger.info(
+            "Fetching channel details (subscribers, videos, views, joined date)."
+        )
+        channel_details_section = WebDriverWait(driver, constants.MAX_DELAY).until(
+            EC.presence_of_element_located(
+                (
+                    By.XPATH,
+                    "/html/body/ytd-app/ytd-popup-container/tp-yt-paper-dialog/ytd-engagement-panel-section-list"
+                    "-renderer/div[2]/ytd-section-list-renderer/div[2]/ytd-item-section-renderer/div["
+                    "3]/ytd-about-channel-renderer/div/div[5]/table",
+                )
+            )
+        )
+        rows = channel_details_section.find_elements(By.TAG_NAME, "tr")
+
+        for row in rows:
+            try:
+                row.find_element(By.ID, "view-email-button-container")
+                continue
+            except:
+                text = row.find_elements(By.TAG_NAME, "td")[1].text
+                if "subscribers" in text:
+                    try:
+                        subscribers = unzip_large_nums(text.split(" ")[0])
+                    except Exception as e:
+                        logger.error(f"Failed to fetch subscribers: {e}")
+                elif "videos" in text:
+                    try:
+                        videos_count = int(text.split(" ")[0].replace(",", ""))
+                    except Exception as e:
+                        logger.error(f"Failed to fetch videos count: {e}")
+                elif "views" in text:
+                    try:
+                        views_count = int(text.split(" ")[0].replace(",", ""))
+                    except Exception as e:
+                        logger.error(f"Failed to fetch views count: {e}")
+                elif "Joined" in text:
+                    try:
+                        joined_date = text.replace("Joined", "")
+                    except Exception as e:
+                        logger.error(f"Failed to fetch joined date: {e}")
+                elif "Phone verified" in text:
+                    continue
+                else:
+                    try:
+                        location = text
+                    except Exception as e:
+                        logger.error(f"Failed to fetch location: {e}")
+
+    except Exception as e:
+        logger.error(f"Failed to fetch channel details: {e}")
+
+    # Close details button
+    try:
+        logger.info("Closing channel details popup.")
+        close_details_btn = WebDriverWait(driver, constants.MAX_DELAY).until(
+            EC.presence_of_element_located(
+                (
+                    By.XPATH,
+                    "/html/body/ytd-app/ytd-popup-container/tp-yt-paper-dialog/ytd-engagement-panel-section-list"
+                    "-renderer/div[1]/ytd-engagement-panel-title-header-renderer/div[3]/div["
+                    "6]/ytd-button-renderer/yt-button-shape/button",
+                )
+            )
+        )
+        close_details_btn.click()
+    except Exception as e:
+        logger.error(f"Failed to close channel details popup: {e}")
+
+    # # Affiliated Channels
+    # try:
+    #     try:
+    #         items_container = (
+    #             WebDriverWait(driver, constants.MAX_DELAY)
+    #             .until(
+    #                 EC.presence_of_element_located(
+    #                     (
+    #                         By.TAG_NAME,
+    #                         "ytd-apps",
+    #                     )
+    #                 )
+    #             )
+    #             .find_element(By.ID, "content")
+    #             .find_element(By.TAG_NAME, "page-manager")
+    #             .find_element(By.TAG_NAME, "ytd-browse")
+    #             .find_element(By.TAG_NAME, "ytd-two-column-browse-results-renderer")
+    #             .find_element(By.ID, "primary")
+    #             .find_element(By.TAG_NAME, "ytd-section-list-renderer")
+    #             .find_element(By.ID, "contents")
+    #             .find_elements(By.TAG_NAME, "ytd-item-section-renderer")[-1]
+    #             .find_element(By.ID, "contents")
+    #             .find_element(By.ID, "dismissible")
+    #             .find_element(By.ID, "contents")
+    #             .find_element(By.TAG_NAME, "yt-horizontal-list-renderer")
+    #             .find_element(By.ID, "scroll-outer-container")
+    #             .find_element(By.ID, "scroll-container")
+    #             .find_element(By.ID, "items")
+    #         )
+    #     except Exception as e:
+    #         logger.error(f"Failed to find the items_container: {e}")
+    #
+    #     affiliated_channels_containers = items_container.find_elements(
+    #         By.TAG_NAME, "ytd-grid-channel-renderer"
+    #     )
+    #
+    #     affiliated_channels = []
+    #     for container in affiliated_channels_containers:
+    #         try:
+    #             channel = container.find_element(By.ID, "channel").find_element(
+    #                 By.ID, "channel_info"
+    #             )
+    #             channel_url = channel.get_attribute("href")
+    #             channel_code = channel_url.split("/")[-1]
+    #
+    #             title = channel.find_element(By.XPATH, '//*[@id="title"]')
+    #             channel_subscribers = unzip_large_nums(
+    #                 channel.find_element(
+    #                     By.XPATH, '//*[@id="thumbnail-attribution"]'
+    #                 ).text.split(" ")[0]
+    #             )
+    #             affiliated_channels.append(
+    #                 AffiliatedChannel(
+    #                     name=title,
+    #                     url=channel_url,
+    #                     code=channel_code,
+    #                     subscribers=channel_subscribers,
+    #                 )
+    #             )
+    #         except Exception as e:
+    #             logger.error(
+    #                 f"Failed to find the affiliated channels container: {e}"
+    #             )
+    #
+    # except Exception as e:
+    #     logger.error(f"Failed to fetch affiliated channels: {e}")
+
+    return ChannelInfo(
+        channel_code=channel_name,
+        name=name,
+        is_verified=is_verified,
+        about=about,
+        links=links,
+        display_picture_url=dp_url,
+        banner_url=banner_url,
+        affiliated_channels=affiliated_channels,
+        subscribers=subscribers,
+        content_count=videos_count,
+        num_videos=0,
+        num_shorts=0,
+        views_count=views_count,
+        joined_date=joined_date,
+        location=location,
+    )
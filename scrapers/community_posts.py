@@ -1,4 +1,5 @@
 from datetime import datetime
+from itertools import chain
 from typing import List
 
 from selenium.common import NoSuchElementException, WebDriverException
@@ -8,6 +9,7 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
 from lib.constants import Constants
+from lib.rate_limiter import load_page
 from lib.structures import (
     CommunityPost,
     CommunityPostType,
@@ -18,22 +20,27 @@ from lib.structures import (
 )
 from lib.utils import (
     unzip_large_nums,
-    scroll,
+    harvest_items,
+    scroll_for_items,
     save_to_json,
     video_duration_parser,
     get_webdriver,
     get_logger,
     extract_hashtags,
 )
+from lib.tabs import TabManager
 
 
-def get_community_posts(
-    channel_name, comments_driver, community_posts_driver, constants, logger
-):
+def get_community_posts(channel_name, community_posts_driver, constants, logger):
+    # Comment pages load in tabs of the listing's browser instead of a second one
+    tabs = TabManager(community_posts_driver, constants)
+    # Errors are logged here, the caller only learns whether it all went through
+    scraped = False
     try:
         logger.info(f"Getting Community Posts for {channel_name}")
-        community_posts_driver.get(
-            constants.COMMUNITY_POSTS_PAGE_LINK.format(channel_name)
+        load_page(
+            community_posts_driver,
+            constants.COMMUNITY_POSTS_PAGE_LINK.format(channel_name),
         )
         community_posts_driver.maximize_window()
 
@@ -56,21 +63,23 @@ def get_community_posts(
             )
             return p
 
-        current_posts_count = len(get_posts())
-        while current_posts_count < constants.COMMUNITY_POSTS_COUNT:
-            scroll(
+        # Wait for the posts container to render before harvesting
+        get_posts()
+
+        # Posts stream in batches while scrolling, each batch is pruned from
+        # the page once read
+        posts = chain.from_iterable(
+            harvest_items(
                 community_posts_driver,
-                2,
-                1,
-                constants.MAX_DELAY,
+                "ytd-backstage-post-thread-renderer",
+                constants.COMMUNITY_POSTS_COUNT,
+                idle_timeout=constants.SCROLL_IDLE_TIMEOUT,
+                max_duration=constants.SCROLL_MAX_DURATION,
+                prune=constants.HARVEST_PRUNE_DOM,
             )
-            new_posts_count = len(get_posts())
-            if new_posts_count == current_posts_count:
-                break
-            current_posts_count = new_posts_count
-
-        posts = get_posts()
+        )
 
+        posts_data = []
         for i, post_element in enumerate(posts):
             if i == constants.COMMUNITY_POSTS_COUNT:
                 break
@@ -124,23 +133,40 @@ def get_community_posts(
             # Post Content
             post_content = get_post_content(main_area, post_type, logger, url)
 
+            posts_data.append(
+                dict(
+                    code=code,
+                    url=url,
+                    description=description,
+                    hashtags=extract_hashtags(description),
+                    post_type=post_type,
+                    post_content=post_content,
+                    likes=likes,
+                    posted_date=posted_date,
+                )
+            )
+
+        # Comment pages load TABS_PER_BROWSER at a time while earlier ones are read
+        comment_pages = tabs.iter_pages(
+            [
+                constants.COMMUNITY_POST_PAGE_LINK.format(post_data["code"])
+                for post_data in posts_data
+            ],
+            blocking_profile="community",
+        )
+        for post_data, (_, comments_page) in zip(posts_data, comment_pages):
+            code = post_data["code"]
+
             # Post Comments
             comments_count, comments = get_comments(
-                comments_driver, code, constants, logger
+                comments_page, code, constants, logger
             )
 
             # Final Step
             post = CommunityPost(
-                code=code,
-                url=url,
-                description=description,
-                hashtags=extract_hashtags(description),
-                post_type=post_type,
-                post_content=post_content,
-                likes=likes,
+                **post_data,
                 comments_count=comments_count,
                 comments=comments,
-                posted_date=posted_date,
                 fetched_timestamp=str(datetime.now()),
             )
 
@@ -149,6 +175,8 @@ def get_community_posts(
                 post.model_dump_json(indent=4),
             )
 
+        scraped = True
+
     except TimeoutError as te:
         logger.error(f"Timeout error: {te}")
 
@@ -161,6 +189,14 @@ def get_community_posts(
     except WebDriverException as wde:
         logger.error(f"Webdriver Exception: {wde}")
 
+    finally:
+        try:
+            tabs.close()
+        except WebDriverException as wde:
+            logger.error(f"Failed to close comment tabs: {wde}")
+
+    return scraped
+
 
 def get_post_content(
     main_area: WebElement, post_type: CommunityPostType, logger, post_url
@@ -354,18 +390,16 @@ def get_post_content(
 
 
 def get_comments(comments_driver, code, constants, logger) -> (int, List[Comment]):
+    # comments_driver is expected to be on the post's page already
     comments = []
     comments_count = 0
     try:
-        comments_driver.get(constants.COMMUNITY_POST_PAGE_LINK.format(code))
-
-        scroll(
+        scroll_for_items(
             comments_driver,
-            2,
-            constants.COMMUNITY_POSTS_COMMENTS_COUNT
-            // constants.COMMUNITY_POSTS_COMMENTS_PER_PAGE
-            + 1,
-            constants.MAX_DELAY,
+            "ytd-comment-thread-renderer",
+            constants.COMMUNITY_POSTS_COMMENTS_COUNT,
+            idle_timeout=constants.SCROLL_IDLE_TIMEOUT,
+            max_duration=constants.SCROLL_MAX_DURATION,
         )
 
         # Comments Count
@@ -524,8 +558,7 @@ def get_post_type(main_area: WebElement) -> CommunityPostType:
 if __name__ == "__main__":
     get_community_posts(
         "@tanmaybhat",
-        get_webdriver(),
-        get_webdriver(headless=False),
+        get_webdriver(headless=False, blocking_profile="community"),
         Constants,
         get_logger("logs"),
     )
@@ -1,5 +1,5 @@
-import time
 from datetime import datetime
+from itertools import chain
 
 from selenium.common import NoSuchElementException, WebDriverException
 from selenium.webdriver.common.by import By
@@ -7,41 +7,53 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
 from lib.constants import Constants
+from lib.rate_limiter import load_page
 from lib.structures import ShortInfo, Comment, ShortMusic, Link, ShortEffect
 from lib.utils import (
-    scroll_to_bottom,
+    harvest_items,
     get_webdriver,
     unzip_large_nums,
     get_logger,
     save_to_json,
     extract_hashtags,
 )
+from lib.tabs import TabManager
 
 
-def get_shorts(
-    channel_name, shorts_info_driver, shorts_details_driver, constants, logger
-):
+def get_shorts(channel_name, driver, constants, logger):
+    # The listing and the per-short pages share one browser, shorts load in
+    # tabs next to the listing
+    tabs = TabManager(driver, constants)
+    # Errors are logged here, the caller only learns whether it all went through
+    scraped = False
     try:
-        shorts_info_driver.get(f"{constants.SHORTS_PAGE_LINK.format(channel_name)}")
-        shorts_info_driver.maximize_window()
-
-        scroll_to_bottom(shorts_info_driver, pause_time=1.5, scroll_count=5)
-
-        shorts_containers = (
-            WebDriverWait(shorts_info_driver, constants.MAX_DELAY)
-            .until(
-                EC.presence_of_element_located(
-                    (
-                        By.XPATH,
-                        "/html/body/ytd-app/div[1]/ytd-page-manager/ytd-browse/ytd-two-column-browse-results-renderer"
-                        "/div[1]",
-                    )
+        load_page(driver, constants.SHORTS_PAGE_LINK.format(channel_name))
+        driver.maximize_window()
+
+        WebDriverWait(driver, constants.MAX_DELAY).until(
+            EC.presence_of_element_located(
+                (
+                    By.XPATH,
+                    "/html/body/ytd-app/div[1]/ytd-page-manager/ytd-browse/ytd-two-column-browse-results-renderer"
+                    "/div[1]",
                 )
             )
-            .find_element(By.ID, "contents")
-            .find_elements(By.TAG_NAME, "ytd-rich-item-renderer")
         )
 
+        # Containers stream in batches while scrolling, each batch is pruned
+        # from the page once its shorts are read
+        shorts_containers = chain.from_iterable(
+            harvest_items(
+                driver,
+                "ytd-rich-item-renderer",
+                constants.SHORTS_COUNT,
+                idle_timeout=constants.SCROLL_IDLE_TIMEOUT,
+                max_duration=constants.SCROLL_MAX_DURATION,
+                prune=constants.HARVEST_PRUNE_DOM,
+            )
+        )
+
+        shorts = []
         for i, container in enumerate(shorts_containers):
 
             if i == constants.SHORTS_COUNT:
@@ -65,20 +77,22 @@ def get_shorts(
                 .split("/")[-1]
             )
 
-            # Short URL
-            url = f"https://www.youtube.com/shorts/{code}"
+            shorts.append((code, thumbnail_url))
 
-            shorts_details_driver.get(url)
-            shorts_details_driver.maximize_window()
-            time.sleep(1)
+        # Short pages load TABS_PER_BROWSER at a time while earlier ones are read
+        short_pages = tabs.iter_pages(
+            [f"https://www.youtube.com/shorts/{code}" for code, _ in shorts],
+            blocking_profile="shorts",
+        )
+        for (code, thumbnail_url), (url, short_page) in zip(shorts, short_pages):
 
             # Pause Video to control network usage
-            WebDriverWait(shorts_details_driver, constants.MAX_DELAY).until(
+            WebDriverWait(short_page, constants.MAX_DELAY).until(
                 EC.presence_of_element_located((By.ID, "short-video-container"))
             ).click()
 
             # Navigate to Shorts Description
-            WebDriverWait(shorts_details_driver, constants.MAX_DELAY).until(
+            WebDriverWait(short_page, constants.MAX_DELAY).until(
                 EC.presence_of_element_located((By.ID, "menu-button"))
             ).find_element(By.TAG_NAME, "ytd-menu-renderer").find_element(
                 By.ID, "button-shape"
@@ -86,7 +100,7 @@ def get_shorts(
                 By.TAG_NAME, "button"
             ).click()
 
-            WebDriverWait(shorts_details_driver, constants.MAX_DELAY).until(
+            WebDriverWait(short_page, constants.MAX_DELAY).until(
                 EC.presence_of_element_located(
                     (
                         By.XPATH,
@@ -96,9 +110,7 @@ def get_shorts(
                 )
             ).click()
 
-            modal_items = WebDriverWait(
-                shorts_details_driver, constants.MAX_DELAY
-            ).until(
+            modal_items = WebDriverWait(short_page, constants.MAX_DELAY).until(
                 EC.presence_of_element_located(
                     (By.XPATH, '//*[@id="anchored-panel"]//*[@id="items"]')
                 )
@@ -153,7 +165,7 @@ def get_shorts(
             )
 
             # Open comments
-            WebDriverWait(shorts_details_driver, constants.MAX_DELAY).until(
+            WebDriverWait(short_page, constants.MAX_DELAY).until(
                 EC.presence_of_element_located((By.ID, "comments-button"))
             ).find_element(By.TAG_NAME, "ytd-button-renderer").find_element(
                 By.TAG_NAME, "yt-button-shape"
@@ -161,9 +173,9 @@ def get_shorts(
                 By.TAG_NAME, "button"
             ).click()
 
-            comments_modal = WebDriverWait(
-                shorts_details_driver, constants.MAX_DELAY
-            ).until(EC.presence_of_element_located((By.ID, "anchored-panel")))
+            comments_modal = WebDriverWait(short_page, constants.MAX_DELAY).until(
+                EC.presence_of_element_located((By.ID, "anchored-panel"))
+            )
 
             contents = WebDriverWait(comments_modal, constants.MAX_DELAY).until(
                 EC.presence_of_element_located(
@@ -194,7 +206,7 @@ def get_shorts(
 
             # while counter < 100 and no_new_comments_count < 3:
             #     # Scroll using JavaScript
-            #     shorts_details_driver.execute_script(
+            #     short_page.execute_script(
             #         "arguments[0].scrollTop = arguments[0].scrollHeight", comments_section
             #     )
             #
@@ -328,6 +340,8 @@ def get_shorts(
                 s.model_dump_json(indent=4),
             )
 
+        scraped = True
+
     except TimeoutError as te:
         logger.error(f"Timeout error: {te}")
 
@@ -340,13 +354,20 @@ def get_shorts(
     except WebDriverException as wde:
         logger.error(f"Webdriver Exception: {wde}")
 
+    finally:
+        try:
+            tabs.close()
+        except WebDriverException as wde:
+            logger.error(f"Failed to close short tabs: {wde}")
+
+    return scraped
+
 
 if __name__ == "__main__":
     channel = "@MrBeast"
     get_shorts(
         channel,
-        get_webdriver(headless=False),
-        get_webdriver(headless=False),
+        get_webdriver(headless=False, blocking_profile="videos_listing"),
         Constants(),
         get_logger("logs/test_runs"),
     )
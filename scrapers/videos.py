@@ -7,18 +7,139 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import (
     TimeoutException,
     NoSuchElementException,
+    WebDriverException,
 )
 from urllib3.exceptions import NewConnectionError
 
 from db import YtVideoDB
 from lib.errors import ScraperRuntimeError
+from lib.rate_limiter import load_page
 from lib.structures import Comment, RelatedVideo, TranscriptItem
 from lib.utils import (
     unzip_large_nums,
-    scroll,
+    harvest_items,
+    scroll_for_items,
     video_duration_parser,
 )
 
+VIDEO_GRID_ITEM_SELECTOR = "ytd-rich-grid-renderer ytd-rich-item-renderer"
+
+# Maps a single grid item to everything get_video_info needs, run in the page
+# by harvest_items so a whole batch comes back in one round trip.
+VIDEO_ITEM_EXTRACTOR = """(item) => {
+    const content = item.querySelector("#content") || item;
+    const link = content.querySelector("a");
+    const img = content.querySelector("img");
+    const title = content.querySelector("#video-title");
+    const duration = content.querySelector("ytd-thumbnail-overlay-time-status-renderer");
+    const views = content.querySelector("#metadata-line span");
+    return {
+        url: link ? link.href : "",
+        thumbnail_url: img ? img.src : "",
+        title: title ? title.innerText.trim() : "",
+        duration: duration ? duration.innerText.trim() : "",
+        views: views ? views.innerText.trim() : "",
+    };
+}"""
+
+
+def parse_grid_item(item: dict, channel_id) -> tuple:
+    try:
+        duration = video_duration_parser(item["duration"])
+    except ValueError:
+        # "LIVE", "UPCOMING" and similar badges instead of a duration
+        duration = None
+
+    views = None
+    if item["views"]:
+        views = unzip_large_nums(item["views"].split(" ")[0].replace(",", ""))
+
+    return (
+        item["title"],
+        item["url"].split("=")[-1],
+        item["url"],
+        item["thumbnail_url"],
+        duration,
+        views,
+        channel_id,
+    )
+
+
+def filter_known_videos(
+    videos: list[tuple], known_codes: set[str], known_streak: int
+) -> tuple[list[tuple], int]:
+    # Listings are newest first, so a run of known codes means we caught up
+    new_videos = []
+    for video in videos:
+        if video[1] in known_codes:
+            known_streak += 1
+        else:
+            known_streak = 0
+            new_videos.append(video)
+    return new_videos, known_streak
+
+
+def harvest_new_videos(
+    driver, channel_id, known_codes: set[str], constants, logger
+) -> list[tuple]:
+    new_videos = []
+    known_streak = 0
+    for items in harvest_items(
+        driver,
+        VIDEO_GRID_ITEM_SELECTOR,
+        constants.VIDEOS_COUNT_BASIC_INFO,
+        item_extractor=VIDEO_ITEM_EXTRACTOR,
+        idle_timeout=constants.SCROLL_IDLE_TIMEOUT,
+        max_duration=constants.SCROLL_MAX_DURATION,
+        prune=constants.HARVEST_PRUNE_DOM,
+    ):
+        videos, known_streak = filter_known_videos(
+            [parse_grid_item(item, channel_id) for item in items if item["url"]],
+            known_codes,
+            known_streak,
+        )
+        new_videos.extend(videos)
+
+        if known_streak >= constants.INCREMENTAL_STOP_AFTER_KNOWN:
+            logger.info(
+                f"Reached {known_streak} already known videos, stopping the scroll."
+            )
+            break
+
+    return new_videos
+
+
+def get_video_info_per_element(contents, channel_id, logger) -> list[tuple]:
+    videos = []
+    for content in contents.find_elements(By.ID, "content"):
+        try:
+            video_url = content.find_element(By.TAG_NAME, "a").get_attribute("href")
+
+            code = video_url.split("=")[-1]
+
+            thumbnail_url = content.find_element(By.TAG_NAME, "img").get_attribute(
+                "src"
+            )
+
+            title = content.find_element(By.ID, "video-title").text
+
+            videos.append(
+                (
+                    title,
+                    code,
+                    video_url,
+                    thumbnail_url,
+                    None,
+                    None,
+                    channel_id,
+                )
+            )
+
+        except Exception as e:
+            logger.error(f"Failed to extract details for a video: {e}")
+
+    return videos
+
 
 def get_video_info(
     driver,
@@ -30,76 +151,68 @@ def get_video_info(
 ):
     num_videos = 0
     try:
-        driver.get(constants.VIDEOS_PAGE_LINK.format(channel_name))
+        load_page(driver, constants.VIDEOS_PAGE_LINK.format(channel_name))
         driver.maximize_window()
         logger.info(f"Fetching video information for channel: {channel_name}")
         contents = WebDriverWait(driver, constants.MAX_DELAY).until(
             EC.presence_of_element_located((By.ID, "contents"))
         )
 
-        # Scrolling logic
-        try:
-            logger.info("Scrolling through the page to load all videos.")
-
-            last_height = driver.execute_script(
-                "return document.documentElement.scrollHeight"
-            )
-
-            num_videos = len(contents.find_elements(By.ID, "content"))
-
-            while num_videos < constants.VIDEOS_COUNT_BASIC_INFO:
-                num_videos = len(contents.find_elements(By.ID, "content"))
+        known_codes = set()
+        if constants.VIDEOS_INCREMENTAL:
+            known_codes = videos_db.get_codes_by_channel(channel_id)
 
-                driver.execute_script(
-                    "window.scrollTo(0, document.documentElement.scrollHeight);"
+        videos = None
+        if constants.VIDEOS_BULK_EXTRACTION:
+            try:
+                logger.info(
+                    f"Harvesting new videos, {len(known_codes)} already known for {channel_name}."
                 )
-                time.sleep(constants.SCROLL_WAIT_TIME)
-
-                new_height = driver.execute_script(
-                    "return document.documentElement.scrollHeight"
+                videos = harvest_new_videos(
+                    driver, channel_id, known_codes, constants, logger
                 )
-
-                if new_height == last_height:
-                    break
-
-                last_height = new_height
-
-            driver.execute_script("window.scrollTo(0, 0);")
-
-        except Exception as e:
-            logger.error(f"Scrolling failed: {e}")
-
-        videos = []
-        for count, content in enumerate(contents.find_elements(By.ID, "content")):
-            try:
-                # logger.info("Extracting video details.")
-                video_url = content.find_element(By.TAG_NAME, "a").get_attribute("href")
-
-                code = video_url.split("=")[-1]
-
-                thumbnail_url = content.find_element(By.TAG_NAME, "img").get_attribute(
-                    "src"
+                num_videos = len(known_codes) + len(videos)
+            except WebDriverException as e:
+                logger.error(
+                    f"Harvesting failed, falling back to per-element extraction: {e}"
                 )
+                videos = None
 
-                title = content.find_element(By.ID, "video-title").text
+                # Harvesting prunes the grid, start over from a fresh page
+                load_page(driver, constants.VIDEOS_PAGE_LINK.format(channel_name))
+                contents = WebDriverWait(driver, constants.MAX_DELAY).until(
+                    EC.presence_of_element_located((By.ID, "contents"))
+                )
 
-                videos.append(
-                    (
-                        title,
-                        code,
-                        video_url,
-                        thumbnail_url,
-                        channel_id,
-                    )
+        if videos is None:
+            # Scrolling logic
+            try:
+                logger.info("Scrolling through the page to load all videos.")
+
+                num_videos = scroll_for_items(
+                    driver,
+                    VIDEO_GRID_ITEM_SELECTOR,
+                    constants.VIDEOS_COUNT_BASIC_INFO,
+                    idle_timeout=constants.SCROLL_IDLE_TIMEOUT,
+                    max_duration=constants.SCROLL_MAX_DURATION,
                 )
 
             except Exception as e:
-                logger.error(f"Failed to extract details for a video: {e}")
+                logger.error(f"Scrolling failed: {e}")
+
+            videos = get_video_info_per_element(contents, channel_id, logger)
+            videos, _ = filter_known_videos(videos, known_codes, 0)
 
         try:
             logger.info(f"Storing all videos basic info for channel: {channel_name}")
 
-            videos_db.create_many(values=videos, channel_id=channel_id)
+            # None when writes are buffered, the writer logs the counts
+            counts = videos_db.create_many(values=videos, channel_id=channel_id)
+            if counts:
+                inserted, skipped = counts
+                logger.info(
+                    f"Stored {inserted} new videos for {channel_name}, {skipped} already stored"
+                )
             videos_db.update_video_and_shorts_count(channel_id, num_videos)
 
         except Exception as e:
@@ -137,7 +250,7 @@ def get_video_details(video_details_driver, code, constants, logger):
     }
 
     try:
-        video_details_driver.get(constants.VIDEO_PAGE_LINK.format(code))
+        load_page(video_details_driver, constants.VIDEO_PAGE_LINK.format(code))
         video_details_driver.maximize_window()
 
         # Expand button
@@ -252,8 +365,13 @@ def get_video_details(video_details_driver, code, constants, logger):
         except TimeoutException:
             logger.error("Failed to fetch transcript")
 
-        scroll(video_details_driver, constants.PAUSE_TIME, 8, constants.MAX_DELAY)
-        # scroll(video_details_driver, constants.PAUSE_TIME, 2, constants.MAX_DELAY)
+        scroll_for_items(
+            video_details_driver,
+            "ytd-comment-thread-renderer",
+            constants.VIDEO_COMMENTS_COUNT,
+            idle_timeout=constants.SCROLL_IDLE_TIMEOUT,
+            max_duration=constants.SCROLL_MAX_DURATION,
+        )
 
         # Comments Info
         try:
@@ -0,0 +1,116 @@
+from db import YtVideoDB
+from lib.errors import PageLayoutError
+from lib.http_client import YtHttpClient
+from lib.initial_data import find_first, find_key, get_text, get_largest_image_url
+from scrapers.videos import parse_grid_item, filter_known_videos
+
+
+def parse_listing_items(items: list, constants) -> tuple[list[dict], str | None]:
+    videos = []
+    continuation = None
+
+    for item in items:
+        video_renderer = find_first(item, "videoRenderer")
+        if video_renderer and video_renderer.get("videoId"):
+            videos.append(
+                {
+                    "url": constants.VIDEO_PAGE_LINK.format(video_renderer["videoId"]),
+                    "thumbnail_url": get_largest_image_url(
+                        video_renderer.get("thumbnail")
+                    ),
+                    "title": get_text(video_renderer.get("title")),
+                    "duration": get_text(video_renderer.get("lengthText")),
+                    "views": get_text(video_renderer.get("viewCountText")),
+                }
+            )
+            continue
+
+        command = find_first(item, "continuationCommand")
+        if command:
+            continuation = command.get("token")
+
+    return videos, continuation
+
+
+def get_continuation_items(response: dict) -> list:
+    items = []
+    for action in find_key(response, "appendContinuationItemsAction"):
+        items.extend(action.get("continuationItems", []))
+    return items
+
+
+def get_video_info_http(
+    client: YtHttpClient,
+    channel_name,
+    channel_id,
+    constants,
+    logger,
+    videos_db: YtVideoDB,
+):
+    logger.info(f"Fetching video information over HTTP for channel: {channel_name}")
+
+    known_codes = set()
+    if constants.VIDEOS_INCREMENTAL:
+        known_codes = videos_db.get_codes_by_channel(channel_id)
+
+    path = f"/{channel_name}/videos"
+    data, ytcfg = client.get_initial_data(path)
+
+    grid = find_first(data, "richGridRenderer") or {}
+    items, continuation = parse_listing_items(grid.get("contents", []), constants)
+    if not items:
+        # No grid or only item types parse_listing_items does not read, e.g.
+        # lockupViewModel. Left to the Selenium engine rather than stored as
+        # a channel without videos.
+        raise PageLayoutError(
+            message=f"No videos in the listing of {channel_name}",
+            url=f"{client.base_url}{path}",
+        )
+
+    videos, known_streak = filter_known_videos(
+        [parse_grid_item(item, channel_id) for item in items], known_codes, 0
+    )
+    num_items = len(items)
+
+    while (
+        continuation
+        and num_items < constants.VIDEOS_COUNT_BASIC_INFO
+        and known_streak < constants.INCREMENTAL_STOP_AFTER_KNOWN
+    ):
+        response = client.browse(continuation, ytcfg)
+        items, continuation = parse_listing_items(
+            get_continuation_items(response), constants
+        )
+        if not items:
+            break
+
+        new_videos, known_streak = filter_known_videos(
+            [parse_grid_item(item, channel_id) for item in items],
+            known_codes,
+            known_streak,
+        )
+        videos.extend(new_videos)
+        num_items += len(items)
+
+    videos = videos[: constants.VIDEOS_COUNT_BASIC_INFO]
+    num_videos = len(known_codes) + len(videos)
+
+    try:
+        logger.info(f"Storing all videos basic info for channel: {channel_name}")
+
+        # None when writes are buffered, the writer logs the counts
+        counts = videos_db.create_many(values=videos, channel_id=channel_id)
+        if counts:
+            inserted, skipped = counts
+            logger.info(
+                f"Stored {inserted} new videos for {channel_name}, {skipped} already stored"
+            )
+        videos_db.update_video_and_shorts_count(channel_id, num_videos)
+
+    except Exception as e:
+        logger.error(
+            f"Failed to store all videos basic info for channel: {channel_name}: {e}"
+        )
+        return False
+
+    return 1
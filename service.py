@@ -1,11 +1,19 @@
 from logging import Logger
-import time
+import os
+import socket
+import threading
+from lib.async_orchestrator import AsyncOrchestrator
 from lib.constants import Constants
 from lib.dashboard_server import DashboardServer
-from lib.job_queue import JobQueue
 from lib.metrics_server import MetricsServer
+from lib.pipeline import Pipeline
+from lib.priority import claim_scoring
+from lib.process_pool import WorkerProcessPool
 from lib.structures import YtScraperConfig, JobType
+from lib.utils import resolve_chromedriver_path
 from lib.worker import ScraperWorker
+from lib.worker_pools import WorkerPools
+from lib.write_behind import WriteBehindBuffer
 from scraper import YtScraper
 
 
@@ -14,10 +22,37 @@ class ScraperService:
         self.constants = constants
         self.logger = logger
         self.config = YtScraperConfig()
-        self.scraper = YtScraper(self.constants, self.config)
-        self.job_queue = JobQueue(constants=self.constants)
         self.workers = []
-        self.num_workers = self.constants.MAX_WORKERS
+        self.process_pool = None
+        self.write_buffer = None
+        if self.constants.WRITE_BEHIND and not self.constants.WORKER_PROCESSES:
+            # Worker processes run their own
+            self.write_buffer = WriteBehindBuffer(self.constants, self.logger)
+            self.config.channel_db = self.write_buffer.channel_db
+            self.config.video_db = self.write_buffer.video_db
+        self.scraper = YtScraper(self.constants, self.config)
+        self.worker_pools = None
+        if self.constants.WORKER_PROCESSES:
+            self.process_pool = WorkerProcessPool(
+                self.constants, self.logger, self.constants.WORKER_PROCESSES
+            )
+            self.job_queue = self.process_pool.job_queue
+        else:
+            # Routes each job to the queue of the pool serving its type
+            self.worker_pools = WorkerPools(self.constants, self.logger)
+            self.job_queue = self.worker_pools
+        # Shared by the threaded workers so stage caps hold across them
+        self.pipeline = Pipeline(
+            self.constants, self.logger, self.job_queue, self.config
+        )
+        self.orchestrator = None
+        if self.constants.ASYNC_ENGINE_JOB_TYPES and not self.process_pool:
+            self.orchestrator = AsyncOrchestrator(
+                self.constants, self.logger, self.config, self.config.proxy
+            )
+        self.stopped = threading.Event()
+        # Owner of the channel leases this instance takes
+        self.worker_name = f"{socket.gethostname()}:{os.getpid()}"
         self.metrics_server = MetricsServer(
             logger=self.logger, port=self.constants.METRICS_PORT
         )
@@ -26,37 +61,89 @@ class ScraperService:
         )
 
     def start(self):
+        chromedriver_path = resolve_chromedriver_path()
+        self.logger.info(f"Using chromedriver at {chromedriver_path}")
+
         self.metrics_server.start()
         self.dashboard_server.start()
 
-        for i in range(self.num_workers):
-            worker = ScraperWorker(
-                self.constants, self.logger, i, self.job_queue, self.scraper
-            )
-            worker.start()
-            self.workers.append(worker)
+        if self.process_pool:
+            # Worker processes inherit it instead of resolving it again
+            os.environ["CHROMEDRIVER_PATH"] = chromedriver_path
+            self.process_pool.start()
+        else:
+            if self.write_buffer:
+                self.write_buffer.start()
+            if self.orchestrator:
+                self.orchestrator.start()
+            for pool, size in self.worker_pools.sizes.items():
+                job_queue = self.worker_pools.queue_for(pool)
+                for _ in range(size):
+                    worker = ScraperWorker(
+                        self.constants,
+                        self.logger,
+                        len(self.workers),
+                        job_queue,
+                        self.scraper,
+                        self.pipeline,
+                        self.orchestrator,
+                        pool=pool,
+                    )
+                    worker.start()
+                    self.workers.append(worker)
+                self.logger.info(f"Started {size} workers in the {pool} pool.")
 
         self.logger.info("Scraper service started, polling for new jobs.")
 
         # adding new unscraped channels
-        while not self.job_queue.is_full():
-            channels = self.config.channel_db.get_unscraped_channels()
+        while not self.job_queue.is_full() and not self.stopped.is_set():
+            # Leased channels are skipped by other instances and later polls.
+            # Only as many as the queue has room for, the lease runs while they
+            # wait.
+            free = self.constants.CHANNEL_QUEUE_TARGET - self.job_queue.count_queued(
+                JobType.channel_info
+            )
+            channels = []
+            if free > 0:
+                channels = self.config.channel_db.claim_due_channels(
+                    self.worker_name,
+                    min(self.constants.CHANNEL_CLAIM_BATCH, free),
+                    self.constants.CHANNEL_LEASE_SECONDS,
+                    claim_scoring(self.constants),
+                )
             if channels:
                 for channel in channels:
                     self.job_queue.add_job(
-                        channel_name=channel, job_type=JobType.channel_info, data=None
+                        channel_name=channel["channel_code"],
+                        job_type=JobType.channel_info,
+                        data=None,
+                        priority=channel["priority"],
                     )
 
                 self.logger.info(f"Added {len(channels)} new channels to queue.")
 
-            time.sleep(60)
+            self.stopped.wait(60)
 
     def stop(self):
+        self.stopped.set()
         for worker in self.workers:
             worker.running = False
 
+        if self.process_pool:
+            self.process_pool.stop()
+        else:
+            # Wakes idle workers, busy ones exit after their current job
+            self.job_queue.close()
+
         for worker in self.workers:
             worker.join()
+        if self.orchestrator:
+            # Waits for the jobs workers handed it before closing its browsers
+            self.orchestrator.stop()
+        if self.write_buffer:
+            # After everything that writes to it has stopped
+            self.write_buffer.close()
 
+        self.scraper.close()
         self.metrics_server.stop()
         self.dashboard_server.stop()
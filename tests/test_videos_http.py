@@ -0,0 +1,246 @@
+import json
+import logging
+import os
+import socket
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import requests
+
+from lib.constants import Constants
+from lib.errors import BotWallError, PageLayoutError
+from lib.http_client import YtHttpClient
+from lib.rate_limiter import get_rate_limiter
+from scrapers.videos_http import get_video_info_http
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "videos_http")
+
+# Listing pages by path, browse responses by continuation token
+PAGES = {
+    "/@fixture/videos": "channel_videos.html",
+    "/@lockup/videos": "channel_videos_lockup.html",
+}
+CONTINUATIONS = {
+    "page-2": "browse_page-2.json",
+    "page-3": "browse_page-3.json",
+}
+
+
+def read_fixture(name: str) -> bytes:
+    with open(os.path.join(FIXTURES, name), "rb") as fixture:
+        return fixture.read()
+
+
+# Stands in for www.youtube.com, replays the fixtures and records the browse
+# requests it gets
+class FixtureHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path in PAGES:
+            self._send(200, "text/html", read_fixture(PAGES[self.path]))
+        elif self.path == "/@walled/videos":
+            self.send_response(302)
+            self.send_header("Location", "/sorry/index?continue=/@walled/videos")
+            self.end_headers()
+        elif self.path.startswith("/sorry"):
+            self._send(200, "text/html", b"<html>Our systems have detected</html>")
+        elif self.path == "/@throttled/videos":
+            self._send(429, "text/html", b"<html>Too Many Requests</html>")
+        elif self.path == "/@broken/videos":
+            self.server.broken_requests += 1
+            self._send(503, "text/html", b"<html>Service Unavailable</html>")
+        else:
+            self._send(404, "text/html", b"<html>404 Not Found</html>")
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.browse_requests.append(
+            {"path": self.path, "headers": dict(self.headers), "body": body}
+        )
+        fixture = CONTINUATIONS.get(body.get("continuation"))
+        if fixture is None:
+            self._send(400, "application/json", b"{}")
+            return
+        self._send(200, "application/json", read_fixture(fixture))
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, content_type: str, body: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class RecordingVideoDB:
+    def __init__(self, known_codes=(), fail=False):
+        self.known_codes = set(known_codes)
+        self.fail = fail
+        self.created = []
+        self.counts = {}
+
+    def get_codes_by_channel(self, channel_id):
+        return set(self.known_codes)
+
+    def create_many(self, values, channel_id):
+        if self.fail:
+            raise RuntimeError("database is down")
+        self.created.extend(values)
+        return len(values), 0
+
+    def update_video_and_shorts_count(self, channel_id, num_videos):
+        self.counts[channel_id] = num_videos
+        return True
+
+
+class VideosHttpTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+        cls.server.browse_requests = []
+        cls.server.broken_requests = 0
+        cls.server_thread = threading.Thread(
+            target=cls.server.serve_forever, daemon=True
+        )
+        cls.server_thread.start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.browse_requests.clear()
+        self.server.broken_requests = 0
+        # A fresh rate limiter per test, walls hit by one test don't slow the next
+        patcher = mock.patch("lib.rate_limiter._limiter", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.client = YtHttpClient(Constants, base_url=self.base_url)
+        self.addCleanup(self.client.close)
+        self.logger = logging.getLogger(__name__)
+
+    def test_pages_through_continuations(self):
+        video_db = RecordingVideoDB()
+
+        stored = get_video_info_http(
+            self.client, "@fixture", 7, Constants, self.logger, video_db
+        )
+
+        self.assertEqual(stored, 1)
+        self.assertEqual(
+            [video[1] for video in video_db.created],
+            [
+                "vid0000001a",
+                "vid0000002b",
+                "vid0000003c",
+                "vid0000004d",
+                "vid0000005e",
+            ],
+        )
+        self.assertEqual(video_db.counts, {7: 5})
+
+        title, code, url, thumbnail_url, duration, views, channel_id = video_db.created[
+            1
+        ]
+        self.assertEqual(title, "Second upload")
+        self.assertEqual(url, Constants.VIDEO_PAGE_LINK.format("vid0000002b"))
+        self.assertTrue(thumbnail_url.endswith("/vid0000002b/maxresdefault.jpg"))
+        self.assertEqual(duration, 3723)
+        self.assertEqual(views, 987)
+        self.assertEqual(channel_id, 7)
+
+        # Continuations go out with the page's innertube config
+        requests = self.server.browse_requests
+        self.assertEqual(
+            [request["body"]["continuation"] for request in requests],
+            ["page-2", "page-3"],
+        )
+        self.assertIn("key=fixture-api-key", requests[0]["path"])
+        self.assertEqual(requests[0]["headers"]["X-YouTube-Client-Name"], "1")
+        self.assertEqual(requests[0]["body"]["context"]["client"]["clientName"], "WEB")
+
+    def test_stops_at_known_videos(self):
+        known = ["vid0000001a", "vid0000002b", "vid0000003c", "vid0000004d"]
+        video_db = RecordingVideoDB(known_codes=known)
+
+        with mock.patch.object(Constants, "INCREMENTAL_STOP_AFTER_KNOWN", 2):
+            get_video_info_http(
+                self.client, "@fixture", 7, Constants, self.logger, video_db
+            )
+
+        self.assertEqual(video_db.created, [])
+        self.assertEqual(
+            [
+                request["body"]["continuation"]
+                for request in self.server.browse_requests
+            ],
+            [],
+        )
+        self.assertEqual(video_db.counts, {7: 4})
+
+    def test_unknown_layout_raises(self):
+        video_db = RecordingVideoDB()
+
+        with self.assertRaises(PageLayoutError):
+            get_video_info_http(
+                self.client, "@lockup", 7, Constants, self.logger, video_db
+            )
+        self.assertEqual(video_db.counts, {})
+
+    def test_failed_store_is_not_a_success(self):
+        stored = get_video_info_http(
+            self.client,
+            "@fixture",
+            7,
+            Constants,
+            self.logger,
+            RecordingVideoDB(fail=True),
+        )
+
+        self.assertFalse(stored)
+
+    def test_redirect_to_sorry_page_is_a_wall(self):
+        with self.assertRaises(BotWallError) as raised:
+            self.client.get_initial_data("/@walled/videos")
+        self.assertIn("/sorry/index", raised.exception.url)
+
+    def test_too_many_requests_is_a_wall(self):
+        with self.assertRaises(BotWallError):
+            self.client.get_initial_data("/@throttled/videos")
+
+    def test_server_errors_are_retried_through_the_limiter(self):
+        limiter = get_rate_limiter()
+        with mock.patch.object(limiter, "acquire", wraps=limiter.acquire) as acquire:
+            with self.assertRaises(requests.HTTPError):
+                self.client.get_initial_data("/@broken/videos")
+
+        self.assertEqual(self.server.broken_requests, Constants.HTTP_RETRIES + 1)
+        self.assertEqual(acquire.call_count, Constants.HTTP_RETRIES + 1)
+
+    def test_connection_errors_back_off(self):
+        # A port nothing listens on anymore
+        with socket.socket() as closed:
+            closed.bind(("127.0.0.1", 0))
+            port = closed.getsockname()[1]
+        client = YtHttpClient(Constants, base_url=f"http://127.0.0.1:{port}")
+        self.addCleanup(client.close)
+
+        limiter = get_rate_limiter()
+        with mock.patch.object(limiter, "backoff") as backoff:
+            with self.assertRaises(requests.ConnectionError):
+                client.get_initial_data("/@fixture/videos")
+
+        self.assertEqual(backoff.call_count, Constants.HTTP_RETRIES + 1)
+        backoff.assert_called_with(
+            f"http://127.0.0.1:{port}/@fixture/videos", "connection"
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,176 @@
+import glob
+import json
+import logging
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import psycopg2
+
+from lib import write_behind
+from lib.constants import Constants
+from lib.write_behind import (
+    ChannelReleaseRecord,
+    ChannelUpdateRecord,
+    VideoCountRecord,
+    VideoDetailsRecord,
+    WriteBehindBuffer,
+)
+
+
+class WriteBehindTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.spill_directory = directory.name
+        self.rejects_directory = os.path.join(directory.name, "rejects")
+
+        class TestConstants(Constants):
+            WRITE_BEHIND_SPILL_DIRECTORY = self.spill_directory
+            WRITE_BEHIND_REJECTS_DIRECTORY = self.rejects_directory
+            WRITE_BEHIND_FLUSH_INTERVAL = 0.05
+            WRITE_BEHIND_RETRY_DELAY = 0.01
+
+        self.constants = TestConstants
+        self.logger = logging.getLogger(__name__)
+
+        # One parent so the calls of both come out in the order they were made
+        self.db = mock.Mock()
+        for name in ("YtChannelDB", "YtVideoDB"):
+            patcher = mock.patch.object(write_behind, name, getattr(self.db, name))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.channel_db = self.db.YtChannelDB
+        self.video_db = self.db.YtVideoDB
+
+    def start_buffer(self, writer: bool = True) -> WriteBehindBuffer:
+        if writer:
+            buffer = WriteBehindBuffer(self.constants, self.logger)
+        else:
+            # Journals what is put but never flushes it
+            with mock.patch.object(WriteBehindBuffer, "_write_loop", lambda self: None):
+                buffer = WriteBehindBuffer(self.constants, self.logger)
+        buffer.start()
+        return buffer
+
+    def crash(self, buffer: WriteBehindBuffer) -> None:
+        # What the process dying leaves: its files, and its lock free
+        buffer.spill_file.close()
+        buffer.lock_file.close()
+
+    def wait_for(self, condition, timeout: float = 5) -> None:
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail("Timed out waiting for the writer")
+            time.sleep(0.01)
+
+    def spill_files(self) -> list[str]:
+        return glob.glob(os.path.join(self.spill_directory, "*.jsonl"))
+
+    def rejects(self) -> list[dict]:
+        path = os.path.join(self.rejects_directory, "main.jsonl")
+        if not os.path.exists(path):
+            return []
+        with open(path, encoding="utf-8") as rejects_file:
+            return [json.loads(line) for line in rejects_file]
+
+    def test_replays_a_dead_owners_records_in_order(self):
+        crashed = self.start_buffer(writer=False)
+        crashed.put(ChannelUpdateRecord("@fixture", {"name": "Old", "location": "X"}))
+        crashed.put(VideoCountRecord(7, 5))
+        # A batch the writer took but never stored, the next records go to a
+        # new segment
+        crashed._open_segment()
+        crashed.put(ChannelUpdateRecord("@fixture", {"name": "New"}))
+        crashed.put(VideoCountRecord(7, 6))
+        crashed.put(ChannelReleaseRecord("@fixture"))
+        self.crash(crashed)
+        self.assertEqual(len(self.spill_files()), 2)
+
+        buffer = self.start_buffer()
+        buffer.close()
+
+        self.assertEqual(
+            self.db.mock_calls,
+            [
+                mock.call.YtChannelDB.update(
+                    "@fixture", {"name": "New", "location": "X"}
+                ),
+                mock.call.YtVideoDB.update_video_and_shorts_counts({7: 6}),
+                mock.call.YtChannelDB.release_channel("@fixture"),
+            ],
+        )
+        self.assertEqual(self.spill_files(), [])
+
+    def test_leaves_a_live_owners_spill_files_alone(self):
+        running = self.start_buffer(writer=False)
+        running.put(VideoCountRecord(7, 5))
+
+        buffer = self.start_buffer()
+        buffer.close()
+
+        self.assertEqual(self.db.mock_calls, [])
+        self.assertEqual(self.spill_files(), [running.spill_path])
+        self.crash(running)
+
+    def test_record_failing_on_its_data_is_rejected(self):
+        def update_details(video_code, details):
+            if video_code == "bad":
+                raise ValueError("value out of range")
+
+        def update(channel_code, update_data):
+            if channel_code == "@bad":
+                raise ValueError("invalid input syntax")
+
+        self.video_db.update_details.side_effect = update_details
+        self.channel_db.update.side_effect = update
+
+        buffer = self.start_buffer()
+        buffer.put(VideoDetailsRecord("good", {"views": 1}))
+        buffer.put(VideoDetailsRecord("bad", {"views": 2**70}))
+        buffer.put(ChannelUpdateRecord("@bad", {"name": "Bad"}))
+        buffer.put(ChannelReleaseRecord("@bad"))
+        self.wait_for(lambda: self.channel_db.release_channel.called)
+        buffer.close()
+
+        self.assertEqual(
+            [(reject["type"], reject.get("video_code")) for reject in self.rejects()],
+            [("VideoDetailsRecord", "bad"), ("ChannelUpdateRecord", None)],
+        )
+        self.video_db.update_details.assert_any_call("good", {"views": 1})
+        # Kept off the claims, not claimed and rejected again on every poll
+        self.channel_db.skip_channel.assert_called_once_with(
+            "@bad", self.constants.DEAD_LETTER_CHANNEL_COOLDOWN
+        )
+        self.channel_db.release_channel.assert_called_once_with("@bad")
+        self.assertEqual(self.spill_files(), [])
+
+    def test_connection_errors_keep_the_batch(self):
+        failures = iter([psycopg2.OperationalError("server closed the connection")] * 5)
+
+        def update(channel_code, update_data):
+            error = next(failures, None)
+            if error:
+                raise error
+
+        self.channel_db.update.side_effect = update
+
+        buffer = self.start_buffer()
+        buffer.put(ChannelUpdateRecord("@fixture", {"name": "Fixture"}))
+        buffer.put(ChannelReleaseRecord("@fixture"))
+        self.wait_for(lambda: self.channel_db.release_channel.called)
+        buffer.close()
+
+        self.assertEqual(self.rejects(), [])
+        self.assertEqual(self.channel_db.update.call_count, 6)
+        self.channel_db.update.assert_called_with("@fixture", {"name": "Fixture"})
+        self.channel_db.skip_channel.assert_not_called()
+        self.channel_db.release_channel.assert_called_once_with("@fixture")
+        self.assertEqual(self.spill_files(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()